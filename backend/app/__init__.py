@@ -1,22 +1,36 @@
+import importlib
 import json
 import os
 
-import paydunya
 from dotenv import load_dotenv
 from flask import Flask, jsonify, send_from_directory
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
-from flask_migrate import Migrate
 from flask_restx import Api
 from flask_sqlalchemy import SQLAlchemy
 
-load_dotenv()
+from app.journalisation import journalisation
+from app.metriques import Metriques
+from app.pool import configurer_pools
+from app.replicas import SessionRoutee, RouteurReplicas
+from app.sqlite import ModeSQLite
+from app.suivi_sql import SuiviSQL
 
-db = SQLAlchemy()
-migrate = Migrate()
+db = SQLAlchemy(session_options={'class_': SessionRoutee})
 bcrypt = Bcrypt()
 jwt = JWTManager()
+routeur_replicas = RouteurReplicas(db)
+mode_sqlite = ModeSQLite(db)
+metriques = Metriques(db)
+suivi_sql = SuiviSQL(db)
+
+# nom -> (module, attribut, chemin) ; les modules ne sont importés que pour les namespaces activés
+NAMESPACES_API = {
+    'auth': ('app.routes.auth_routes', 'ns_auth', '/auth'),
+    'proprietaire': ('app.routes.proprietaire_routes', 'proprietaire_ns', '/proprietaire'),
+    'metriques': ('app.routes.metriques_routes', 'ns_metriques', '/metriques'),
+}
 
 
 def create_app(config_class=None):
@@ -32,6 +46,8 @@ def create_app(config_class=None):
     app.config['ALLOWED_EXTENSIONS'] = ALLOWED_EXTENSIONS
 
     if config_class is None:
+        # Avant l'import de app.config, qui lit l'environnement
+        load_dotenv()
         app.config.from_object('app.config.Config')
     else:
         app.config.from_object(config_class)
@@ -52,23 +68,23 @@ def create_app(config_class=None):
     app.config['JWT_ACCESS_COOKIE_PATH'] = '/'
     app.config["JWT_SECRET_KEY"] = os.environ.get('JWT_SECRET_KEY', 'my_jwt_secret_key_default_if_not_set')
 
+    journalisation.init_app(app)
+
+    # Les binds des répliques et les options des pools doivent être prêts avant l'initialisation de db
+    routeur_replicas.init_app(app)
+    configurer_pools(app)
     db.init_app(app)
-    migrate.init_app(app, db)
+    # Flask-Migrate (et alembic) ne sert qu'aux commandes `flask db` : inutile de l'importer
+    # dans les workers
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        from flask_migrate import Migrate
+        Migrate(app, db)
     bcrypt.init_app(app)
     jwt.init_app(app)
 
     # Configuration CORS
     CORS(app, resources={r"/api/*": {"origins": "*", "supports_credentials": True}})
 
-    # Configuration PayDunya
-    PAYDUNYA_ACCESS_TOKENS = {
-        'PAYDUNYA-MASTER-KEY': app.config['PAYDUNYA_MASTER_KEY'],
-        'PAYDUNYA-PRIVATE-KEY': app.config['PAYDUNYA_PRIVATE_KEY'],
-        'PAYDUNYA-TOKEN': app.config['PAYDUNYA_TOKEN'],
-    }
-    paydunya.debug = True
-    paydunya.api_keys = PAYDUNYA_ACCESS_TOKENS
-
     # --- Initialisation de Flask-RESTx pour Swagger ---
     api = Api(app,
               version='1.0',
@@ -97,15 +113,53 @@ def create_app(config_class=None):
     # ---------------------------------------------------
 
     with app.app_context():
+        # Avant toute connexion, pour que les pragmas s'appliquent à chacune
+        mode_sqlite.init_app(app)
+        metriques.init_app(app)
+        suivi_sql.init_app(app)
+
+        from app.profilage import profileur
+        profileur.init_app(app)
+
         from app import models
 
-        from app.routes.proprietaire_routes import proprietaire_ns
-        from app.routes.auth_routes import ns_auth
+        for nom in app.config.get('API_NAMESPACES') or NAMESPACES_API:
+            if nom not in NAMESPACES_API:
+                raise ValueError(f"Namespace d'API inconnu dans API_NAMESPACES : {nom}")
+            module, attribut, chemin = NAMESPACES_API[nom]
+            api.add_namespace(getattr(importlib.import_module(module), attribut), path=chemin)
+
+        from app.routes.locataire_routes import locataire_bp
+        app.register_blueprint(locataire_bp)
+
+        from app.services.disponibilite import index_disponibilite
+        index_disponibilite.init_app(app)
+
+        from app.services.paydunya_client import paydunya_client
+        paydunya_client.init_app(app)
+
+        from app.services.confirmations import confirmations_paydunya
+        confirmations_paydunya.init_app(app)
+
+        from app.services.diffusion import diffuseur
+        diffuseur.init_app(app)
+
+        from app.services.synchronisation import synchronisation  # enregistre aussi sa tâche planifiée
+        synchronisation.init_app(app)
 
-        api.add_namespace(ns_auth, path='/auth')
-        api.add_namespace(proprietaire_ns, path='/proprietaire')
+        from app.services import cycle_contrats, rappels, reconciliation  # enregistrent leurs tâches planifiées
+        from app.services.evenements import relais_evenements
+        from app.services.planificateur import planificateur
+        planificateur.init_app(app)
+        relais_evenements.init_app(app)
 
-        db.create_all()
+        # Hors développement, le schéma vient des migrations. Les répliques le reçoivent par
+        # réplication : ne créer les tables que sur le primaire
+        creer_tables = app.config.get('DB_CREATE_ALL')
+        if creer_tables is None:
+            creer_tables = app.debug
+        if creer_tables:
+            db.create_all(bind_key=None)
 
     # Gestionnaires d'erreurs JWT
     @jwt.user_lookup_loader
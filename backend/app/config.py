@@ -8,10 +8,148 @@ class Config:
                               'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Création des tables au démarrage (db.create_all) : par défaut seulement en mode debug,
+    # ailleurs le schéma vient des migrations (flask db upgrade)
+    DB_CREATE_ALL = {'true': True, 'false': False}.get(os.environ.get('DB_CREATE_ALL', '').lower())
+
+    # Namespaces de l'API chargés par ce processus (séparés par des virgules, tous par défaut)
+    API_NAMESPACES = [nom for nom in os.environ.get('API_NAMESPACES', '').split(',') if nom]
+
+    # Journaux : niveau (DEBUG active les messages de debug, INFO par défaut hors mode debug) et format 'json' ou 'texte'
+    LOG_LEVEL = os.environ.get('LOG_LEVEL')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+
+    # Pool de connexions (appliqué au primaire et aux répliques)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
+
+    # Mode production SQLite : WAL, synchronous=NORMAL, busy_timeout, mmap, cache et écritures sérialisées
+    SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION', 'false').lower() == 'true'
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # millisecondes
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))  # négatif : en Kio
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))  # octets
+    SQLITE_SERIALISER_ECRITURES = os.environ.get('SQLITE_SERIALISER_ECRITURES', 'true').lower() == 'true'
+
+    # Exposition des métriques Prometheus sur /metrics (désactivée par défaut : à activer avec
+    # METRICS_TOKEN). Sous gunicorn, chaque worker a ses propres valeurs (voir app.metriques)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() == 'true'
+
+    # Suivi SQL : seuil (en secondes) du journal des requêtes lentes, en-têtes X-DB-* hors debug,
+    # et échec hors tests (plutôt qu'un avertissement) quand un endpoint dépasse son budget de requêtes
+    SQL_SLOW_QUERY_THRESHOLD = float(os.environ.get('SQL_SLOW_QUERY_THRESHOLD', 0.5))
+    SQL_QUERY_HEADERS = os.environ.get('SQL_QUERY_HEADERS', 'false').lower() == 'true'
+    SQL_QUERY_BUDGET_STRICT = os.environ.get('SQL_QUERY_BUDGET_STRICT', 'false').lower() == 'true'
+
+    # Profilage à la demande : en-tête envoyé avec METRICS_TOKEN ou proportion de requêtes tirées au sort
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_HEADER = os.environ.get('PROFILING_HEADER', 'X-Profile')
+    PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.0))
+    PROFILING_DIR = os.environ.get('PROFILING_DIR') or os.path.join(os.path.dirname(basedir), 'var', 'profils')
+    PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', 200))
+
+    # Jeton attendu dans l'en-tête Authorization: Bearer <jeton> des routes de métriques ; sans
+    # lui, ces routes ne répondent qu'en mode debug
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Répliques en lecture (URLs séparées par des virgules) utilisées par les requêtes GET
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+    REPLICA_HEALTH_INTERVAL = int(os.environ.get('REPLICA_HEALTH_INTERVAL', 10))
+    # Durée (en secondes) pendant laquelle un client lit sur le primaire après une écriture
+    REPLICA_READ_YOUR_WRITES = int(os.environ.get('REPLICA_READ_YOUR_WRITES', 5))
+
+    # Durée (en secondes) avant reconstruction de l'index des disponibilités depuis la base (en
+    # arrière-plan : l'index précédent reste servi pendant la reconstruction)
+    DISPONIBILITE_INDEX_TTL = int(os.environ.get('DISPONIBILITE_INDEX_TTL', 300))
+
+    # Planificateur des tâches nocturnes (fin des contrats, paiements en retard), démarré dans
+    # chaque worker après le fork (app.serveur.demarrer_services)
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'false').lower() == 'true'
+    SCHEDULER_INTERVAL = int(os.environ.get('SCHEDULER_INTERVAL', 60))
+    SCHEDULER_LOCK_TIMEOUT = int(os.environ.get('SCHEDULER_LOCK_TIMEOUT', 3600))
+
+    # Rappels de paiements en retard : 'fichier' (lignes JSON) ou 'smtp'
+    RAPPELS_ENVOYEUR = os.environ.get('RAPPELS_ENVOYEUR', 'fichier')
+    RAPPELS_FICHIER = os.environ.get('RAPPELS_FICHIER') or \
+                      os.path.join(os.path.dirname(basedir), 'var', 'rappels.jsonl')
+    RAPPELS_SMTP_HOTE = os.environ.get('RAPPELS_SMTP_HOTE', 'localhost')
+    RAPPELS_SMTP_PORT = int(os.environ.get('RAPPELS_SMTP_PORT', 1025))
+    RAPPELS_EXPEDITEUR = os.environ.get('RAPPELS_EXPEDITEUR', 'rappels@sociallogement.com')
+    RAPPELS_TAILLE_LOT = int(os.environ.get('RAPPELS_TAILLE_LOT', 5000))
+
+    # Nombre maximal d'opérations par appel à POST /proprietaire/operations
+    OPERATIONS_LOT_MAX = int(os.environ.get('OPERATIONS_LOT_MAX', 1000))
+
     PAYDUNYA_MASTER_KEY = os.environ.get('PAYDUNYA_MASTER_KEY')
     PAYDUNYA_PRIVATE_KEY = os.environ.get('PAYDUNYA_PRIVATE_KEY')
     PAYDUNYA_PUBLIC_KEY = os.environ.get('PAYDUNYA_PUBLIC_KEY')
     PAYDUNYA_TOKEN = os.environ.get('PAYDUNYA_TOKEN')
+    # URL de l'API sandbox (ex. le faux serveur des tests de charge) ; celle de PayDunya par défaut
+    PAYDUNYA_SANDBOX_ENDPOINT = os.environ.get('PAYDUNYA_SANDBOX_ENDPOINT')
+    # Client HTTP (app.services.paydunya_client) : timeouts en secondes, pool par worker
+    PAYDUNYA_TIMEOUT_CONNEXION = float(os.environ.get('PAYDUNYA_TIMEOUT_CONNEXION', 3.05))
+    PAYDUNYA_TIMEOUT_LECTURE = float(os.environ.get('PAYDUNYA_TIMEOUT_LECTURE', 10))
+    PAYDUNYA_POOL_TAILLE = int(os.environ.get('PAYDUNYA_POOL_TAILLE', 10))
+    PAYDUNYA_TENTATIVES = int(os.environ.get('PAYDUNYA_TENTATIVES', 3))
+    PAYDUNYA_BACKOFF = float(os.environ.get('PAYDUNYA_BACKOFF', 0.2))
+    PAYDUNYA_BACKOFF_MAX = float(os.environ.get('PAYDUNYA_BACKOFF_MAX', 2))
+    # Échecs consécutifs avant ouverture du disjoncteur, puis durée d'ouverture en secondes
+    PAYDUNYA_DISJONCTEUR_SEUIL = int(os.environ.get('PAYDUNYA_DISJONCTEUR_SEUIL', 5))
+    PAYDUNYA_DISJONCTEUR_DELAI = float(os.environ.get('PAYDUNYA_DISJONCTEUR_DELAI', 30))
+    # Cache des états de facture pour les pages de retour (secondes ; `pending` peut encore changer)
+    PAYDUNYA_CONFIRMATION_TTL = int(os.environ.get('PAYDUNYA_CONFIRMATION_TTL', 300))
+    PAYDUNYA_CONFIRMATION_TTL_EN_ATTENTE = int(os.environ.get('PAYDUNYA_CONFIRMATION_TTL_EN_ATTENTE', 5))
+    PAYDUNYA_CONFIRMATION_CACHE_TAILLE = int(os.environ.get('PAYDUNYA_CONFIRMATION_CACHE_TAILLE', 10000))
+
+    # Réconciliation des paiements en attente avec PayDunya (app.services.reconciliation)
+    RECONCILIATION_TAILLE_LOT = int(os.environ.get('RECONCILIATION_TAILLE_LOT', 500))
+    RECONCILIATION_CONCURRENCE = int(os.environ.get('RECONCILIATION_CONCURRENCE', 8))  # confirmations simultanées
+
+    # Outbox des événements (app.services.evenements) et relais vers les destinations
+    # (séparées par des virgules) : 'fichier' (lignes JSON), 'webhook', 'file' (file en mémoire)
+    EVENEMENTS_DESTINATIONS = [nom.strip() for nom in os.environ.get('EVENEMENTS_DESTINATIONS', 'fichier').split(',')
+                               if nom.strip()]
+    EVENEMENTS_RELAIS_ACTIF = os.environ.get('EVENEMENTS_RELAIS_ACTIF', 'false').lower() == 'true'
+    EVENEMENTS_INTERVALLE = float(os.environ.get('EVENEMENTS_INTERVALLE', 1))  # secondes entre deux passages
+    EVENEMENTS_TAILLE_LOT = int(os.environ.get('EVENEMENTS_TAILLE_LOT', 500))
+    EVENEMENTS_BAIL = int(os.environ.get('EVENEMENTS_BAIL', 60))  # secondes avant reprise d'un lot non acquitté
+    EVENEMENTS_BACKOFF = float(os.environ.get('EVENEMENTS_BACKOFF', 5))
+    EVENEMENTS_BACKOFF_MAX = float(os.environ.get('EVENEMENTS_BACKOFF_MAX', 600))
+    EVENEMENTS_RETENTION_JOURS = int(os.environ.get('EVENEMENTS_RETENTION_JOURS', 7))
+    EVENEMENTS_FICHIER = os.environ.get('EVENEMENTS_FICHIER') or \
+                         os.path.join(os.path.dirname(basedir), 'var', 'evenements.jsonl')
+    EVENEMENTS_WEBHOOK_URL = os.environ.get('EVENEMENTS_WEBHOOK_URL')
+    EVENEMENTS_WEBHOOK_TIMEOUT = float(os.environ.get('EVENEMENTS_WEBHOOK_TIMEOUT', 10))
+    EVENEMENTS_WEBHOOK_SECRET = os.environ.get('EVENEMENTS_WEBHOOK_SECRET')
+
+    # Flux SSE des paiements (app.services.diffusion). Chaque flux occupe un worker sync ou un
+    # thread gthread pendant SSE_DUREE_MAX secondes : à servir avec SERVER_WORKER_MODE=gevent.
+    # SSE_ACTIF : 'auto' (flux refusés par 204 dans les workers gunicorn sync et gthread, le
+    # front recharge alors la liste toutes les 30 s), 'true' ou 'false'. SERVER_WORKER_MODE vaut
+    # sync par défaut : le suivi en direct des paiements exige SERVER_WORKER_MODE=gevent.
+    SSE_ACTIF = os.environ.get('SSE_ACTIF', 'auto').lower()
+    # SSE_BACKEND : 'base' (chaque worker suit l'outbox) ou 'local' (seul le worker qui valide
+    # la transaction notifie ses flux : à réserver aux serveurs à un seul worker)
+    SSE_BACKEND = os.environ.get('SSE_BACKEND', 'base')
+    SSE_INTERVALLE_BASE = float(os.environ.get('SSE_INTERVALLE_BASE', 0.5))
+    # Derniers identifiants de l'outbox relus à chaque passage (validés hors ordre)
+    SSE_FENETRE_IDS = int(os.environ.get('SSE_FENETRE_IDS', 1000))
+    SSE_BATTEMENT = float(os.environ.get('SSE_BATTEMENT', 15))  # commentaire envoyé si rien d'autre (proxys)
+    SSE_DUREE_MAX = float(os.environ.get('SSE_DUREE_MAX', 300))  # le navigateur se reconnecte ensuite
+    SSE_RECONNEXION_MS = int(os.environ.get('SSE_RECONNEXION_MS', 3000))
+    SSE_TAILLE_FILE = int(os.environ.get('SSE_TAILLE_FILE', 100))
+
+    # Synchronisation incrémentale des tableaux de bord (app.services.synchronisation).
+    # SYNC_MARGE_SECONDES : recul supplémentaire du curseur renvoyé, déjà ramené avant la plus
+    # ancienne transaction en cours (PostgreSQL) ou après l'écriture en cours (SQLite).
+    # Au-delà de SYNC_RETENTION_JOURS, les suppressions sont purgées et un curseur plus ancien
+    # reçoit un instantané complet.
+    SYNC_MARGE_SECONDES = int(os.environ.get('SYNC_MARGE_SECONDES', 5))
+    SYNC_RETENTION_JOURS = int(os.environ.get('SYNC_RETENTION_JOURS', 30))
 
     # PAYDUNYA_BASE_URL = "https://app.paydunya.com/api/v1/checkout-invoice/create"
     # PAYDUNYA_CONFIRM_URL = "https://app.paydunya.com/api/v1/checkout-invoice/confirm/"
@@ -1,7 +1,7 @@
 import json
 from functools import wraps
 
-from flask import jsonify
+from flask import jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 
@@ -28,3 +28,27 @@ def role_required(roles):
         return decorator
 
     return wrapper
+
+
+def jeton_metriques_valide():
+    """Vrai si la requête présente METRICS_TOKEN ou, sans jeton configuré, en mode debug."""
+    jeton = current_app.config.get('METRICS_TOKEN')
+    if not jeton:
+        return current_app.debug
+    return request.headers.get('Authorization') == f'Bearer {jeton}'
+
+
+def metrics_token_required(fn):
+    """
+    Protège les routes de métriques par le jeton METRICS_TOKEN. Sans jeton configuré, elles
+    ne sont ouvertes qu'en mode debug.
+    """
+    @wraps(fn)
+    def decorator(*args, **kwargs):
+        if jeton_metriques_valide():
+            return fn(*args, **kwargs)
+        if not current_app.config.get('METRICS_TOKEN'):
+            return {"message": "Routes de métriques fermées : METRICS_TOKEN n'est pas configuré."}, 403
+        return {"message": "Jeton de métriques invalide."}, 401
+
+    return decorator
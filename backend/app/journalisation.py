@@ -0,0 +1,154 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+ENTETE_ID_REQUETE = 'X-Request-ID'
+LONGUEUR_MAX_ID = 64
+
+# Attributs standard d'un LogRecord : tout le reste vient de `extra=` et est exporté tel quel
+ATTRIBUTS_STANDARD = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class FiltreContexteRequete(logging.Filter):
+    """Ajoute l'identifiant, la méthode et le chemin de la requête HTTP en cours."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.methode = request.method
+            record.chemin = request.path
+        return True
+
+
+class FormateurJSON(logging.Formatter):
+    """Une ligne JSON par enregistrement, avec les champs passés dans `extra=`."""
+
+    def format(self, record):
+        entree = {
+            "date": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "niveau": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for cle, valeur in vars(record).items():
+            if cle not in ATTRIBUTS_STANDARD and not cle.startswith('_'):
+                entree[cle] = valeur
+        if record.exc_info:
+            entree["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entree["exception"] = record.exc_text
+        return json.dumps(entree, default=str, ensure_ascii=False)
+
+
+class FormateurTexte(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(name)s] %(message)s')
+
+
+class QueueHandlerStructure(QueueHandler):
+    """
+    QueueHandler qui conserve les champs de l'enregistrement : le message est calculé sur le
+    thread de la requête, le formatage et l'écriture se font sur le thread du QueueListener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class Journalisation:
+    """
+    Journaux structurés non bloquants : une fois `demarrer` appelé, les handlers de la racine
+    sont remplacés par un QueueHandler et un QueueListener écrit sur la sortie standard, en
+    JSON (LOG_FORMAT=json) ou en texte ; avant, l'écriture est directe (processus maître de
+    gunicorn, commandes CLI). Chaque requête reçoit un identifiant (repris de l'en-tête
+    X-Request-ID s'il est fourni) ajouté aux journaux et renvoyé dans la réponse. Les messages
+    de debug ne sont émis que si LOG_LEVEL vaut DEBUG.
+    """
+
+    def __init__(self, app=None):
+        self._ecouteur = None
+        self._formateur = None
+        atexit.register(self.arreter)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['journalisation'] = self
+        niveau = app.config.get('LOG_LEVEL') or ('DEBUG' if app.debug else 'INFO')
+        formateur = FormateurJSON() if app.config.get('LOG_FORMAT', 'json') == 'json' else FormateurTexte()
+        self.configurer(niveau, formateur)
+        app.before_request(self._attribuer_id)
+        app.after_request(self._renvoyer_id)
+
+    def configurer(self, niveau, formateur):
+        """Écriture directe sur la sortie standard, sans thread : voir `demarrer`."""
+        self._niveau, self._formateur = niveau, formateur
+        self.arreter()
+        self._installer(self._sortie(), niveau)
+
+    def demarrer(self):
+        """
+        Passe l'écriture dans un thread. À appeler dans le processus qui sert les requêtes
+        (worker gunicorn, serveur de développement) : un thread démarré avant un fork
+        n'existerait pas dans le processus fils.
+        """
+        if self._formateur is None or self._ecouteur is not None:
+            return
+        file = queue.SimpleQueue()
+        self._ecouteur = QueueListener(file, self._sortie(), respect_handler_level=False)
+        self._installer(QueueHandlerStructure(file), self._niveau)
+        self._ecouteur.start()
+
+    def redemarrer(self):
+        """Recrée la file et le thread d'écriture, par exemple dans un processus issu d'un fork."""
+        # Un thread hérité du processus parent n'existe pas ici : ne pas attendre sa fin
+        self._ecouteur = None
+        self.demarrer()
+
+    def arreter(self):
+        """Vide la file, arrête le thread d'écriture et revient à l'écriture directe."""
+        if self._ecouteur is not None:
+            self._ecouteur.stop()
+            self._ecouteur = None
+            self._installer(self._sortie(), self._niveau)
+
+    def _sortie(self):
+        sortie = logging.StreamHandler(sys.stdout)
+        sortie.setFormatter(self._formateur)
+        return sortie
+
+    @staticmethod
+    def _installer(gestionnaire, niveau):
+        gestionnaire.addFilter(FiltreContexteRequete())
+        racine = logging.getLogger()
+        for ancien in list(racine.handlers):
+            racine.removeHandler(ancien)
+        racine.addHandler(gestionnaire)
+        racine.setLevel(niveau)
+
+    @staticmethod
+    def _attribuer_id():
+        g.request_id = request.headers.get(ENTETE_ID_REQUETE, '')[:LONGUEUR_MAX_ID] or uuid.uuid4().hex
+
+    @staticmethod
+    def _renvoyer_id(response):
+        if 'request_id' in g:
+            response.headers[ENTETE_ID_REQUETE] = g.request_id
+        return response
+
+
+journalisation = Journalisation()
@@ -0,0 +1,265 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from sqlalchemy import event
+
+from app.decorators import metrics_token_required
+from app.pool import QueuePoolInstrumente, metriques_pools
+
+BORNES_LATENCE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BORNES_TAILLE = (100, 1000, 10000, 100000, 1000000, 10000000)
+BORNES_NOMBRE_SQL = (1, 2, 5, 10, 20, 50, 100, 200)
+
+TYPE_CONTENU_EXPOSITION = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _echapper(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _formater_etiquettes(noms, valeurs, supplementaires=()):
+    paires = list(zip(noms, valeurs)) + list(supplementaires)
+    if not paires:
+        return ''
+    return '{' + ','.join(f'{nom}="{_echapper(valeur)}"' for nom, valeur in paires) + '}'
+
+
+def _formater_nombre(valeur):
+    if valeur == float('inf'):
+        return '+Inf'
+    if isinstance(valeur, float) and valeur.is_integer():
+        return str(int(valeur))
+    return repr(valeur) if isinstance(valeur, float) else str(valeur)
+
+
+class Compteur:
+    type = 'counter'
+
+    def __init__(self, nom, aide, etiquettes=()):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self._valeurs = {}
+        self._verrou = threading.Lock()
+
+    def inc(self, valeur=1, **etiquettes):
+        cle = tuple(etiquettes[nom] for nom in self.etiquettes)
+        with self._verrou:
+            self._valeurs[cle] = self._valeurs.get(cle, 0) + valeur
+
+    def reporter(self, total, **etiquettes):
+        """Reprend un total cumulé tenu ailleurs (les compteurs des pools par exemple)."""
+        cle = tuple(etiquettes[nom] for nom in self.etiquettes)
+        with self._verrou:
+            self._valeurs[cle] = total
+
+    def echantillons(self):
+        with self._verrou:
+            valeurs = dict(self._valeurs)
+        for cle, valeur in sorted(valeurs.items()):
+            yield f'{self.nom}{_formater_etiquettes(self.etiquettes, cle)} {_formater_nombre(valeur)}'
+
+
+class Jauge(Compteur):
+    type = 'gauge'
+
+    def fixer(self, valeur, **etiquettes):
+        cle = tuple(etiquettes[nom] for nom in self.etiquettes)
+        with self._verrou:
+            self._valeurs[cle] = valeur
+
+
+class Histogramme:
+    type = 'histogram'
+
+    def __init__(self, nom, aide, bornes, etiquettes=()):
+        self.nom = nom
+        self.aide = aide
+        self.bornes = tuple(bornes)
+        self.etiquettes = tuple(etiquettes)
+        self._series = {}  # cle -> [compteurs par borne (+Inf inclus), somme, total]
+        self._verrou = threading.Lock()
+
+    def observer(self, valeur, **etiquettes):
+        cle = tuple(etiquettes[nom] for nom in self.etiquettes)
+        with self._verrou:
+            serie = self._series.get(cle)
+            if serie is None:
+                serie = self._series[cle] = [[0] * (len(self.bornes) + 1), 0.0, 0]
+            serie[0][bisect_left(self.bornes, valeur)] += 1
+            serie[1] += valeur
+            serie[2] += 1
+
+    def echantillons(self):
+        with self._verrou:
+            series = {cle: (list(serie[0]), serie[1], serie[2]) for cle, serie in self._series.items()}
+        for cle, (compteurs, somme, total) in sorted(series.items()):
+            cumul = 0
+            for borne, nombre in zip(self.bornes + (float('inf'),), compteurs):
+                cumul += nombre
+                etiquettes = _formater_etiquettes(self.etiquettes, cle, [('le', _formater_nombre(borne))])
+                yield f'{self.nom}_bucket{etiquettes} {cumul}'
+            etiquettes = _formater_etiquettes(self.etiquettes, cle)
+            yield f'{self.nom}_sum{etiquettes} {_formater_nombre(somme)}'
+            yield f'{self.nom}_count{etiquettes} {total}'
+
+
+class Registre:
+    def __init__(self):
+        self.metriques = []
+        self.collecteurs = []
+
+    def compteur(self, nom, aide, etiquettes=()):
+        return self._ajouter(Compteur(nom, aide, etiquettes))
+
+    def jauge(self, nom, aide, etiquettes=()):
+        return self._ajouter(Jauge(nom, aide, etiquettes))
+
+    def histogramme(self, nom, aide, bornes, etiquettes=()):
+        return self._ajouter(Histogramme(nom, aide, bornes, etiquettes))
+
+    def _ajouter(self, metrique):
+        self.metriques.append(metrique)
+        return metrique
+
+    def exposer(self):
+        """Texte au format d'exposition Prometheus."""
+        for collecteur in self.collecteurs:
+            collecteur()
+        lignes = []
+        for metrique in self.metriques:
+            lignes.append(f'# HELP {metrique.nom} {metrique.aide}')
+            lignes.append(f'# TYPE {metrique.nom} {metrique.type}')
+            lignes.extend(metrique.echantillons())
+        return '\n'.join(lignes) + '\n'
+
+
+class Metriques:
+    """
+    Instrumentation de l'application : nombre, latence et taille des réponses par endpoint,
+    nombre et durée des requêtes SQL par requête HTTP, latence des appels PayDunya et état
+    des pools de connexions. Exposées sur /metrics au format texte de Prometheus.
+
+    Les valeurs sont celles du processus : sous gunicorn (prefork), /metrics renvoie celles du
+    worker qui répond, et deux scrapes successifs peuvent lire deux workers différents (un
+    rate() sur un compteur mélange alors leurs totaux). Pour des séries exactes, chaque
+    worker doit être scrapé à part : un worker par instance (SERVER_WORKERS=1, montée en
+    charge par le nombre d'instances), chaque instance étant une cible Prometheus.
+    """
+
+    def __init__(self, db=None, app=None):
+        self.db = db
+        self.registre = Registre()
+        r = self.registre
+        self.requetes = r.compteur(
+            'http_requetes_total', "Requêtes HTTP traitées.", ('endpoint', 'methode', 'statut'))
+        self.latence = r.histogramme(
+            'http_requete_duree_secondes', "Durée de traitement des requêtes HTTP.", BORNES_LATENCE,
+            ('endpoint', 'methode'))
+        self.taille = r.histogramme(
+            'http_reponse_taille_octets', "Taille des corps de réponse.", BORNES_TAILLE, ('endpoint',))
+        self.sql_nombre = r.histogramme(
+            'sql_requetes_par_requete', "Instructions SQL exécutées par requête HTTP.", BORNES_NOMBRE_SQL,
+            ('endpoint',))
+        self.sql_duree = r.histogramme(
+            'sql_duree_par_requete_secondes', "Temps passé dans la base par requête HTTP.", BORNES_LATENCE,
+            ('endpoint',))
+        self.sql_total = r.compteur(
+            'sql_instructions_total', "Instructions SQL exécutées.", ('base',))
+        self.paydunya = r.histogramme(
+            'paydunya_appel_duree_secondes', "Durée des appels à l'API PayDunya.", BORNES_LATENCE,
+            ('operation', 'resultat'))
+        self.confirmations_paydunya = r.compteur(
+            'paydunya_confirmations_total', "États de facture servis aux pages de retour, par source.", ('source',))
+        self.evenements_sortants = r.compteur(
+            'evenements_sortants_total', "Événements de l'outbox traités par le relais.", ('resultat',))
+        self.flux_sse = r.jauge('sse_flux_ouverts', "Flux SSE ouverts dans ce processus.")
+        self.pool_utilisees = r.jauge(
+            'db_pool_connexions_utilisees', "Connexions actuellement empruntées au pool.", ('base',))
+        self.pool_debordement = r.jauge(
+            'db_pool_debordement', "Connexions ouvertes au-delà de la taille du pool.", ('base',))
+        self.pool_timeouts = r.compteur(
+            'db_pool_timeouts_total', "Attentes de connexion ayant dépassé pool_timeout.", ('base',))
+        self.registre.collecteurs.append(self._collecter_pools)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """À appeler dans un contexte d'application, après `db.init_app(app)`."""
+        app.extensions['metriques'] = self
+        if not app.config.get('METRICS_ENABLED', False):
+            return
+        app.before_request(self._debut_requete)
+        app.after_request(self._fin_requete)
+        for cle, moteur in self.db.engines.items():
+            self._suivre_sql(cle or 'primaire', moteur)
+        app.add_url_rule('/metrics', 'metriques', metrics_token_required(self.exposer))
+
+    # --- Requêtes HTTP ---
+
+    @staticmethod
+    def _debut_requete():
+        g.metriques_debut = time.perf_counter()
+
+    def _fin_requete(self, response):
+        debut = g.pop('metriques_debut', None)
+        if debut is None:
+            return response
+        duree = time.perf_counter() - debut
+        endpoint = request.endpoint or 'inconnu'
+        self.requetes.inc(endpoint=endpoint, methode=request.method, statut=str(response.status_code))
+        self.latence.observer(duree, endpoint=endpoint, methode=request.method)
+        taille = response.calculate_content_length()
+        if taille is not None:
+            self.taille.observer(taille, endpoint=endpoint)
+        # Comptés par le suivi SQL (app.suivi_sql)
+        if 'sql_requetes' in g:
+            self.sql_nombre.observer(g.sql_requetes, endpoint=endpoint)
+            self.sql_duree.observer(g.sql_duree, endpoint=endpoint)
+        return response
+
+    def exposer(self):
+        return Response(self.registre.exposer(), mimetype=None, content_type=TYPE_CONTENU_EXPOSITION)
+
+    # --- SQL ---
+
+    def _suivre_sql(self, base, moteur):
+        compteur = self.sql_total
+
+        @event.listens_for(moteur, 'after_cursor_execute')
+        def compter(*_args):
+            compteur.inc(base=base)
+
+    # --- PayDunya ---
+
+    @contextmanager
+    def chronometre_paydunya(self, operation):
+        """Mesure un appel PayDunya ; le résultat vaut 'erreur' si le bloc lève une exception."""
+        debut = time.perf_counter()
+        resultat = 'ok'
+        try:
+            yield
+        except Exception:
+            resultat = 'erreur'
+            raise
+        finally:
+            self.paydunya.observer(time.perf_counter() - debut, operation=operation, resultat=resultat)
+
+    # --- Pools ---
+
+    def _collecter_pools(self):
+        if self.db is None:
+            return
+        for cle, moteur in self.db.engines.items():
+            base = cle or 'primaire'
+            pool = moteur.pool
+            if not isinstance(pool, QueuePoolInstrumente):
+                continue
+            self.pool_utilisees.fixer(pool.checkedout(), base=base)
+            self.pool_debordement.fixer(max(pool.overflow(), 0), base=base)
+            if base in metriques_pools:
+                self.pool_timeouts.reporter(metriques_pools[base].timeouts, base=base)
+
@@ -65,6 +65,9 @@ class Chambre(db.Model):
     prix = db.Column(db.Numeric(10, 2), nullable=False)  # Prix doit être obligatoire
     disponible = db.Column(db.Boolean, default=True)  # Valeur par défaut
     cree_le = db.Column(db.DateTime, default=db.func.current_timestamp())  # Utilise db.func.current_timestamp()
+    # Mis à jour à chaque modification (synchronisation incrémentale des tableaux de bord)
+    modifie_le = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp(),
+                           onupdate=db.func.current_timestamp(), server_default=db.func.current_timestamp())
 
     # Relations : Utilisation de back_populates pour la clarté bidirectionnelle
     maison = db.relationship('Maison', back_populates='chambres')
@@ -95,6 +98,9 @@ class Contrat(db.Model):
                             default='mensuel')  # 'journalier' | 'hebdomadaire' | 'mensuel'
     statut = db.Column(db.String(255), nullable=False, default='actif')  # 'actif' | 'resilié'
     cree_le = db.Column(db.DateTime, default=db.func.current_timestamp())  # Utilise db.func.current_timestamp()
+    # Mis à jour à chaque modification (synchronisation incrémentale des tableaux de bord)
+    modifie_le = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp(),
+                           onupdate=db.func.current_timestamp(), server_default=db.func.current_timestamp())
 
     # Relations : Utilisation de back_populates pour une clarté bidirectionnelle
     locataire = db.relationship('Utilisateur', back_populates='contrats_locataire')
@@ -102,6 +108,11 @@ class Contrat(db.Model):
     paiements = db.relationship('Paiement', back_populates='contrat', lazy=True)
     problemes = db.relationship('Probleme', back_populates='contrat', lazy=True)
 
+    # Index utilisé par la détection de chevauchement des périodes de location
+    __table_args__ = (
+        db.Index('ix_contrats_chambre_periode', 'chambre_id', 'date_debut', 'date_fin'),
+        db.Index('ix_contrats_modifie_le', 'modifie_le'),
+    )
 
     def __repr__(self):
         return f'<Contrat {self.id}>'
@@ -120,11 +131,23 @@ class Paiement(db.Model):
     paydunya_invoice_token = db.Column(db.String(255), nullable=True, unique=True)
     paydunya_transaction_id = db.Column(db.String(255), nullable=True, unique=True)
 
+    # Mis à jour chaque nuit par la tâche `cycle_contrats` : échéance dépassée et non payée
+    en_retard = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
     cree_le = db.Column(db.DateTime, default=db.func.current_timestamp())  # Utilise db.func.current_timestamp()
+    # Mis à jour à chaque modification (synchronisation incrémentale des tableaux de bord)
+    modifie_le = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp(),
+                           onupdate=db.func.current_timestamp(), server_default=db.func.current_timestamp())
 
     # Relation inverse du contrat
     contrat = db.relationship('Contrat', back_populates='paiements')
 
+    # Parcours des échéances par plage de dates (paiements en retard)
+    __table_args__ = (
+        db.Index('ix_paiements_date_echeance', 'date_echeance', 'id'),
+        db.Index('ix_paiements_modifie_le', 'modifie_le'),
+    )
+
     def __repr__(self):
         return f'<Paiement {self.montant} pour Contrat {self.contrat_id}>'
 
@@ -156,6 +179,9 @@ class Media(db.Model):
     type = db.Column(db.String(255), nullable=True)  # 'photo' | 'video', peut être nullable
     description = db.Column(db.Text, nullable=True)  # Peut être nullable
     cree_le = db.Column(db.DateTime, default=db.func.current_timestamp())  # Utilise db.func.current_timestamp()
+    # Mis à jour à chaque modification (synchronisation incrémentale des tableaux de bord)
+    modifie_le = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp(),
+                           onupdate=db.func.current_timestamp(), server_default=db.func.current_timestamp())
 
     # Relation
     chambre = db.relationship('Chambre', back_populates='medias')
@@ -184,3 +210,71 @@ class Probleme(db.Model):
 
     def __repr__(self):
         return f'<Probleme {self.id}>'
+
+
+class TachePlanifiee(db.Model):
+    __tablename__ = 'taches_planifiees'  # État persistant des tâches du planificateur
+    nom = db.Column(db.String(100), primary_key=True)
+    prochaine_execution = db.Column(db.DateTime, nullable=False)
+    derniere_execution = db.Column(db.DateTime, nullable=True)
+    dernier_resultat = db.Column(db.Text, nullable=True)
+    # Bail du worker qui exécute la tâche : un seul worker à la fois, même avec plusieurs processus
+    verrouille_par = db.Column(db.String(255), nullable=True)
+    verrouille_jusqu_a = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<TachePlanifiee {self.nom}>'
+
+
+class EvenementSortant(db.Model):
+    __tablename__ = 'evenements_sortants'  # Outbox : écrite dans la transaction du changement d'état
+    id = db.Column(db.Integer, primary_key=True)  # Ordre de publication, identifiant de déduplication
+    type = db.Column(db.String(100), nullable=False)  # ex. 'contrat.approuve', 'paiement.paye'
+    cle = db.Column(db.String(100), nullable=False)  # Entité concernée, ex. 'contrat:12'
+    donnees = db.Column(db.Text, nullable=False)  # JSON
+    cree_le = db.Column(db.DateTime, default=db.func.current_timestamp())
+    livre_le = db.Column(db.DateTime, nullable=True)  # NULL tant que toutes les destinations n'ont pas accusé réception
+    tentatives = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    prochaine_tentative = db.Column(db.DateTime, nullable=True)
+    derniere_erreur = db.Column(db.Text, nullable=True)
+    # Bail du relais qui livre l'événement, comme pour les tâches planifiées
+    verrouille_par = db.Column(db.String(255), nullable=True)
+    verrouille_jusqu_a = db.Column(db.DateTime, nullable=True)
+
+    # Le relais parcourt les événements non livrés dans l'ordre des identifiants, et cherche
+    # pour chacun un événement antérieur de la même entité encore en attente
+    __table_args__ = (
+        db.Index('ix_evenements_sortants_livre_le', 'livre_le', 'id'),
+        db.Index('ix_evenements_sortants_cle', 'cle', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<EvenementSortant {self.id} {self.type}>'
+
+
+class Suppression(db.Model):
+    __tablename__ = 'suppressions'  # Pierres tombales : suppressions à transmettre aux clients synchronisés
+    id = db.Column(db.Integer, primary_key=True)
+    entite = db.Column(db.String(50), nullable=False)  # 'chambre' | 'contrat' | 'paiement' | 'media'
+    entite_id = db.Column(db.Integer, nullable=False)
+    # Destinataires de la suppression, relevés avant qu'elle n'ait lieu
+    proprietaire_id = db.Column(db.Integer, nullable=True, index=True)
+    locataire_id = db.Column(db.Integer, nullable=True, index=True)
+    chambre_id = db.Column(db.Integer, nullable=True, index=True)
+    supprime_le = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp(), index=True)
+
+    def __repr__(self):
+        return f'<Suppression {self.entite} {self.entite_id}>'
+
+
+class FactureOrpheline(db.Model):
+    __tablename__ = 'factures_orphelines'  # Factures PayDunya créées pour un paiement initié entre-temps par une autre demande
+    id = db.Column(db.Integer, primary_key=True)
+    paiement_id = db.Column(db.Integer, db.ForeignKey('paiements.id'), nullable=False, index=True)
+    invoice_token = db.Column(db.String(255), nullable=False, unique=True)  # Retrouvée par le callback PayDunya
+    cree_le = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    paiement = db.relationship('Paiement')
+
+    def __repr__(self):
+        return f'<FactureOrpheline {self.invoice_token} paiement {self.paiement_id}>'
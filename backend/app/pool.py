@@ -0,0 +1,125 @@
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# Bornes (en secondes) de l'histogramme des temps d'attente d'une connexion
+BORNES_ATTENTE = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# Options refusées par les pools utilisés pour SQLite en mémoire (StaticPool)
+OPTIONS_FILE_ATTENTE = ('pool_size', 'max_overflow', 'pool_timeout', 'poolclass')
+
+
+class MetriquesPool:
+    """Compteurs d'un pool de connexions : attentes au checkout, débordements, timeouts."""
+
+    def __init__(self, nom):
+        self.nom = nom
+        self._verrou = threading.Lock()
+        self.checkouts = 0
+        self.checkouts_debordement = 0
+        self.timeouts = 0
+        self.attente_totale = 0.0
+        self.attente_max = 0.0
+        self.histogramme = [0] * (len(BORNES_ATTENTE) + 1)
+
+    def observer_checkout(self, attente, debordement):
+        with self._verrou:
+            self.checkouts += 1
+            self.attente_totale += attente
+            self.attente_max = max(self.attente_max, attente)
+            self.histogramme[bisect_left(BORNES_ATTENTE, attente)] += 1
+            if debordement:
+                self.checkouts_debordement += 1
+
+    def observer_timeout(self):
+        with self._verrou:
+            self.timeouts += 1
+
+    def instantane(self):
+        with self._verrou:
+            return {
+                "checkouts": self.checkouts,
+                "checkouts_debordement": self.checkouts_debordement,
+                "timeouts": self.timeouts,
+                "attente_totale_secondes": round(self.attente_totale, 6),
+                "attente_max_secondes": round(self.attente_max, 6),
+                "histogramme_attente": dict(zip([str(b) for b in BORNES_ATTENTE] + ['+Inf'], self.histogramme)),
+            }
+
+
+metriques_pools = {}
+_verrou_registre = threading.Lock()
+
+
+def metriques_pour(nom):
+    metriques = metriques_pools.get(nom)
+    if metriques is None:
+        with _verrou_registre:
+            metriques = metriques_pools.setdefault(nom, MetriquesPool(nom))
+    return metriques
+
+
+class QueuePoolInstrumente(QueuePool):
+    """
+    QueuePool qui mesure le temps d'attente de chaque checkout. Les métriques sont rangées
+    sous le `pool_logging_name` du moteur, conservé quand le pool est recréé (dispose).
+    """
+
+    def connect(self):
+        metriques = metriques_pour(self._orig_logging_name or 'defaut')
+        debut = time.perf_counter()
+        try:
+            connexion = super().connect()
+        except exc.TimeoutError:
+            metriques.observer_timeout()
+            raise
+        metriques.observer_checkout(time.perf_counter() - debut, self.overflow() > 0)
+        return connexion
+
+
+def _sqlite_en_memoire(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def options_moteur(uri, options, nom):
+    """Options de create_engine() pour une base, avec le pool instrumenté quand il s'applique."""
+    options = dict(options or {})
+    if _sqlite_en_memoire(uri):
+        for cle in OPTIONS_FILE_ATTENTE:
+            options.pop(cle, None)
+        return options
+    options.setdefault('poolclass', QueuePoolInstrumente)
+    options['pool_logging_name'] = nom
+    return options
+
+
+def configurer_pools(app):
+    """À appeler avant `db.init_app(app)` et après `routeur_replicas.init_app(app)`."""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options_moteur(
+        app.config['SQLALCHEMY_DATABASE_URI'], app.config.get('SQLALCHEMY_ENGINE_OPTIONS'), 'primaire'
+    )
+
+
+def etat_pools(engines):
+    """État courant de chaque pool (connexions utilisées, débordement) et ses compteurs."""
+    resultat = {}
+    for cle, moteur in engines.items():
+        nom = cle or 'primaire'
+        pool = moteur.pool
+        etat = {"classe": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            etat.update({
+                "taille": pool.size(),
+                "connexions_utilisees": pool.checkedout(),
+                "connexions_libres": pool.checkedin(),
+                "debordement": max(pool.overflow(), 0),
+            })
+        if isinstance(pool, QueuePoolInstrumente) and nom in metriques_pools:
+            etat.update(metriques_pools[nom].instantane())
+        resultat[nom] = etat
+    return resultat
@@ -0,0 +1,144 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from datetime import datetime
+
+from flask import g, request
+
+from app.decorators import jeton_metriques_valide
+
+logger = logging.getLogger(__name__)
+
+# Nombre de fonctions reprises dans le résumé texte d'un profil
+FONCTIONS_RESUME = 40
+
+NOM_PROFIL = re.compile(r'^[\w.-]+$')
+
+
+class Profileur:
+    """
+    Profilage cProfile à la demande d'une requête HTTP.
+
+    Une requête est profilée quand elle porte l'en-tête PROFILING_HEADER et le jeton
+    METRICS_TOKEN (Authorization: Bearer, comme les routes de métriques), ou par tirage au sort selon PROFILING_SAMPLE_RATE. Le profil (format pstats), un résumé et
+    la chronologie des requêtes SQL sont écrits dans PROFILING_DIR. Sans PROFILING_ENABLED,
+    aucun hook n'est enregistré.
+    """
+
+    def __init__(self, app=None):
+        self.dossier = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['profileur'] = self
+        self.dossier = app.config.get('PROFILING_DIR')
+        if not app.config.get('PROFILING_ENABLED'):
+            return
+        self.entete = app.config.get('PROFILING_HEADER', 'X-Profile')
+        self.taux = app.config.get('PROFILING_SAMPLE_RATE', 0.0)
+        self.max_fichiers = app.config.get('PROFILING_MAX_FILES', 200)
+        os.makedirs(self.dossier, exist_ok=True)
+        app.before_request(self._debut)
+        app.after_request(self._fin)
+
+    # --- Déclenchement ---
+
+    def _doit_profiler(self):
+        if request.headers.get(self.entete):
+            # Le rôle admin du JWT ne suffit pas : n'importe qui peut le choisir à l'inscription
+            return jeton_metriques_valide()
+        return self.taux > 0 and random.random() < self.taux
+
+    def _debut(self):
+        if not self._doit_profiler():
+            return
+        g.sql_chronologie = []
+        g.profil_debut = time.perf_counter()
+        g.profil = cProfile.Profile()
+        g.profil.enable()
+
+    def _fin(self, response):
+        profil = g.pop('profil', None)
+        if profil is None:
+            return response
+        profil.disable()
+        try:
+            nom = self._enregistrer(profil, response)
+            response.headers['X-Profile-Id'] = nom
+        except Exception:
+            logger.exception("Impossible d'enregistrer le profil de %s %s", request.method, request.path)
+        return response
+
+    # --- Stockage ---
+
+    def _enregistrer(self, profil, response):
+        debut = g.profil_debut
+        duree = time.perf_counter() - debut
+        endpoint = (request.endpoint or 'inconnu').replace('.', '-')
+        nom = f"{datetime.now():%Y%m%d-%H%M%S}_{request.method}_{endpoint}_{uuid.uuid4().hex[:8]}"
+
+        profil.dump_stats(os.path.join(self.dossier, nom + '.prof'))
+        resume = io.StringIO()
+        pstats.Stats(profil, stream=resume).sort_stats('cumulative').print_stats(FONCTIONS_RESUME)
+
+        details = {
+            "id": nom,
+            "date": datetime.now().isoformat(),
+            "methode": request.method,
+            "chemin": request.full_path.rstrip('?'),
+            "endpoint": request.endpoint,
+            "statut": response.status_code,
+            "duree_ms": round(duree * 1000, 2),
+            "sql_requetes": g.get('sql_requetes', 0),
+            "sql_duree_ms": round(g.get('sql_duree', 0.0) * 1000, 2),
+            "sql_chronologie": [
+                {"debut_ms": round((t - debut) * 1000, 2), "duree_ms": round(d * 1000, 2), "instruction": instr}
+                for t, d, instr in g.get('sql_chronologie', [])
+            ],
+            "resume": resume.getvalue(),
+        }
+        with open(os.path.join(self.dossier, nom + '.json'), 'w', encoding='utf-8') as fichier:
+            json.dump(details, fichier, ensure_ascii=False, indent=2)
+        self._purger()
+        return nom
+
+    def _purger(self):
+        profils = sorted(f for f in os.listdir(self.dossier) if f.endswith('.json'))
+        for fichier in profils[:max(len(profils) - self.max_fichiers, 0)]:
+            base = os.path.join(self.dossier, fichier[:-len('.json')])
+            for extension in ('.json', '.prof'):
+                if os.path.exists(base + extension):
+                    os.remove(base + extension)
+
+    def lister(self):
+        """Profils enregistrés, du plus récent au plus ancien (sans résumé ni chronologie)."""
+        if not self.dossier or not os.path.isdir(self.dossier):
+            return []
+        profils = []
+        for fichier in sorted(os.listdir(self.dossier), reverse=True):
+            if not fichier.endswith('.json'):
+                continue
+            with open(os.path.join(self.dossier, fichier), encoding='utf-8') as f:
+                details = json.load(f)
+            details.pop('resume', None)
+            details['sql_chronologie'] = len(details.get('sql_chronologie', []))
+            profils.append(details)
+        return profils
+
+    def chemin(self, nom, extension):
+        """Chemin d'un fichier de profil, ou None si le nom est invalide ou inconnu."""
+        if not self.dossier or not NOM_PROFIL.match(nom):
+            return None
+        chemin = os.path.join(self.dossier, nom + extension)
+        return chemin if os.path.exists(chemin) else None
+
+
+profileur = Profileur()
@@ -0,0 +1,160 @@
+import itertools
+import logging
+import threading
+import time
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+from app.pool import options_moteur
+
+logger = logging.getLogger(__name__)
+
+COOKIE_LECTURE_PRIMAIRE = 'lecture_primaire_jusqu_a'
+
+
+class SessionRoutee(Session):
+    """
+    Session qui envoie les lectures d'une requête en lecture seule vers la réplique
+    choisie par `RouteurReplicas`. Les écritures, les flush, les SELECT ... FOR UPDATE et
+    toutes les lectures qui suivent une écriture dans la même requête vont au primaire.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        moteur = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not has_request_context():
+            return moteur
+
+        if self._flushing or _est_ecriture(clause):
+            g.db_ecriture = True
+            return moteur
+
+        cle_replica = g.get('db_replica')
+        if cle_replica is None or g.get('db_ecriture') or g.get('db_primaire') \
+                or moteur is not self._db.engines.get(None):
+            return moteur
+
+        return self._db.engines[cle_replica]
+
+
+def lire_sur_primaire():
+    """
+    Envoie au primaire les lectures restantes de la requête, comme après une écriture mais
+    sans le cookie de lecture après écriture : pour les lectures qu'un retard de réplication
+    fausserait durablement (curseurs de synchronisation).
+    """
+    if has_request_context():
+        g.db_primaire = True
+
+
+def _est_ecriture(clause):
+    if clause is None:
+        return False
+    return getattr(clause, 'is_dml', False) or getattr(clause, '_for_update_arg', None) is not None
+
+
+class RouteurReplicas:
+    """
+    Répartit les requêtes GET entre les répliques déclarées dans SQLALCHEMY_REPLICA_URIS
+    (ajoutées comme binds Flask-SQLAlchemy `replica_<n>`).
+
+    Une réplique est vérifiée par un `SELECT 1` au plus toutes les REPLICA_HEALTH_INTERVAL
+    secondes et écartée en cas d'erreur de connexion ; sans réplique saine, les lectures
+    restent sur le primaire. Après une écriture, un cookie renvoie les lectures de ce client
+    vers le primaire pendant REPLICA_READ_YOUR_WRITES secondes.
+    """
+
+    def __init__(self, db=None, app=None):
+        self.db = db
+        self.cles = []
+        self._etats = {}  # cle -> {'sain': bool, 'verifie_le': float}
+        self._verrou = threading.Lock()
+        self._tourniquet = None
+        self._ecoutes = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """À appeler avant `db.init_app(app)` pour que les binds des répliques soient créés."""
+        uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        self.cles = []
+        for i, uri in enumerate(uris):
+            cle = f'replica_{i}'
+            options = options_moteur(uri, app.config.get('SQLALCHEMY_ENGINE_OPTIONS'), cle)
+            binds[cle] = dict(options, url=uri)
+            self.cles.append(cle)
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+        self.intervalle_sante = app.config.get('REPLICA_HEALTH_INTERVAL', 10)
+        self.delai_lecture_primaire = app.config.get('REPLICA_READ_YOUR_WRITES', 5)
+        self._tourniquet = itertools.cycle(self.cles)
+        app.extensions['routeur_replicas'] = self
+
+        if self.cles:
+            app.before_request(self._choisir_replica)
+            app.after_request(self._memoriser_ecriture)
+
+    def _choisir_replica(self):
+        if request.method not in ('GET', 'HEAD'):
+            return
+        try:
+            lecture_primaire_jusqu_a = float(request.cookies.get(COOKIE_LECTURE_PRIMAIRE, 0))
+        except ValueError:
+            lecture_primaire_jusqu_a = 0
+        if lecture_primaire_jusqu_a > time.time():
+            return
+        g.db_replica = self.replica_saine()
+
+    def _memoriser_ecriture(self, response):
+        if g.get('db_ecriture'):
+            response.set_cookie(
+                COOKIE_LECTURE_PRIMAIRE,
+                str(time.time() + self.delai_lecture_primaire),
+                max_age=self.delai_lecture_primaire,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+    def replica_saine(self):
+        for _ in range(len(self.cles)):
+            cle = next(self._tourniquet)
+            if self._est_saine(cle):
+                return cle
+        return None
+
+    def _est_saine(self, cle):
+        etat = self._etats.get(cle)
+        maintenant = time.monotonic()
+        if etat is not None and maintenant - etat['verifie_le'] < self.intervalle_sante:
+            return etat['sain']
+        # Un seul thread vérifie ; les autres utilisent le dernier état connu
+        if not self._verrou.acquire(blocking=False):
+            return etat['sain'] if etat else False
+        try:
+            moteur = self.db.engines[cle]
+            self._ecouter_erreurs(cle, moteur)
+            try:
+                with moteur.connect() as connexion:
+                    connexion.execute(text('SELECT 1'))
+                sain = True
+            except Exception as e:
+                logger.warning("Réplique %s indisponible: %s", cle, e)
+                sain = False
+            self._etats[cle] = {'sain': sain, 'verifie_le': maintenant}
+            return sain
+        finally:
+            self._verrou.release()
+
+    def _ecouter_erreurs(self, cle, moteur):
+        if cle in self._ecoutes:
+            return
+
+        @event.listens_for(moteur, 'handle_error')
+        def marquer_indisponible(contexte):
+            if contexte.is_disconnect:
+                self._etats[cle] = {'sain': False, 'verifie_le': time.monotonic()}
+
+        self._ecoutes.add(cle)
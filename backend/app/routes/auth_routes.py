@@ -6,8 +6,11 @@ from flask_restx import Namespace, Resource, fields # <--- NOUVEAUX IMPORTS
 from app.models import Utilisateur
 from app import db, bcrypt # Assurez-vous que db et bcrypt sont bien importés depuis app
 import json
+import logging
 from datetime import timedelta
 
+logger = logging.getLogger(__name__)
+
 # --- Définir un Namespace pour les routes d'authentification ---
 # Ce Namespace sera ajouté à l'objet 'api' global dans __init__.py
 ns_auth = Namespace('auth', description='Opérations liées à l\'authentification et la gestion des utilisateurs')
@@ -147,12 +150,8 @@ class UserLogin(Resource):
         response.status_code = 200
         try:
             set_access_cookies(response, access_token)
-            if 'Set-Cookie' in str(response.headers):
-                print("DEBUG: [LOGIN] 'Set-Cookie' header IS present in response object.")
-            else:
-                print("WARNING: [LOGIN] 'Set-Cookie' header IS NOT present in response object after set_access_cookies.")
-        except Exception as e:
-            print(f"ERROR: [LOGIN] Failed to set access cookies: {e}")
+        except Exception:
+            logger.exception("Échec de l'ajout des cookies d'accès à la connexion", extra={'user_id': user.id})
             return jsonify({"message": "Internal server error during cookie setting."}), 500
 
         return response
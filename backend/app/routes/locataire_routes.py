@@ -1,19 +1,32 @@
 import hashlib
 import json
+import logging
 import random
+import time
 import uuid
-from datetime import timedelta, datetime, date
+from datetime import datetime, date
 
-import paydunya
 from dateutil.relativedelta import relativedelta
-from flask import Blueprint, request, jsonify, current_app, redirect
+from flask import Blueprint, Response, request, jsonify, current_app, redirect
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from paydunya import Store, InvoiceItem
+from sqlalchemy import update
 from sqlalchemy.orm import joinedload, selectinload  # Import joinedload here
 
 from app import db
-from app.models import Chambre, Maison, Contrat, Utilisateur, Paiement
+from app.models import Chambre, Maison, Contrat, FactureOrpheline, Utilisateur, Paiement
+from app.replicas import lire_sur_primaire
 from app.serialization import serialize_media  # Add others if needed for other routes
+from app.services.confirmations import confirmations_paydunya
+from app.services.diffusion import diffuseur
+from app.services.disponibilite import index_disponibilite
+from app.services.evenements import donnees_paiement, publier
+from app.services.paydunya_client import PaydunyaIndisponible, PaydunyaRefus, paydunya_client
+from app.services.reconciliation import STATUTS_EN_ATTENTE
+from app.services.reservation import verrouiller_chambre, contrats_chevauchants
+from app.services.synchronisation import CurseurInvalide, changements_locataire, lire_curseur
+from app.suivi_sql import budget_sql
+
+logger = logging.getLogger(__name__)
 
 locataire_bp = Blueprint('locataire', __name__, url_prefix='/api/locataire')
 
@@ -32,6 +45,23 @@ def search_chambres():
     type_chambre = request.args.get('type')
     meublee = request.args.get('meublee')
     disponible = request.args.get('disponible', type=bool, default=True)
+    date_debut_str = request.args.get('date_debut')
+    date_fin_str = request.args.get('date_fin')
+
+    periode = None
+    if date_debut_str or date_fin_str:
+        if not (date_debut_str and date_fin_str):
+            return jsonify({"message": "Les paramètres 'date_debut' et 'date_fin' doivent être fournis ensemble."}), 400
+        try:
+            periode = (datetime.strptime(date_debut_str, '%Y-%m-%d').date(),
+                       datetime.strptime(date_fin_str, '%Y-%m-%d').date())
+        except ValueError:
+            return jsonify({"message": "Format de date invalide. Utilisez YYYY-MM-DD."}), 400
+        if periode[0] >= periode[1]:
+            return jsonify({"message": "La date de fin doit être postérieure à la date de début."}), 400
+        # Une chambre louée aujourd'hui peut être libre sur la période demandée
+        if 'disponible' not in request.args:
+            disponible = None
 
     # Use joinedload for optimization
     query = Chambre.query.join(Maison) \
@@ -57,6 +87,9 @@ def search_chambres():
 
     chambres = query.all()
 
+    if periode:
+        chambres = [c for c in chambres if index_disponibilite.est_libre(c.id, *periode)]
+
     if not chambres:
         return jsonify({"message": "Aucune chambre trouvée avec ces critères."}), 404
 
@@ -126,32 +159,26 @@ def generer_paiements_contrat(contrat: Contrat):
             contrat_id=contrat.id,
             montant=contrat.montant_caution,
             date_echeance=contrat.date_debut,
-            statut='impayé',
-            description="Paiement de la caution"
+            statut='impayé'
         )
         db.session.add(paiement_caution)
         paiements_generes.append(paiement_caution)
 
+    mois = 0
     while current_date <= contrat.date_fin:
         paiement_loyer = Paiement(
             contrat_id=contrat.id,
             montant=loyer_mensuel,
             date_echeance=current_date,
-            statut='impayé',
-            description=f"Loyer du mois de {current_date.strftime('%B %Y')}"
+            statut='impayé'
         )
         db.session.add(paiement_loyer)
         paiements_generes.append(paiement_loyer)
 
-        year = current_date.year
-        month = current_date.month + 1
-        if month > 12:
-            month = 1
-            year += 1
-        try:
-            current_date = date(year, month, current_date.day)
-        except ValueError:
-            current_date = date(year, month, 1) + timedelta(days=-1)
+        # Toujours calculé depuis la date de début : une échéance au 31 reste au dernier
+        # jour des mois plus courts au lieu de boucler sur la même date
+        mois += 1
+        current_date = contrat.date_debut + relativedelta(months=+mois)
 
     return paiements_generes
 
@@ -169,14 +196,6 @@ def soumettre_demande_location(chambre_id):
     if not chambre:
         return jsonify({"message": "Chambre non trouvée."}), 404
 
-    contrat_existant_ou_attente = Contrat.query.filter(
-        Contrat.chambre_id == chambre_id,
-        Contrat.statut.in_(['actif', 'en_attente_validation'])
-    ).first()
-
-    if contrat_existant_ou_attente:
-        return jsonify({"message": "Cette chambre a déjà une demande de location en attente ou un contrat actif."}), 400
-
     data = request.get_json()
     if not data:
         return jsonify({"message": "Données de requête manquantes."}), 400
@@ -200,6 +219,14 @@ def soumettre_demande_location(chambre_id):
         return jsonify({"message": f"Erreur de validation des données: {str(e)}"}), 400
 
     try:
+        # Verrouiller la chambre avant de vérifier les chevauchements : deux demandes
+        # simultanées sont ainsi traitées l'une après l'autre.
+        chambre = verrouiller_chambre(chambre_id)
+
+        if contrats_chevauchants(chambre.id, date_debut, date_fin).first():
+            db.session.rollback()
+            return jsonify({"message": "Cette chambre a déjà une demande de location en attente ou un contrat actif sur cette période."}), 400
+
         loyer_mensuel = chambre.prix
         mois_caution = 1  # Par défaut, la caution est d'un mois de loyer
         montant_caution_calcule = loyer_mensuel * mois_caution
@@ -452,6 +479,100 @@ def get_mes_paiements():
     return jsonify(results), 200
 
 
+@locataire_bp.route('/changements', methods=['GET'])
+@jwt_required()
+@budget_sql(8)
+def get_changements():
+    """
+    Synchronisation incrémentale du tableau de bord : contrats, paiements, chambres et médias
+    modifiés depuis le curseur `since`, et identifiants supprimés. Le client renvoie le
+    `curseur` reçu à l'appel suivant ; sans `since`, tout est renvoyé (`complet`).
+    """
+    current_user_id = get_current_locataire()
+    locataire = Utilisateur.query.get(current_user_id)
+
+    if not locataire or locataire.role != 'locataire':
+        return jsonify({"message": "Accès refusé."}), 403
+
+    try:
+        depuis = lire_curseur(request.args.get('since'))
+    except CurseurInvalide as e:
+        return jsonify({"message": str(e)}), 400
+
+    # Un changement pas encore répliqué serait en deçà du curseur renvoyé, donc jamais envoyé
+    lire_sur_primaire()
+
+    return jsonify(changements_locataire(locataire.id, depuis)), 200
+
+
+def format_sse(evenement, donnees, identifiant=None):
+    lignes = [f"id: {identifiant}"] if identifiant is not None else []
+    lignes.append(f"event: {evenement}")
+    lignes.append(f"data: {json.dumps(donnees, default=str, ensure_ascii=False)}")
+    return "\n".join(lignes) + "\n\n"
+
+
+@locataire_bp.route('/paiements/flux', methods=['GET'])
+@jwt_required()
+def flux_paiements():
+    """
+    Flux Server-Sent Events des changements de statut des paiements du locataire : un
+    événement `etat` (paiements en attente de PayDunya) à l'ouverture, puis un événement par
+    changement validé (`paiement.paye`, `paiement.annule`). Le flux se ferme après
+    SSE_DUREE_MAX secondes ; le navigateur se reconnecte et reçoit un nouvel état.
+    204 si ce worker ne sert pas de flux (SSE_ACTIF) : EventSource ne se reconnecte pas et le
+    front recharge la liste périodiquement.
+    """
+    current_user_id = get_current_locataire()
+    locataire = Utilisateur.query.get(current_user_id)
+
+    if not locataire or locataire.role != 'locataire':
+        return jsonify({"message": "Accès refusé."}), 403
+
+    if not diffuseur.flux_actifs:
+        return '', 204
+
+    # Abonnement avant l'état initial : un changement validé entre les deux n'est pas perdu
+    abonnement = diffuseur.abonner(f'locataire:{locataire.id}')
+    try:
+        en_attente = db.session.query(Paiement.id, Paiement.statut).join(Contrat).filter(
+            Contrat.locataire_id == locataire.id,
+            Paiement.statut.in_(STATUTS_EN_ATTENTE)
+        ).all()
+    except Exception:
+        diffuseur.desabonner(abonnement)
+        raise
+    # Le flux ne garde pas de connexion à la base pendant qu'il attend
+    db.session.rollback()
+
+    config = current_app.config
+    battement = config['SSE_BATTEMENT']
+    duree_max = config['SSE_DUREE_MAX']
+    reconnexion_ms = config['SSE_RECONNEXION_MS']
+
+    def generer():
+        try:
+            yield f"retry: {reconnexion_ms}\n\n"
+            yield format_sse('etat', {"paiements_en_attente": [{"id": p.id, "statut": p.statut} for p in en_attente]})
+            fin = time.monotonic() + duree_max
+            while not abonnement.deborde:
+                restant = fin - time.monotonic()
+                if restant <= 0:
+                    break
+                message = abonnement.attendre(min(battement, restant))
+                if message is None:
+                    yield ": battement\n\n"
+                else:
+                    yield format_sse(message['type'], message['donnees'], message['id'])
+        finally:
+            diffuseur.desabonner(abonnement)
+
+    return Response(generer(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # pas de mise en tampon par nginx
+    })
+
+
 @locataire_bp.route('/paiements/<int:paiement_id>/marquer-paye', methods=['PUT'])
 @jwt_required()
 def marquer_paiement_paye(paiement_id):
@@ -479,6 +600,8 @@ def marquer_paiement_paye(paiement_id):
         paiement.statut = 'paye'
         paiement.date_paiement = date.today()  # Enregistrer la date du paiement
         db.session.add(paiement)
+        publier('paiement.paye', f'paiement:{paiement.id}', donnees_paiement(
+            paiement, locataire_id=locataire.id, date_paiement=paiement.date_paiement, source='manuel'))
         db.session.commit()
         return jsonify({"message": "Paiement marqué comme payé avec succès."}), 200
     except Exception as e:
@@ -488,6 +611,7 @@ def marquer_paiement_paye(paiement_id):
 
 @locataire_bp.route('/mes-chambres', methods=['GET'])
 @jwt_required()
+@budget_sql(2)
 def get_mes_chambres():
     current_user_id = get_current_locataire()
     locataire = Utilisateur.query.get(current_user_id)
@@ -531,6 +655,54 @@ def get_mes_chambres():
     return jsonify(results), 200
 
 
+def facture_paydunya(paiement, locataire_id):
+    """Facture au format de l'API checkout-invoice de PayDunya pour une échéance."""
+    # 1. Informations du Store
+    store_info = {
+        "name": "Social Logement",
+        "tagline": "Facilitez vos paiements de loyer",
+        "phone_number": "771234567",  # Exemple, à remplacer par le numéro de votre entreprise
+        "email": "contact@sociallogement.com",  # Exemple
+        # Vous pouvez ajouter "website_url" et "logo_url" si vous les avez
+    }
+
+    # 2. Article de la facture : total_price doit être le produit de quantity * unit_price
+    montant = float(paiement.montant)
+    item_data = {
+        "name": f"Loyer pour {paiement.contrat.chambre.titre}",
+        "quantity": 1,
+        "unit_price": montant,
+        "total_price": montant,
+        "description": f"Paiement de loyer pour le contrat {paiement.contrat_id}",
+    }
+
+    # 3. Facture au format de l'API checkout-invoice : le montant total doit correspondre à la
+    # somme des total_price des articles. Les canaux (facultatifs) restreignent les moyens de paiement
+    facture = {
+        "invoice": {
+            "items": [item_data],
+            "taxes": {},
+            "total_amount": montant * item_data["quantity"],
+            "description": f"Paiement de loyer pour le contrat {paiement.contrat_id} - Échéance {paiement.date_echeance.isoformat()}",
+            "channels": ['orange-money-senegal', 'wave-senegal'],
+        },
+        "store": store_info,
+        # 4. Données supplémentaires, renvoyées par PayDunya à la confirmation
+        "custom_data": {
+            "paiement_id": paiement.id,
+            "locataire_id": locataire_id,
+            "contrat_id": paiement.contrat_id
+        },
+        # 5. URLs de retour et de callback
+        "actions": {
+            "cancel_url": current_app.config['PAYDUNYA_CANCEL_URL'],
+            "return_url": current_app.config['PAYDUNYA_RETURN_URL'],
+            "callback_url": current_app.config['PAYDUNYA_CALLBACK_URL'],
+        },
+    }
+    return facture
+
+
 @locataire_bp.route('/paiements/<int:paiement_id>/initier-paydunya', methods=['POST'])
 @jwt_required()
 def initier_paydunya_payment(paiement_id):
@@ -556,106 +728,113 @@ def initier_paydunya_payment(paiement_id):
     # Aucun besoin de 'phone_number' ou 'operator' ici pour l'initialisation PAR (Payment Avec Redirection)
     # L'utilisateur choisira son moyen de paiement sur la page PayDunya.
     # Les canaux peuvent être ajoutés pour filtrer les options si désiré, mais ne sont pas obligatoires.
+    facture = facture_paydunya(paiement, locataire.id)
 
-    try:
-        # 1. Configuration des informations du Store
-        store_info = {
-            "name": "Social Logement",
-            "tagline": "Facilitez vos paiements de loyer",
-            "phone_number": "771234567",  # Exemple, à remplacer par le numéro de votre entreprise
-            "email": "contact@sociallogement.com",  # Exemple
-            # Vous pouvez ajouter "website_url" et "logo_url" si vous les avez
-        }
-        store = Store(**store_info)
-
-        # 3. Ajout des articles à la facture
-        item_data = InvoiceItem(
-            name=f"Loyer pour {paiement.contrat.chambre.titre}",
-            quantity=1,
-            unit_price=float(paiement.montant),
-            total_price=float(paiement.montant),  # total_price doit être le produit de quantity * unit_price
-            description=f"Paiement de loyer pour le contrat {paiement.contrat_id}"
-        )
-
-        # 2. Création de l'objet Invoice
-        invoice = paydunya.Invoice(store)
-
-        invoice.add_items([item_data])
-
-        # 4. Configuration du montant total de la facture
-        # Ce montant doit correspondre à la somme des total_price des items
-        invoice.total_amount = float(paiement.montant) * item_data.quantity
-
-        # 5. Ajout de la description générale de la facture (facultatif)
-        invoice.description = f"Paiement de loyer pour le contrat {paiement.contrat_id} - Échéance {paiement.date_echeance.isoformat()}"
-
-        # 6. Ajout de données supplémentaires (custom_data)
-        invoice.add_custom_data({
-            "paiement_id": paiement.id,
-            "locataire_id": locataire.id,
-            "contrat_id": paiement.contrat.id
-        })
+    # L'appel à PayDunya peut durer plusieurs secondes : la transaction de lecture est close
+    # avant, pour ne pas immobiliser une connexion du pool pendant l'attente
+    db.session.rollback()
 
-        # 7. Configuration des URLs de retour et de callback
-        invoice.callback_url = current_app.config['PAYDUNYA_CALLBACK_URL']
-        invoice.return_url = current_app.config['PAYDUNYA_RETURN_URL']
-        invoice.cancel_url = current_app.config['PAYDUNYA_CANCEL_URL']
-
-        # 8. Ajouter des canaux spécifiques si vous voulez restreindre les options (facultatif)
-        invoice.add_channel('orange-money-senegal')
-        invoice.add_channel('wave-senegal')
-
-        success, paydunya_api_response = invoice.create()
-
-        if success:
-
-            paydunya_token = paydunya_api_response.get('token')
-            payment_page_url = paydunya_api_response.get('response_text')
+    try:
+        paydunya_api_response = paydunya_client.creer_facture(facture)
 
-            if not paydunya_token or not payment_page_url:
-                print(
-                    f"DEBUG: Token ou URL de paiement manquant dans la réponse PayDunya: {json.dumps(paydunya_api_response, indent=2)}")
-                return jsonify({
-                    "message": "Erreur: Token ou URL de paiement non reçu de PayDunya.",
-                    "status": "failed",
-                    "error_details": "Token or checkout_url is missing in PayDunya API response."
-                }), 400
+        paydunya_token = paydunya_api_response.get('token')
+        payment_page_url = paydunya_api_response.get('response_text')
 
-            # Mettre à jour le statut du paiement et sauvegarder le token PayDunya
-            paiement.statut = 'en_cours_traitement'
-            paiement.paydunya_invoice_token = paydunya_token
-            db.session.add(paiement)
-            db.session.commit()
-
-            # Retourner l'URL de redirection au frontend
-            return jsonify({
-                "message": "Paiement initié avec succès. Redirection vers PayDunya.",
-                "paydunya_invoice_token": paydunya_token,
-                "status": "initiated",
-                "redirect_url": payment_page_url  # Cette URL doit être fournie au frontend
-            }), 200
-        else:
-            # En cas d'échec de la création de la facture par PayDunya
-            error_message = paydunya_api_response.get('response_text', "Erreur inconnue.")
-            response_code = paydunya_api_response.get('response_code', "N/A")
-            print(f"PayDunya Invoice Creation Failed: {error_message} - Response Code: {response_code}")
+        if not paydunya_token or not payment_page_url:
+            logger.warning("Token ou URL de paiement manquant dans la réponse PayDunya",
+                           extra={'paiement_id': paiement_id, 'reponse_paydunya': paydunya_api_response})
             return jsonify({
-                "message": f"Échec de l'initialisation PayDunya: {error_message}",
+                "message": "Erreur: Token ou URL de paiement non reçu de PayDunya.",
                 "status": "failed",
-                "error_details": error_message
+                "error_details": "Token or checkout_url is missing in PayDunya API response."
             }), 400
 
+        # Mettre à jour le statut du paiement et sauvegarder le token PayDunya. Une autre demande
+        # a pu initier ce paiement pendant l'appel : la mise à jour ne s'applique qu'une fois
+        resultat = db.session.execute(
+            update(Paiement)
+            .where(Paiement.id == paiement_id, Paiement.statut.notin_(['paye', 'en_cours_traitement']))
+            .values(statut='en_cours_traitement', paydunya_invoice_token=paydunya_token)
+        )
+        if resultat.rowcount == 0:
+            # La facture créée n'est rattachée à aucun paiement : elle est consignée pour qu'un
+            # callback sur ce token puisse encore être rapproché du paiement
+            logger.warning("Facture PayDunya orpheline : le paiement a été initié par une autre demande",
+                           extra={'paiement_id': paiement_id, 'invoice_token': paydunya_token})
+            db.session.add(FactureOrpheline(paiement_id=paiement_id, invoice_token=paydunya_token))
+            db.session.commit()
+            return jsonify({"message": "Ce paiement est déjà effectué ou en cours de traitement."}), 400
+        db.session.commit()
+
+        # Retourner l'URL de redirection au frontend
+        return jsonify({
+            "message": "Paiement initié avec succès. Redirection vers PayDunya.",
+            "paydunya_invoice_token": paydunya_token,
+            "status": "initiated",
+            "redirect_url": payment_page_url  # Cette URL doit être fournie au frontend
+        }), 200
+
+    except PaydunyaIndisponible as e:
+        # PayDunya lent ou en panne : on répond tout de suite plutôt que de bloquer le worker
+        reponse = jsonify({
+            "message": "Le service de paiement est momentanément indisponible. Veuillez réessayer dans quelques instants.",
+            "status": "failed",
+            "error_details": str(e)
+        })
+        if e.reessayer_dans:
+            reponse.headers['Retry-After'] = str(int(e.reessayer_dans))
+        return reponse, 503
+
+    except PaydunyaRefus as e:
+        # En cas d'échec de la création de la facture par PayDunya
+        logger.warning("Échec de la création de la facture PayDunya",
+                       extra={'paiement_id': paiement_id, 'erreur': e.texte, 'code_reponse': e.code})
+        return jsonify({
+            "message": f"Échec de l'initialisation PayDunya: {e.texte}",
+            "status": "failed",
+            "error_details": e.texte
+        }), 400
+
     except Exception as e:
         db.session.rollback()
-        print(f"Erreur interne lors de l'initialisation du paiement PayDunya: {str(e)}")
+        logger.exception("Erreur interne lors de l'initialisation du paiement PayDunya", extra={'paiement_id': paiement_id})
         return jsonify(
             {"message": f"Erreur interne lors de l'initialisation du paiement: {str(e)}", "status": "failed"}), 500
 
 
-@locataire_bp.route('/paydunya/callback', methods=['POST'])
-def paydunya_callback():
+def traiter_facture_orpheline(paiement, invoice_token, status, transaction_id):
+    """
+    Callback sur une facture orpheline : un règlement est appliqué au paiement s'il n'est pas
+    déjà payé (sinon le locataire a payé deux fois, à rembourser) ; les autres statuts ne
+    concernent pas la facture en cours du paiement et sont ignorés.
+    """
+    contexte = {'paiement_id': paiement.id, 'invoice_token': invoice_token, 'statut_paydunya': status}
+    if status != 'completed':
+        logger.info("Callback PayDunya ignoré pour une facture orpheline", extra=contexte)
+        return jsonify({"message": "Orphan invoice, payment unchanged"}), 200
+    if paiement.statut == 'paye':
+        # Le même callback renvoyé par PayDunya n'est pas un second règlement
+        if paiement.paydunya_transaction_id != transaction_id:
+            logger.error("Facture orpheline réglée pour un paiement déjà payé : paiement en double à rembourser",
+                         extra=dict(contexte, transaction_id=transaction_id))
+    else:
+        paiement.statut = 'paye'
+        paiement.date_paiement = datetime.now().date()
+        paiement.paydunya_transaction_id = transaction_id
+        db.session.add(paiement)
+        publier('paiement.paye', f'paiement:{paiement.id}', donnees_paiement(
+            paiement, locataire_id=paiement.contrat.locataire_id, date_paiement=paiement.date_paiement,
+            source='callback_facture_orpheline'))
+        db.session.commit()
+        logger.info("Paiement marqué payé par une facture orpheline", extra=contexte)
+    confirmations_paydunya.enregistrer(invoice_token, status)
+    return jsonify({"message": "Payment updated to completed"}), 200
+
+
+def analyser_formulaire_imbrique(formulaire):
+    """Transforme les clés `data[invoice][token]` du callback PayDunya en dictionnaires imbriqués."""
     data = {}
-    for key, value in request.form.items():
+    for key, value in formulaire.items():
         parts = key.split('[')
         current_dict = data
         for i, part in enumerate(parts):
@@ -666,8 +845,14 @@ def paydunya_callback():
                 if part not in current_dict:
                     current_dict[part] = {}
                 current_dict = current_dict[part]
+    return data
+
+
+@locataire_bp.route('/paydunya/callback', methods=['POST'])
+def paydunya_callback():
+    data = analyser_formulaire_imbrique(request.form)
 
-    print(f"DEBUG: Reconstructed Callback Data: {json.dumps(data, indent=2)}")
+    logger.debug("Callback PayDunya reçu", extra={'donnees': data})
 
     received_hash = data.get('data', {}).get('hash')
     invoice_token = data.get('data', {}).get('invoice', {}).get('token')
@@ -675,49 +860,31 @@ def paydunya_callback():
     transaction_id = data.get('data', {}).get('invoice', {}).get('transaction_id')
 
     if not received_hash:
-        print("Missing 'data[hash]' in PayDunya callback data (from request.form).")
+        logger.warning("Callback PayDunya sans data[hash]")
         return jsonify({"message": "Missing hash in callback"}), 400
 
     if not invoice_token:
-        print("Missing 'data[invoice][token]' in PayDunya callback data (from request.form).")
+        logger.warning("Callback PayDunya sans data[invoice][token]")
         return jsonify({"message": "Missing invoice token"}), 400
 
     master_key = current_app.config['PAYDUNYA_MASTER_KEY']
 
     try:
-        data_for_hashing = {}
-        for key, value in request.form.items():
-            if key.startswith('data[') and key != 'data[hash]':
-                data_for_hashing[key] = value
-
-        parsed_data = {}
-        for key, value in request.form.items():
-            parts = key.split('[')
-            current = parsed_data
-            for i, part in enumerate(parts):
-                part = part.replace(']', '')
-                if i == len(parts) - 1:
-                    current[part] = value
-                else:
-                    if part not in current:
-                        current[part] = {}
-                    current = current[part]
-
-        data_to_hash_dict = parsed_data.get('data', {}).copy()
-        if 'hash' in data_to_hash_dict:
-            del data_to_hash_dict['hash']
-
         expected_hash = hashlib.sha512(master_key.encode('utf-8')).hexdigest()
 
         if expected_hash != received_hash:
-            print(f"Hash mismatch! Expected: {expected_hash}, Received: {received_hash}")
+            logger.warning("Signature invalide pour le callback PayDunya", extra={'invoice_token': invoice_token})
             return jsonify({"message": "Invalid Hash Signature"}), 403
 
         # If the hash is valid, proceed with payment processing
         paiement = Paiement.query.filter_by(paydunya_invoice_token=invoice_token).first()
 
         if not paiement:
-            print(f"Callback received for unknown invoice token: {invoice_token}")
+            # Facture créée par une initiation qui a perdu la course (voir initier_paydunya_payment)
+            orpheline = FactureOrpheline.query.filter_by(invoice_token=invoice_token).first()
+            if orpheline is not None:
+                return traiter_facture_orpheline(orpheline.paiement, invoice_token, status, transaction_id)
+            logger.warning("Callback PayDunya pour une facture inconnue", extra={'invoice_token': invoice_token})
             return jsonify({"message": "Payment not found"}), 404
 
         # Update payment status
@@ -727,32 +894,42 @@ def paydunya_callback():
                 paiement.date_paiement = datetime.now().date()
                 paiement.paydunya_transaction_id = transaction_id
                 db.session.add(paiement)
+                publier('paiement.paye', f'paiement:{paiement.id}', donnees_paiement(
+                    paiement, locataire_id=paiement.contrat.locataire_id, date_paiement=paiement.date_paiement,
+                    source='callback'))
                 db.session.commit()
-                print(f"Paiement {paiement.id} for invoice {invoice_token} marked as paid.")
+                logger.info("Paiement marqué payé", extra={'paiement_id': paiement.id, 'invoice_token': invoice_token})
+            confirmations_paydunya.enregistrer(invoice_token, status)
             return jsonify({"message": "Payment updated to completed"}), 200
         elif status == 'pending':
-            print(f"Paiement {paiement.id} for invoice {invoice_token} is still pending.")
+            logger.info("Paiement toujours en attente", extra={'paiement_id': paiement.id, 'invoice_token': invoice_token})
             if paiement.statut not in ['en_cours_traitement', 'pending_paydunya_status']:
                 paiement.statut = 'en_cours_traitement'
                 db.session.add(paiement)
                 db.session.commit()
+            confirmations_paydunya.enregistrer(invoice_token, status)
             return jsonify({"message": "Payment still pending"}), 200
         elif status in ['cancelled', 'failed', 'expired']:
             if paiement.statut != 'impaye':
                 paiement.statut = 'impaye'
                 paiement.paydunya_transaction_id = None
                 db.session.add(paiement)
+                publier('paiement.annule', f'paiement:{paiement.id}', donnees_paiement(
+                    paiement, locataire_id=paiement.contrat.locataire_id, statut_paydunya=status,
+                    source='callback'))
                 db.session.commit()
-                print(f"Paiement {paiement.id} for invoice {invoice_token} marked as {status}.")
+                logger.info("Paiement marqué impayé", extra={'paiement_id': paiement.id, 'invoice_token': invoice_token,
+                                                            'statut_paydunya': status})
+            confirmations_paydunya.enregistrer(invoice_token, status)
             return jsonify({"message": f"Payment updated to {status}"}), 200
         else:
-            print(f"Unknown status received for invoice {invoice_token}: {status}")
+            logger.warning("Statut PayDunya inconnu", extra={'invoice_token': invoice_token, 'statut_paydunya': status})
             return jsonify({"message": "Unknown status"}), 400
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error processing PayDunya callback for invoice {invoice_token}: {str(e)}")
-        print(f"Full callback request data (from request.form): {request.form}")  # Log request.form for debugging
+        logger.exception("Erreur lors du traitement du callback PayDunya", extra={'invoice_token': invoice_token})
+        logger.debug("Formulaire du callback PayDunya en erreur", extra={'formulaire': request.form.to_dict()})
         return jsonify({"message": f"Internal server error: {str(e)}"}), 500
 
 
@@ -761,25 +938,34 @@ def paiement_succes():
     paydunya_token = request.args.get('token')
 
     if not paydunya_token:
-        print("Token de paiement manquant sur la page de succès.")
+        logger.warning("Token de paiement manquant sur la page de succès")
         return redirect("http://localhost:5173/lodger/dashboard/paiements?status=error&message=token_missing")
 
-    invoice = paydunya.Invoice()  # Instanciation de l'objet Invoice
-    print(f"DEBUG: Invoice: {invoice}")
-    successful, response = invoice.confirm(paydunya_token)
-    print(f"DEBUG: Response: {json.dumps(response, indent=2)}")
     try:
-        if successful and response['status'] == "completed":
-            print(f"Paiement {paydunya_token} confirmé avec succès via return_url.")
+        status_paydunya = confirmations_paydunya.statut(paydunya_token)
+        if status_paydunya == "completed":
+            logger.info("Paiement confirmé via return_url", extra={'invoice_token': paydunya_token})
             return redirect(f"http://localhost:5173/lodger/dashboard/paiements?token={paydunya_token}&status=success")
         else:
-            status_paydunya = response.status if response else "unknown"
-            print(f"Paiement {paydunya_token} non confirmé comme complété. Statut PayDunya: {status_paydunya}")
+            logger.info("Paiement non complété au retour de PayDunya",
+                        extra={'invoice_token': paydunya_token, 'statut_paydunya': status_paydunya})
             return redirect(
                 f"http://localhost:5173/lodger/dashboard/paiements?token={paydunya_token}&status={status_paydunya}&message=payment_not_completed")
 
-    except Exception as e:
-        print(f"Erreur lors de la vérification du statut PayDunya via return_url: {e}")
+    except PaydunyaIndisponible:
+        logger.warning("PayDunya indisponible lors de la vérification via return_url", extra={'invoice_token': paydunya_token})
+        return redirect(
+            f"http://localhost:5173/lodger/dashboard/paiements?token={paydunya_token}&status=pending&message=verification_unavailable")
+
+    except PaydunyaRefus as e:
+        logger.warning("Vérification refusée par PayDunya via return_url",
+                       extra={'invoice_token': paydunya_token, 'erreur': e.texte, 'code_reponse': e.code})
+        return redirect(
+            f"http://localhost:5173/lodger/dashboard/paiements?token={paydunya_token}&status=error&message=invoice_not_found")
+
+    except Exception:
+        logger.exception("Erreur lors de la vérification du statut PayDunya via return_url",
+                         extra={'invoice_token': paydunya_token})
         return redirect(
             f"http://localhost:5173/lodger/dashboard/paiements?token={paydunya_token}&status=error&message=internal_verification_error")
 
@@ -789,19 +975,30 @@ def paiement_cancel():
     paydunya_token = request.args.get('token')
 
     if not paydunya_token:
-        print("Token de paiement manquant sur la page d'annulation.")
+        logger.warning("Token de paiement manquant sur la page d'annulation")
         return redirect("http://localhost:5173/lodger/dashboard/paiements?status=error&message=token_missing")
 
     try:
-        invoice = paydunya.Invoice()  # Instanciation de l'objet Invoice
-        successful, response = invoice.confirm(paydunya_token)
-        status_paydunya = response.status if response else "unknown"
+        status_paydunya = confirmations_paydunya.statut(paydunya_token)
 
-        print(f"Paiement {paydunya_token} annulé/échoué via cancel_url. Statut PayDunya: {status_paydunya}")
+        logger.info("Paiement annulé ou échoué via cancel_url",
+                    extra={'invoice_token': paydunya_token, 'statut_paydunya': status_paydunya})
         return redirect(
             f"http://localhost:5173/lodger/dashboard/paiements?token={paydunya_token}&status={status_paydunya}&message=payment_cancelled_or_failed")
 
-    except Exception as e:
-        print(f"Erreur lors de la vérification du statut PayDunya via cancel_url: {e}")
+    except PaydunyaIndisponible:
+        logger.warning("PayDunya indisponible lors de la vérification via cancel_url", extra={'invoice_token': paydunya_token})
+        return redirect(
+            f"http://localhost:5173/lodger/dashboard/paiements?token={paydunya_token}&status=pending&message=verification_unavailable")
+
+    except PaydunyaRefus as e:
+        logger.warning("Vérification refusée par PayDunya via cancel_url",
+                       extra={'invoice_token': paydunya_token, 'erreur': e.texte, 'code_reponse': e.code})
+        return redirect(
+            f"http://localhost:5173/lodger/dashboard/paiements?token={paydunya_token}&status=error&message=invoice_not_found")
+
+    except Exception:
+        logger.exception("Erreur lors de la vérification du statut PayDunya via cancel_url",
+                         extra={'invoice_token': paydunya_token})
         return redirect(
             f"http://localhost:5173/lodger/dashboard/paiements?token={paydunya_token}&status=error&message=internal_verification_error")
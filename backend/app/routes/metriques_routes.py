@@ -0,0 +1,69 @@
+from flask import send_file
+from flask_restx import Namespace, Resource
+
+from app import db
+from app.decorators import metrics_token_required
+from app.pool import etat_pools
+from app.profilage import profileur
+
+ns_metriques = Namespace('metriques', description='Métriques techniques de l\'application')
+
+
+@ns_metriques.route('/pool')
+class RessourceMetriquesPool(Resource):
+    @metrics_token_required
+    @ns_metriques.response(200, 'État des pools de connexions')
+    @ns_metriques.response(401, 'Jeton de métriques invalide')
+    @ns_metriques.response(403, 'METRICS_TOKEN non configuré (hors mode debug)')
+    def get(self):
+        """
+        Retourne, pour chaque base, les connexions utilisées, le débordement et les temps d'attente au checkout.
+        """
+        return etat_pools(db.engines), 200
+
+
+@ns_metriques.route('/profils')
+class ListeProfils(Resource):
+    @metrics_token_required
+    @ns_metriques.response(200, 'Profils enregistrés')
+    @ns_metriques.response(401, 'Jeton de métriques invalide')
+    @ns_metriques.response(403, 'METRICS_TOKEN non configuré (hors mode debug)')
+    def get(self):
+        """
+        Liste les profils de requêtes enregistrés.
+        """
+        return profileur.lister(), 200
+
+
+@ns_metriques.route('/profils/<string:nom>')
+class DetailProfil(Resource):
+    @metrics_token_required
+    @ns_metriques.response(200, 'Résumé cProfile et chronologie SQL du profil')
+    @ns_metriques.response(401, 'Jeton de métriques invalide')
+    @ns_metriques.response(403, 'METRICS_TOKEN non configuré (hors mode debug)')
+    @ns_metriques.response(404, 'Profil non trouvé')
+    def get(self, nom):
+        """
+        Retourne le résumé d'un profil et la chronologie de ses requêtes SQL.
+        """
+        chemin = profileur.chemin(nom, '.json')
+        if chemin is None:
+            ns_metriques.abort(404, "Profil non trouvé.")
+        return send_file(chemin, mimetype='application/json')
+
+
+@ns_metriques.route('/profils/<string:nom>/pstats')
+class FichierProfil(Resource):
+    @metrics_token_required
+    @ns_metriques.response(200, 'Fichier pstats (à ouvrir avec pstats ou snakeviz)')
+    @ns_metriques.response(401, 'Jeton de métriques invalide')
+    @ns_metriques.response(403, 'METRICS_TOKEN non configuré (hors mode debug)')
+    @ns_metriques.response(404, 'Profil non trouvé')
+    def get(self, nom):
+        """
+        Télécharge le profil brut au format pstats.
+        """
+        chemin = profileur.chemin(nom, '.prof')
+        if chemin is None:
+            ns_metriques.abort(404, "Profil non trouvé.")
+        return send_file(chemin, mimetype='application/octet-stream', as_attachment=True, download_name=nom + '.prof')
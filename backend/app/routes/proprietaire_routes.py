@@ -1,8 +1,8 @@
 import json
+import logging
 import os
 from datetime import date, datetime
 
-from dateutil.relativedelta import relativedelta
 from flask import request, jsonify, current_app, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from flask_restx import Namespace, Resource, fields
@@ -11,6 +11,16 @@ from werkzeug.utils import secure_filename
 
 from app.decorators import role_required
 from app.models import db, Utilisateur, Maison, Chambre, Contrat, Paiement, Media
+from app.replicas import lire_sur_primaire
+from app.services.evenements import donnees_contrat, publier
+from app.services.operations import TYPES_OPERATIONS, executer_operations
+from app.services.reservation import (changer_statut_contrat, contrats_chevauchants, echeancier_approbation,
+                                      verrouiller_chambre)
+from app.services.synchronisation import CurseurInvalide, changements_proprietaire, lire_curseur
+from app.services.tableau_de_bord import tableau_de_bord_proprietaire
+from app.suivi_sql import budget_sql
+
+logger = logging.getLogger(__name__)
 
 proprietaire_ns = Namespace('proprietaire', description='Opérations spécifiques aux propriétaires')
 
@@ -235,6 +245,40 @@ demande_location_attente_model = proprietaire_ns.model('DemandeLocationAttente',
     'statut': fields.String(description='Statut de la demande')
 })
 
+# Modèles pour les opérations en lot
+operation_model = proprietaire_ns.model('Operation', {
+    'type': fields.String(required=True, enum=list(TYPES_OPERATIONS), description="Type d'opération"),
+    'id': fields.Integer(required=True, description='ID de la chambre, du contrat ou du paiement'),
+    'titre': fields.String(description='modifier_chambre : titre'),
+    'description': fields.String(description='modifier_chambre : description'),
+    'taille': fields.String(description='modifier_chambre : taille'),
+    'type_chambre': fields.String(description='modifier_chambre : type de la chambre'),
+    'meublee': fields.Boolean(description='modifier_chambre : meublée'),
+    'salle_de_bain': fields.Boolean(description='modifier_chambre : salle de bain'),
+    'prix': fields.Float(description='modifier_chambre : prix'),
+    'disponible': fields.Boolean(description='modifier_chambre : disponible')
+})
+
+operations_model = proprietaire_ns.model('Operations', {
+    'operations': fields.List(fields.Nested(operation_model), required=True, description='Opérations à appliquer'),
+    'atomique': fields.Boolean(default=False, description='Tout ou rien : aucune opération appliquée si une est refusée')
+})
+
+resultat_operation_model = proprietaire_ns.model('ResultatOperation', {
+    'index': fields.Integer(description="Position de l'opération dans le lot"),
+    'type': fields.String(description="Type d'opération"),
+    'id': fields.Integer(description="ID visé"),
+    'statut': fields.Integer(description='Statut HTTP de l\'opération (200, 400, 403, 404, 424)'),
+    'message': fields.String(description='Résultat ou motif du refus')
+})
+
+operations_response_model = proprietaire_ns.model('OperationsResponse', {
+    'applique': fields.Boolean(description='Vrai si les opérations acceptées ont été enregistrées'),
+    'reussies': fields.Integer(description="Nombre d'opérations appliquées"),
+    'echecs': fields.Integer(description="Nombre d'opérations refusées"),
+    'resultats': fields.List(fields.Nested(resultat_operation_model))
+})
+
 # --- Routes Converties ---
 
 # Route pour lister les maisons du propriétaire
@@ -342,7 +386,7 @@ class ProprietaireChambres(Resource):
                     "statut": cont.statut
                 }
                 for cont in chambre.contrats_chambre
-                if cont.statut == 'actif' and cont.date_fin >= date.today()
+                if cont.statut == 'actif' and cont.date_fin > date.today()
             ]
 
             medias_data = [
@@ -473,7 +517,7 @@ class ChambresByMaison(Resource):
                     "date_fin": cont.date_fin.isoformat(),
                     "statut": cont.statut
                 }
-                for cont in chambre.contrats_chambre if cont.statut == 'actif' and cont.date_fin >= date.today()
+                for cont in chambre.contrats_chambre if cont.statut == 'actif' and cont.date_fin > date.today()
             ]
 
             medias_data = [
@@ -614,6 +658,7 @@ class ProprietaireContrats(Resource):
     @proprietaire_ns.response(401, 'Non autorisé', message_model)
     @proprietaire_ns.response(403, 'Accès refusé. Seuls les propriétaires peuvent voir leurs contrats.', message_model)
     @proprietaire_ns.response(500, 'Erreur interne du serveur', message_model)
+    @budget_sql(2)
     def get(self):
         """
         Liste tous les contrats (actifs, rejetés, résiliés, terminés) liés aux chambres du propriétaire connecté.
@@ -786,6 +831,8 @@ class ContratResiliation(Resource):
                     chambre.disponible = True
                     db.session.add(chambre)
 
+            publier('contrat.resilie', f'contrat:{contrat.id}', donnees_contrat(
+                contrat, chambre_disponible=bool(chambre and chambre.disponible)))
             db.session.commit()
             return {"message": "Contrat résilié avec succès."}, 200
         except Exception as e:
@@ -847,6 +894,92 @@ class ProprietairePaiementsDashboard(Resource):
         }, 200
 
 
+# Route unique du tableau de bord (remplace maisons, chambres, clients, contrats, paiements et demandes)
+@proprietaire_ns.route('/tableau-de-bord')
+class ProprietaireTableauDeBord(Resource):
+    @proprietaire_ns.doc(security='apikey')
+    @role_required(['proprietaire'])
+    @proprietaire_ns.response(401, 'Non autorisé', message_model)
+    @proprietaire_ns.response(403, 'Accès refusé (rôle incorrect)', message_model)
+    @budget_sql(7)
+    def get(self):
+        """
+        Maisons, chambres, clients, contrats, paiements et demandes en attente du propriétaire en
+        une réponse : les entités sont dédupliquées dans `entites` et les listes (`vues`) ne
+        contiennent que leurs identifiants.
+        """
+        current_user_identity = get_jwt_identity()
+        owner_id = json.loads(current_user_identity)['id']
+
+        return tableau_de_bord_proprietaire(owner_id), 200
+
+
+# Route de synchronisation incrémentale du tableau de bord
+@proprietaire_ns.route('/changements')
+class ProprietaireChangements(Resource):
+    @proprietaire_ns.doc(security='apikey', params={'since': 'Curseur renvoyé par l\'appel précédent (ISO 8601)'})
+    @role_required(['proprietaire'])
+    @proprietaire_ns.response(400, 'Curseur invalide', message_model)
+    @proprietaire_ns.response(401, 'Non autorisé', message_model)
+    @proprietaire_ns.response(403, 'Accès refusé (rôle incorrect)', message_model)
+    @budget_sql(7)
+    def get(self):
+        """
+        Contrats, paiements, chambres et médias du propriétaire modifiés depuis le curseur `since`,
+        et identifiants supprimés. Sans `since`, tout est renvoyé (`complet`).
+        """
+        current_user_identity = get_jwt_identity()
+        owner_id = json.loads(current_user_identity)['id']
+
+        try:
+            depuis = lire_curseur(request.args.get('since'))
+        except CurseurInvalide as e:
+            proprietaire_ns.abort(400, str(e))
+
+        # Un changement pas encore répliqué serait en deçà du curseur renvoyé, donc jamais envoyé
+        lire_sur_primaire()
+
+        return changements_proprietaire(owner_id, depuis), 200
+
+
+# Route des opérations en lot (chambres, demandes de location, paiements)
+@proprietaire_ns.route('/operations')
+class ProprietaireOperations(Resource):
+    @proprietaire_ns.doc(security='apikey')
+    @role_required(['proprietaire'])
+    @proprietaire_ns.expect(operations_model)
+    @proprietaire_ns.marshal_with(operations_response_model, code=200)
+    @proprietaire_ns.response(400, 'Lot invalide, ou lot atomique non appliqué', operations_response_model)
+    @proprietaire_ns.response(401, 'Non autorisé', message_model)
+    @proprietaire_ns.response(403, 'Accès refusé (rôle incorrect)', message_model)
+    @proprietaire_ns.response(500, 'Erreur interne du serveur', message_model)
+    @budget_sql(20)
+    def post(self):
+        """
+        Applique un lot d'opérations (modifier_chambre, rejeter_contrat, approuver_contrat,
+        marquer_paiement_paye) en une transaction, avec un résultat par opération. Avec
+        `atomique`, rien n'est appliqué si une opération est refusée.
+        """
+        current_user_identity = get_jwt_identity()
+        owner_id = json.loads(current_user_identity)['id']
+
+        data = request.get_json(silent=True) or {}
+        operations = data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            proprietaire_ns.abort(400, "Le champ 'operations' doit être une liste non vide.")
+        if len(operations) > current_app.config['OPERATIONS_LOT_MAX']:
+            proprietaire_ns.abort(400, f"Au plus {current_app.config['OPERATIONS_LOT_MAX']} opérations par lot.")
+
+        try:
+            rapport = executer_operations(owner_id, operations, atomique=bool(data.get('atomique')))
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("Erreur lors des opérations en lot du propriétaire %s", owner_id)
+            proprietaire_ns.abort(500, f"Erreur lors des opérations en lot: {str(e)}")
+
+        return rapport, 200 if rapport['applique'] else 400
+
+
 # Route pour obtenir les paiements d'un contrat spécifique
 @proprietaire_ns.route('/contrats/<int:contrat_id>/paiements')
 class ContratPaiements(Resource):
@@ -1002,7 +1135,7 @@ class ChambreMediasUpload(Resource):
             except Exception as e:
                 db.session.rollback()
                 errors.append(f"Échec du téléversement ou de l'enregistrement de {filename}: {str(e)}")
-                print(f"Erreur d'upload backend (local): {e}")
+                logger.exception("Échec du téléversement local d'un média", extra={'chambre_id': chambre_id, 'fichier': filename})
 
         if errors:
             status_code = 400 if not uploaded_media_urls else 207
@@ -1052,11 +1185,11 @@ class MediaDeletion(Resource):
 
                 if os.path.exists(file_to_delete_path):
                     os.remove(file_to_delete_path)
-                    print(f"Fichier local supprimé: {file_to_delete_path}")
+                    logger.info("Fichier local supprimé", extra={'fichier': file_to_delete_path})
                 else:
-                    print(f"Avertissement: Fichier à supprimer non trouvé localement: {file_to_delete_path}")
+                    logger.warning("Fichier à supprimer non trouvé localement", extra={'fichier': file_to_delete_path})
             else:
-                print(f"Avertissement: L'URL du média ne correspond pas au format de fichier local attendu: {media.url}")
+                logger.warning("L'URL du média ne correspond pas au format de fichier local attendu", extra={'url': media.url})
 
             db.session.delete(media)
             db.session.commit()
@@ -1065,7 +1198,7 @@ class MediaDeletion(Resource):
             return {"message": "Média supprimé avec succès"}, 204
         except Exception as e:
             db.session.rollback()
-            print(f"Erreur lors de la suppression du média (local): {e}")
+            logger.exception("Erreur lors de la suppression du média", extra={'media_id': media_id})
             proprietaire_ns.abort(500, f"Erreur interne du serveur lors de la suppression du média: {str(e)}")
 
 
@@ -1079,6 +1212,7 @@ class ContratApprobation(Resource):
     @proprietaire_ns.response(401, 'Non autorisé', message_model)
     @proprietaire_ns.response(403, 'Accès refusé', message_model)
     @proprietaire_ns.response(404, 'Contrat non trouvé', message_model)
+    @proprietaire_ns.response(409, 'Contrat traité par une requête concurrente', message_model)
     @proprietaire_ns.response(500, 'Erreur interne du serveur', message_model)
     def put(self, contrat_id):
         """
@@ -1102,35 +1236,26 @@ class ContratApprobation(Resource):
         if contrat.statut != 'en_attente_validation':
             proprietaire_ns.abort(400, f"Le contrat n'est pas en statut 'en_attente_validation'. Statut actuel : {contrat.statut}.")
 
-        try:
-            contrat.statut = 'actif'
-            db.session.add(contrat)
-            db.session.flush() # Force les changements pour que contrat.id soit disponible pour les paiements
-
-            loyer_mensuel = chambre.prix
+        # Verrouiller la chambre pour que deux approbations simultanées ne se chevauchent pas
+        chambre = verrouiller_chambre(chambre.id)
+        # Le statut lu plus haut a pu changer avant le verrou : la transition est réclamée en base
+        if not changer_statut_contrat(contrat.id, 'actif'):
+            db.session.rollback()
+            proprietaire_ns.abort(409, "Le contrat a déjà été traité par une autre requête.")
+        if contrats_chevauchants(chambre.id, contrat.date_debut, contrat.date_fin,
+                                 statuts=('actif',), exclure_contrat_id=contrat.id).first():
+            db.session.rollback()
+            proprietaire_ns.abort(400, "Un contrat actif existe déjà pour cette chambre sur cette période.")
 
-            if contrat.montant_caution > 0:
-                paiement_caution = Paiement(
-                    contrat_id=contrat.id,
-                    montant=contrat.montant_caution,
-                    date_echeance=contrat.date_debut,
-                    statut='impayé',
-                )
-                db.session.add(paiement_caution)
-
-            for i in range(contrat.duree_mois):
-                current_due_date = contrat.date_debut + relativedelta(months=+i)
-                paiement_loyer = Paiement(
-                    contrat_id=contrat.id,
-                    montant=loyer_mensuel,
-                    date_echeance=current_due_date,
-                    statut='impayé',
-                )
-                db.session.add(paiement_loyer)
+        try:
+            echeances = echeancier_approbation(contrat, chambre.prix)
+            db.session.add_all(echeances)
 
             chambre.disponible = False
             db.session.add(chambre)
 
+            publier('contrat.approuve', f'contrat:{contrat.id}', donnees_contrat(
+                contrat, date_debut=contrat.date_debut, date_fin=contrat.date_fin, nombre_echeances=len(echeances)))
             db.session.commit()
 
             return {"message": "Contrat approuvé avec succès, paiements générés et chambre marquée comme indisponible."}, 200
@@ -1150,6 +1275,7 @@ class ContratRejet(Resource):
     @proprietaire_ns.response(401, 'Non autorisé', message_model)
     @proprietaire_ns.response(403, 'Accès refusé', message_model)
     @proprietaire_ns.response(404, 'Contrat non trouvé', message_model)
+    @proprietaire_ns.response(409, 'Contrat traité par une requête concurrente', message_model)
     @proprietaire_ns.response(500, 'Erreur interne du serveur', message_model)
     def put(self, contrat_id):
         """
@@ -1175,9 +1301,12 @@ class ContratRejet(Resource):
         if contrat.statut != 'en_attente_validation':
             proprietaire_ns.abort(400, f"Le contrat n'est pas en statut 'en_attente_validation'. Statut actuel : {contrat.statut}.")
 
+        if not changer_statut_contrat(contrat.id, 'rejete'):
+            db.session.rollback()
+            proprietaire_ns.abort(409, "Le contrat a déjà été traité par une autre requête.")
+
         try:
-            contrat.statut = 'rejete'
-            db.session.add(contrat)
+            publier('contrat.rejete', f'contrat:{contrat.id}', donnees_contrat(contrat))
             db.session.commit()
             return {"message": "Contrat rejeté avec succès."}, 200
         except Exception as e:
@@ -0,0 +1,73 @@
+import logging
+import time
+
+from sqlalchemy.orm import configure_mappers
+
+from app import db
+from app.journalisation import journalisation
+from app.services.diffusion import diffuseur
+from app.services.disponibilite import index_disponibilite
+from app.services.evenements import relais_evenements
+from app.services.paydunya_client import paydunya_client
+from app.services.planificateur import planificateur
+
+logger = logging.getLogger(__name__)
+
+# Requêtes rejouées au préchauffage : la spécification Swagger (mise en cache par Flask-RESTx)
+# et une recherche sans résultat, qui compile les requêtes de la recherche de chambres
+URLS_PRECHAUFFAGE = (
+    '/api/swagger.json',
+    '/api/locataire/chambres/recherche?ville=__prechauffage__',
+)
+
+
+def prechauffer(app):
+    """
+    Prépare dans le processus maître ce que chaque worker hériterait sinon à froid : mappers
+    SQLAlchemy configurés, requêtes compilées (cache du moteur, conservé par `dispose`),
+    spécification Swagger, index des disponibilités et requests importé (client PayDunya).
+    Les connexions ouvertes pour l'occasion sont fermées avant le fork.
+    """
+    debut = time.perf_counter()
+    with app.app_context():
+        configure_mappers()
+        paydunya_client.session  # importe requests ; la session sera recréée dans chaque worker
+        index_disponibilite.reconstruire()
+        client = app.test_client()
+        for url in URLS_PRECHAUFFAGE:
+            client.get(url)
+        db.session.remove()
+        for moteur in db.engines.values():
+            moteur.dispose()
+    logger.info("Application préchauffée", extra={'duree_secondes': round(time.perf_counter() - debut, 3)})
+
+
+def reinitialiser_apres_fork(app, worker_asynchrone=True):
+    """
+    À appeler dans chaque worker juste après le fork : les connexions héritées du maître ne
+    doivent pas être partagées (dispose(close=False) les oublie sans les fermer, ce qui
+    laisse intactes celles du maître ; idem pour la session HTTP de PayDunya), puis les
+    threads d'arrière-plan sont démarrés dans le worker (aucun ne l'est dans le maître).
+    `worker_asynchrone` : le worker peut-il garder des flux SSE ouverts.
+    """
+    journalisation.redemarrer()
+    paydunya_client.reinitialiser()
+    diffuseur.reinitialiser()
+    diffuseur.adapter_au_worker(worker_asynchrone)
+    with app.app_context():
+        for moteur in db.engines.values():
+            moteur.dispose(close=False)
+    demarrer_services(app)
+
+
+def demarrer_services(app):
+    """
+    Démarre les threads d'arrière-plan : écriture des journaux, et selon la configuration
+    planificateur et relais des événements. create_app n'en démarre aucun, pour qu'un maître
+    gunicorn (preload) n'ait pas de thread au moment du fork ; sans effet s'ils tournent déjà.
+    """
+    journalisation.demarrer()
+    if app.config.get('SCHEDULER_ENABLED'):
+        planificateur.demarrer()
+    if app.config.get('EVENEMENTS_RELAIS_ACTIF'):
+        relais_evenements.demarrer()
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+
+from app import db, metriques
+from app.models import Paiement
+from app.services.cycle_contrats import STATUTS_PAYES
+from app.services.paydunya_client import paydunya_client
+
+# États définitifs d'une facture PayDunya : ils ne changent plus une fois atteints
+STATUTS_DEFINITIFS = frozenset({'completed', 'cancelled', 'failed', 'expired'})
+
+
+class CacheConfirmations:
+    """
+    États des factures PayDunya par token, pour les pages de retour et d'annulation que les
+    navigateurs rechargent. Dans l'ordre :
+
+    1. le cache du processus, rempli par le callback vérifié et par les confirmations
+       précédentes (états définitifs pendant PAYDUNYA_CONFIRMATION_TTL secondes, `pending`
+       pendant PAYDUNYA_CONFIRMATION_TTL_EN_ATTENTE) ;
+    2. la base : un paiement déjà marqué payé par le callback, reçu par un autre worker ;
+    3. l'API PayDunya en dernier recours.
+    """
+
+    def __init__(self, app=None):
+        self._verrou = threading.Lock()
+        self._entrees = OrderedDict()  # token -> (statut, expire_le)
+        self.ttl = 300
+        self.ttl_en_attente = 5
+        self.taille_max = 10000
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('PAYDUNYA_CONFIRMATION_TTL', 300)
+        self.ttl_en_attente = app.config.get('PAYDUNYA_CONFIRMATION_TTL_EN_ATTENTE', 5)
+        self.taille_max = app.config.get('PAYDUNYA_CONFIRMATION_CACHE_TAILLE', 10000)
+        app.extensions['confirmations_paydunya'] = self
+
+    def enregistrer(self, token, statut):
+        if statut in STATUTS_DEFINITIFS:
+            ttl = self.ttl
+        elif statut == 'pending':
+            ttl = self.ttl_en_attente
+        else:
+            return
+        with self._verrou:
+            self._entrees[token] = (statut, time.monotonic() + ttl)
+            self._entrees.move_to_end(token)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def obtenir(self, token):
+        with self._verrou:
+            entree = self._entrees.get(token)
+            if entree is None:
+                return None
+            statut, expire_le = entree
+            if time.monotonic() >= expire_le:
+                del self._entrees[token]
+                return None
+            return statut
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+    def statut(self, token):
+        """
+        État de la facture `token` ; lève les erreurs de app.services.paydunya_client si
+        PayDunya doit être interrogé et ne répond pas.
+        """
+        statut = self.obtenir(token)
+        if statut is not None:
+            metriques.confirmations_paydunya.inc(source='cache')
+            return statut
+
+        paye = db.session.query(Paiement.id).filter(
+            Paiement.paydunya_invoice_token == token, Paiement.statut.in_(STATUTS_PAYES)).first()
+        # Rendre la connexion avant un éventuel appel à PayDunya
+        db.session.rollback()
+        if paye is not None:
+            metriques.confirmations_paydunya.inc(source='base')
+            self.enregistrer(token, 'completed')
+            return 'completed'
+
+        statut = paydunya_client.confirmer_facture(token).get('status') or 'unknown'
+        metriques.confirmations_paydunya.inc(source='paydunya')
+        self.enregistrer(token, statut)
+        return statut
+
+
+confirmations_paydunya = CacheConfirmations()
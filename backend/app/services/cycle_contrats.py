@@ -0,0 +1,92 @@
+from datetime import date
+
+from sqlalchemy import update, select, and_
+
+from app import db
+from app.models import Chambre, Contrat, Paiement
+from app.services.disponibilite import index_disponibilite
+from app.services.planificateur import planificateur
+
+STATUTS_PAYES = ('payé', 'paye')
+
+
+@planificateur.tache('cycle_contrats', heure=2)
+def cycle_contrats(aujourd_hui=None):
+    """
+    Termine les contrats arrivés à échéance, met à jour la disponibilité des chambres et
+    marque les paiements en retard. Chaque étape est un UPDATE ensembliste.
+    """
+    aujourd_hui = aujourd_hui or date.today()
+    options = {'synchronize_session': False}
+
+    contrat_en_cours = and_(
+        Contrat.chambre_id == Chambre.id,
+        Contrat.statut == 'actif',
+        Contrat.date_debut <= aujourd_hui,
+        Contrat.date_fin > aujourd_hui
+    )
+    chambres_a_liberer = select(Contrat.chambre_id).where(
+        Contrat.statut == 'actif',
+        Contrat.date_fin <= aujourd_hui
+    )
+
+    # Libérer les chambres dont le contrat expire, sauf si un autre contrat actif les occupe aujourd'hui
+    chambres_liberees = db.session.execute(
+        update(Chambre)
+        .where(
+            Chambre.disponible.is_(False),
+            Chambre.id.in_(chambres_a_liberer),
+            ~select(Contrat.id).where(contrat_en_cours).exists()
+        )
+        .values(disponible=True),
+        execution_options=options
+    ).rowcount
+
+    # Occuper les chambres dont un contrat actif (réservé à l'avance) commence
+    chambres_occupees = db.session.execute(
+        update(Chambre)
+        .where(
+            Chambre.disponible.is_(True),
+            select(Contrat.id).where(contrat_en_cours).exists()
+        )
+        .values(disponible=False),
+        execution_options=options
+    ).rowcount
+
+    contrats_termines = db.session.execute(
+        update(Contrat)
+        .where(Contrat.statut == 'actif', Contrat.date_fin <= aujourd_hui)
+        .values(statut='termine'),
+        execution_options=options
+    ).rowcount
+
+    paiements_en_retard = db.session.execute(
+        update(Paiement)
+        .where(
+            Paiement.en_retard.is_(False),
+            Paiement.date_echeance < aujourd_hui,
+            Paiement.statut.not_in(STATUTS_PAYES),
+            Paiement.contrat_id.in_(select(Contrat.id).where(Contrat.statut.in_(['actif', 'termine'])))
+        )
+        .values(en_retard=True),
+        execution_options=options
+    ).rowcount
+
+    paiements_regularises = db.session.execute(
+        update(Paiement)
+        .where(Paiement.en_retard.is_(True), Paiement.statut.in_(STATUTS_PAYES))
+        .values(en_retard=False),
+        execution_options=options
+    ).rowcount
+
+    db.session.commit()
+    # Les UPDATE en masse ne passent pas par les événements de session
+    index_disponibilite.invalider()
+
+    return {
+        "contrats_termines": contrats_termines,
+        "chambres_liberees": chambres_liberees,
+        "chambres_occupees": chambres_occupees,
+        "paiements_en_retard": paiements_en_retard,
+        "paiements_regularises": paiements_regularises,
+    }
@@ -0,0 +1,261 @@
+import logging
+import os
+import queue
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, select
+
+from app import db, metriques
+from app.models import EvenementSortant
+from app.services.evenements import CLE_EVENEMENTS_PUBLIES, message_evenement
+
+logger = logging.getLogger(__name__)
+
+# Événements de l'outbox poussés aux flux SSE des locataires
+TYPES_DIFFUSES = ('paiement.paye', 'paiement.annule')
+
+
+def canaux(message):
+    """Canaux auxquels un événement est diffusé : celui du locataire concerné."""
+    locataire_id = message['donnees'].get('locataire_id')
+    return [f'locataire:{locataire_id}'] if locataire_id is not None else []
+
+
+class Abonnement:
+    """File des messages d'un canal pour un client. Un client trop lent est marqué `deborde`."""
+
+    def __init__(self, canal, taille_max):
+        self.canal = canal
+        self.file = queue.Queue(maxsize=taille_max)
+        self.deborde = False
+
+    def recevoir(self, message):
+        try:
+            self.file.put_nowait(message)
+        except queue.Full:
+            self.deborde = True
+
+    def attendre(self, timeout):
+        try:
+            return self.file.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+# --- Backends : comment un événement validé atteint les abonnés de chaque worker ---
+
+class BackendLocal:
+    """Les abonnés du processus qui a validé la transaction reçoivent l'événement, sans délai."""
+
+    def __init__(self, app):
+        pass
+
+    def demarrer(self, diffuseur):
+        pass
+
+    def publier(self, diffuseur, messages):
+        for message in messages:
+            diffuseur.distribuer(message)
+
+    def reinitialiser(self):
+        pass
+
+
+class BackendBase:
+    """
+    Chaque worker suit la table de l'outbox (identifiants croissants) tant qu'il a des
+    abonnés : une requête toutes les SSE_INTERVALLE_BASE secondes par worker, quel que soit
+    le nombre de clients, et les événements validés par les autres workers sont vus. Le
+    worker qui valide la transaction réveille son propre suivi tout de suite.
+
+    Un identifiant est attribué à l'insertion, pas au commit : une transaction plus lente
+    peut valider un événement sous un identifiant déjà dépassé. Chaque lecture reprend donc
+    les SSE_FENETRE_IDS derniers identifiants et ne distribue que ceux pas encore vus.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.intervalle = app.config.get('SSE_INTERVALLE_BASE', 0.5)
+        self.fenetre = app.config.get('SSE_FENETRE_IDS', 1000)
+        self._reveil = threading.Event()
+        self._verrou = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._dernier_id = None
+        self._vus = set()  # identifiants distribués dans la fenêtre
+
+    def publier(self, diffuseur, messages):
+        self._reveil.set()
+
+    def reinitialiser(self):
+        self._thread = None
+        self._pid = None
+        self._dernier_id = None
+        self._vus = set()
+
+    def demarrer(self, diffuseur):
+        """Appelé à chaque abonnement, dans le contexte de la requête."""
+        with self._verrou:
+            if self._dernier_id is None:
+                # Point de départ du suivi : l'instantané envoyé au client couvre ce qui précède
+                self._dernier_id = db.session.query(db.func.max(EvenementSortant.id)).scalar() or 0
+                # Ce qui est déjà validé dans la fenêtre est couvert par l'instantané lui aussi
+                self._vus = set(db.session.scalars(select(EvenementSortant.id).where(
+                    EvenementSortant.id > self._dernier_id - self.fenetre,
+                    EvenementSortant.type.in_(TYPES_DIFFUSES))))
+            # Un thread par processus, lancé au premier abonnement (les threads ne survivent pas au fork)
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._boucle, args=(diffuseur,), name='diffusion-base',
+                                            daemon=True)
+            self._thread.start()
+
+    def _boucle(self, diffuseur):
+        while True:
+            self._reveil.wait(self.intervalle)
+            self._reveil.clear()
+            if not diffuseur.nombre_abonnes():
+                # Au prochain abonné, repartir des événements à venir
+                with self._verrou:
+                    if not diffuseur.nombre_abonnes():
+                        self._dernier_id = None
+                continue
+            with self.app.app_context():
+                try:
+                    for message in self._lire():
+                        diffuseur.distribuer(message)
+                except Exception:
+                    logger.exception("Erreur lors du suivi de l'outbox pour la diffusion")
+                finally:
+                    db.session.remove()
+
+    def _lire(self):
+        if self._dernier_id is None:
+            return []
+        # La fenêtre tient au plus `fenetre` lignes : la limite laisse toujours avancer
+        evenements = db.session.query(EvenementSortant).filter(
+            EvenementSortant.id > self._dernier_id - self.fenetre,
+            EvenementSortant.type.in_(TYPES_DIFFUSES)
+        ).order_by(EvenementSortant.id).limit(self.fenetre + 1000).all()
+        nouveaux = [evenement for evenement in evenements if evenement.id not in self._vus]
+        if evenements:
+            self._dernier_id = max(self._dernier_id, evenements[-1].id)
+        self._vus.update(evenement.id for evenement in nouveaux)
+        plancher = self._dernier_id - self.fenetre
+        self._vus = {i for i in self._vus if i > plancher}
+        return [message_evenement(evenement) for evenement in nouveaux]
+
+
+# nom (SSE_BACKEND) -> classe ; d'autres backends (Redis, NATS...) peuvent s'y ajouter
+BACKENDS = {
+    'local': BackendLocal,
+    'base': BackendBase,
+}
+
+
+class Diffuseur:
+    """
+    Pub/sub en mémoire pour les flux SSE : les événements de l'outbox sont distribués aux
+    abonnés de leur canal une fois la transaction qui les a publiés validée (jamais avant,
+    ni après un rollback). Le backend (SSE_BACKEND) décide comment ils atteignent les autres
+    workers.
+    """
+
+    def __init__(self, app=None):
+        self._verrou = threading.Lock()
+        self._abonnes = defaultdict(set)  # canal -> {Abonnement}
+        self._ecoute = False
+        self.backend = None
+        self.taille_file = 100
+        self._mode_flux = 'auto'
+        self.flux_actifs = True
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        nom = app.config.get('SSE_BACKEND', 'base')
+        if nom not in BACKENDS:
+            raise ValueError(f"Backend de diffusion inconnu dans SSE_BACKEND : {nom}")
+        self.backend = BACKENDS[nom](app)
+        self.taille_file = app.config.get('SSE_TAILLE_FILE', 100)
+        self._mode_flux = app.config.get('SSE_ACTIF', 'auto')
+        if self._mode_flux not in ('auto', 'true', 'false'):
+            raise ValueError(f"Valeur inconnue pour SSE_ACTIF : {self._mode_flux} (attendu : auto, true, false)")
+        # Hors gunicorn (serveur de développement), 'auto' garde les flux
+        self.flux_actifs = self._mode_flux != 'false'
+        app.extensions['diffuseur'] = self
+        if not self._ecoute:
+            event.listen(db.session, 'after_flush', self._noter_evenements)
+            event.listen(db.session, 'after_commit', self._publier_evenements)
+            event.listen(db.session, 'after_rollback', self._oublier_evenements)
+            self._ecoute = True
+
+    def reinitialiser(self):
+        """Après un fork : les abonnés et les threads du maître n'existent pas dans le fils."""
+        with self._verrou:
+            self._abonnes.clear()
+        self.backend.reinitialiser()
+
+    def adapter_au_worker(self, asynchrone):
+        """
+        Dans un worker gunicorn : un flux garderait un worker sync (tué au bout de `timeout`)
+        ou un thread gthread pendant SSE_DUREE_MAX secondes, seuls les workers gevent les
+        servent en mode 'auto'.
+        """
+        if self._mode_flux == 'auto':
+            self.flux_actifs = asynchrone
+        if not self.flux_actifs:
+            logger.info("Flux SSE désactivés dans ce worker : les clients rechargent périodiquement")
+
+    # --- Abonnements ---
+
+    def abonner(self, canal):
+        abonnement = Abonnement(canal, self.taille_file)
+        with self._verrou:
+            self._abonnes[canal].add(abonnement)
+            total = sum(len(a) for a in self._abonnes.values())
+        metriques.flux_sse.fixer(total)
+        self.backend.demarrer(self)
+        return abonnement
+
+    def desabonner(self, abonnement):
+        with self._verrou:
+            abonnes = self._abonnes.get(abonnement.canal)
+            if abonnes is not None:
+                abonnes.discard(abonnement)
+                if not abonnes:
+                    del self._abonnes[abonnement.canal]
+            total = sum(len(a) for a in self._abonnes.values())
+        metriques.flux_sse.fixer(total)
+
+    def nombre_abonnes(self):
+        with self._verrou:
+            return sum(len(a) for a in self._abonnes.values())
+
+    def distribuer(self, message):
+        for canal in canaux(message):
+            with self._verrou:
+                abonnes = list(self._abonnes.get(canal, ()))
+            for abonnement in abonnes:
+                abonnement.recevoir(message)
+
+    # --- Événements de la transaction en cours ---
+
+    def _noter_evenements(self, session, flush_context):
+        messages = session.info.setdefault(CLE_EVENEMENTS_PUBLIES, [])
+        for obj in session.new:
+            if isinstance(obj, EvenementSortant) and obj.id is not None:
+                messages.append(message_evenement(obj))
+
+    def _publier_evenements(self, session):
+        messages = [m for m in session.info.pop(CLE_EVENEMENTS_PUBLIES, []) if m['type'] in TYPES_DIFFUSES]
+        if messages:
+            self.backend.publier(self, messages)
+
+    def _oublier_evenements(self, session):
+        session.info.pop(CLE_EVENEMENTS_PUBLIES, None)
+
+
+diffuseur = Diffuseur()
@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Contrat
+from app.services.reservation import STATUTS_BLOQUANTS
+
+logger = logging.getLogger(__name__)
+
+
+class IndexDisponibilite:
+    """
+    Index en mémoire des périodes occupées de chaque chambre.
+
+    Pour chaque chambre, les périodes [date_debut, date_fin) des contrats bloquants sont
+    triées par date de début avec le maximum cumulé des dates de fin : savoir si une chambre
+    est libre sur une période se fait alors par une recherche dichotomique.
+    L'index est construit depuis la table `contrats` au premier accès (une seule requête le
+    construit, les autres l'attendent), mis à jour à chaque commit qui touche un `Contrat`
+    dans ce processus, et reconstruit toutes les `DISPONIBILITE_INDEX_TTL` secondes (pour voir
+    les écritures des autres workers) par un thread unique, pendant que les requêtes
+    continuent de lire l'index précédent.
+    """
+
+    def __init__(self, app=None):
+        self._verrou = threading.RLock()
+        self._periodes = {}  # chambre_id -> {contrat_id: (date_debut, date_fin)}
+        self._tries = {}  # chambre_id -> (debuts tries, maximum cumule des fins)
+        self._contrat_chambre = {}  # contrat_id -> chambre_id
+        self._construit_le = None
+        self._existe = False
+        self._verrou_construction = threading.Lock()
+        self._reconstruction_en_cours = False
+        self._pendant_reconstruction = None  # [(contrat_id, etat)] appliqués pendant une reconstruction
+        self._ecoute = False
+        self.ttl = 300
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.ttl = app.config.get('DISPONIBILITE_INDEX_TTL', 300)
+        app.extensions['index_disponibilite'] = self
+        if not self._ecoute:
+            event.listen(db.session, 'after_flush', self._noter_contrats_modifies)
+            event.listen(db.session, 'after_commit', self._appliquer_contrats_modifies)
+            event.listen(db.session, 'after_rollback', self._oublier_contrats_modifies)
+            self._ecoute = True
+
+    # --- Construction ---
+
+    def reconstruire(self):
+        """
+        Relit les contrats bloquants et remplace l'index. Les commits appliqués entre la
+        lecture et le remplacement sont rejoués sur le nouvel index pour ne pas être perdus.
+        """
+        with self._verrou:
+            self._pendant_reconstruction = []
+        try:
+            lignes = db.session.query(
+                Contrat.id, Contrat.chambre_id, Contrat.date_debut, Contrat.date_fin
+            ).filter(Contrat.statut.in_(STATUTS_BLOQUANTS)).all()
+        except Exception:
+            with self._verrou:
+                self._pendant_reconstruction = None
+            raise
+
+        periodes = {}
+        contrat_chambre = {}
+        for contrat_id, chambre_id, date_debut, date_fin in lignes:
+            periodes.setdefault(chambre_id, {})[contrat_id] = (date_debut, date_fin)
+            contrat_chambre[contrat_id] = chambre_id
+
+        with self._verrou:
+            self._periodes = periodes
+            self._contrat_chambre = contrat_chambre
+            self._tries = {chambre_id: self._trier(p) for chambre_id, p in periodes.items()}
+            pendant_reconstruction, self._pendant_reconstruction = self._pendant_reconstruction, None
+            for contrat_id, etat in pendant_reconstruction:
+                self._appliquer(contrat_id, etat)
+            self._construit_le = time.monotonic()
+            self._existe = True
+
+    def invalider(self):
+        """Lance une reconstruction au prochain accès (après des UPDATE en masse par exemple)."""
+        with self._verrou:
+            self._construit_le = None
+
+    def _assurer_a_jour(self):
+        construit_le = self._construit_le
+        if construit_le is not None and time.monotonic() - construit_le <= self.ttl:
+            return
+        if self._existe:
+            self._reconstruire_en_arriere_plan()
+            return
+        # Premier accès : rien à servir en attendant, une seule requête construit l'index
+        with self._verrou_construction:
+            if not self._existe:
+                self.reconstruire()
+
+    def _reconstruire_en_arriere_plan(self):
+        with self._verrou:
+            if self._reconstruction_en_cours:
+                return
+            self._reconstruction_en_cours = True
+        threading.Thread(target=self._reconstruire_dans_le_thread, name='index-disponibilite', daemon=True).start()
+
+    def _reconstruire_dans_le_thread(self):
+        try:
+            with self.app.app_context():
+                try:
+                    self.reconstruire()
+                finally:
+                    db.session.remove()
+        except Exception:
+            # L'index précédent reste servi ; le prochain accès relance une reconstruction
+            logger.exception("Reconstruction de l'index des disponibilités impossible")
+        finally:
+            with self._verrou:
+                self._reconstruction_en_cours = False
+
+    @staticmethod
+    def _trier(periodes):
+        ordonnees = sorted(periodes.values())
+        debuts = []
+        fins_max = []
+        fin_max = None
+        for date_debut, date_fin in ordonnees:
+            fin_max = date_fin if fin_max is None or date_fin > fin_max else fin_max
+            debuts.append(date_debut)
+            fins_max.append(fin_max)
+        return debuts, fins_max
+
+    # --- Mises à jour incrémentales ---
+
+    def enregistrer(self, contrat_id, chambre_id, date_debut, date_fin, statut):
+        with self._verrou:
+            self._appliquer(contrat_id, (chambre_id, date_debut, date_fin, statut))
+
+    def retirer(self, contrat_id):
+        with self._verrou:
+            self._appliquer(contrat_id, None)
+
+    def _appliquer(self, contrat_id, etat):
+        if self._pendant_reconstruction is not None:
+            self._pendant_reconstruction.append((contrat_id, etat))
+        self._retirer(contrat_id)
+        if etat is None:
+            return
+        chambre_id, date_debut, date_fin, statut = etat
+        if statut in STATUTS_BLOQUANTS:
+            self._periodes.setdefault(chambre_id, {})[contrat_id] = (date_debut, date_fin)
+            self._contrat_chambre[contrat_id] = chambre_id
+            self._tries[chambre_id] = self._trier(self._periodes[chambre_id])
+
+    def _retirer(self, contrat_id):
+        chambre_id = self._contrat_chambre.pop(contrat_id, None)
+        if chambre_id is None:
+            return
+        periodes = self._periodes.get(chambre_id, {})
+        periodes.pop(contrat_id, None)
+        if periodes:
+            self._tries[chambre_id] = self._trier(periodes)
+        else:
+            self._periodes.pop(chambre_id, None)
+            self._tries.pop(chambre_id, None)
+
+    def noter_contrat(self, session, contrat_id, chambre_id, date_debut, date_fin, statut):
+        """
+        Pour les écritures qui ne passent pas par le flush (UPDATE conditionnel) : comme pour
+        les objets modifiés, appliqué à l'index au commit de `session`, oublié au rollback.
+        """
+        session.info.setdefault('contrats_modifies', {})[contrat_id] = (chambre_id, date_debut, date_fin, statut)
+
+    def _noter_contrats_modifies(self, session, flush_context):
+        modifies = session.info.setdefault('contrats_modifies', {})
+        for obj in list(session.new) + list(session.dirty):
+            if isinstance(obj, Contrat) and obj.id is not None:
+                modifies[obj.id] = (obj.chambre_id, obj.date_debut, obj.date_fin, obj.statut)
+        for obj in session.deleted:
+            if isinstance(obj, Contrat) and obj.id is not None:
+                modifies[obj.id] = None
+
+    def _appliquer_contrats_modifies(self, session):
+        modifies = session.info.pop('contrats_modifies', None)
+        if not modifies or not (self._existe or self._pendant_reconstruction is not None):
+            return
+        for contrat_id, etat in modifies.items():
+            if etat is None:
+                self.retirer(contrat_id)
+            else:
+                self.enregistrer(contrat_id, *etat)
+
+    def _oublier_contrats_modifies(self, session):
+        session.info.pop('contrats_modifies', None)
+
+    # --- Requêtes ---
+
+    def est_libre(self, chambre_id, date_debut, date_fin):
+        """Vrai si aucun contrat bloquant de la chambre ne chevauche [date_debut, date_fin)."""
+        self._assurer_a_jour()
+        with self._verrou:
+            entree = self._tries.get(chambre_id)
+        if not entree:
+            return True
+        debuts, fins_max = entree
+        # Seules les périodes qui commencent avant date_fin peuvent chevaucher
+        i = bisect_left(debuts, date_fin)
+        return i == 0 or fins_max[i - 1] <= date_debut
+
+    def periodes_occupees(self, chambre_id):
+        self._assurer_a_jour()
+        with self._verrou:
+            return sorted(self._periodes.get(chambre_id, {}).values())
+
+
+index_disponibilite = IndexDisponibilite()
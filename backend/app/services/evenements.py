@@ -0,0 +1,336 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, exists, insert, or_, select, update
+from sqlalchemy.orm import aliased
+
+from app import db, metriques
+from app.models import EvenementSortant
+from app.services.planificateur import planificateur
+
+logger = logging.getLogger(__name__)
+
+# session.info : messages des événements publiés dans la transaction en cours (app.services.diffusion)
+CLE_EVENEMENTS_PUBLIES = 'evenements_publies'
+
+
+# --- Publication (dans la transaction du changement d'état) ---
+
+def publier(type_evenement, cle, donnees):
+    """
+    Ajoute un événement à l'outbox dans la transaction en cours : il n'existe que si le
+    changement d'état qu'il décrit est validé par le même commit.
+    """
+    evenement = EvenementSortant(type=type_evenement, cle=cle, cree_le=datetime.now(),
+                                 donnees=json.dumps(donnees, default=str, ensure_ascii=False))
+    db.session.add(evenement)
+    return evenement
+
+
+def publier_plusieurs(type_evenement, evenements):
+    """Variante en masse de `publier` : `evenements` est une liste de couples (cle, donnees)."""
+    if not evenements:
+        return
+    maintenant = datetime.now()
+    lignes = [{'type': type_evenement, 'cle': cle, 'cree_le': maintenant,
+               'donnees': json.dumps(donnees, default=str, ensure_ascii=False)}
+              for cle, donnees in evenements]
+    # RETURNING sans tri par paramètre : SQLite n'a pas de sentinelle implicite et SQLAlchemy
+    # reviendrait à un INSERT par ligne ; chaque ligne renvoyée porte sa clé et ses données
+    inseres = db.session.execute(
+        insert(EvenementSortant).returning(EvenementSortant.id, EvenementSortant.cle, EvenementSortant.donnees),
+        lignes).all()
+    # Les événements ajoutés par `publier` sont relevés au flush ; ceux-ci n'en passent pas par l'ORM
+    db.session.info.setdefault(CLE_EVENEMENTS_PUBLIES, []).extend(
+        {'id': id_, 'type': type_evenement, 'cle': cle, 'cree_le': maintenant.isoformat(),
+         'donnees': json.loads(donnees)}
+        for id_, cle, donnees in sorted(inseres))
+
+
+def donnees_contrat(contrat, **donnees):
+    return {'contrat_id': contrat.id, 'chambre_id': contrat.chambre_id, 'locataire_id': contrat.locataire_id,
+            'statut': contrat.statut, **donnees}
+
+
+def donnees_paiement(paiement, **donnees):
+    return {'paiement_id': paiement.id, 'contrat_id': paiement.contrat_id, 'montant': str(paiement.montant),
+            'statut': paiement.statut, **donnees}
+
+
+# --- Destinations ---
+
+class DestinationFichier:
+    """Ajoute chaque événement comme une ligne JSON dans un fichier."""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self._verrou = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+
+    def envoyer(self, evenements):
+        with self._verrou, open(self.chemin, 'a', encoding='utf-8') as fichier:
+            for evenement in evenements:
+                fichier.write(json.dumps(evenement, default=str, ensure_ascii=False) + '\n')
+            fichier.flush()
+            # Livré = sur disque : l'événement est ensuite marqué livré en base
+            os.fsync(fichier.fileno())
+
+
+class DestinationWebhook:
+    """
+    POST d'un lot d'événements en JSON (`{"evenements": [...]}`). Avec un secret, le corps est
+    signé (HMAC-SHA256, en-tête X-Signature). Toute réponse hors 2xx fait échouer le lot.
+    """
+
+    def __init__(self, url, timeout=10, secret=None):
+        self.url = url
+        self.timeout = timeout
+        self.secret = secret
+        self._session = None
+        self._pid = None
+
+    @property
+    def session(self):
+        # Une session par processus, comme pour le client PayDunya
+        if self._session is None or self._pid != os.getpid():
+            import requests
+            self._session = requests.Session()
+            self._pid = os.getpid()
+        return self._session
+
+    def envoyer(self, evenements):
+        corps = json.dumps({'evenements': evenements}, default=str, ensure_ascii=False).encode('utf-8')
+        entetes = {'Content-Type': 'application/json'}
+        if self.secret:
+            entetes['X-Signature'] = hmac.new(self.secret.encode('utf-8'), corps, hashlib.sha256).hexdigest()
+        reponse = self.session.post(self.url, data=corps, headers=entetes, timeout=self.timeout)
+        reponse.raise_for_status()
+
+
+class DestinationFile:
+    """
+    File d'attente en mémoire, lue par des consommateurs du même processus. Chaque worker ne
+    reçoit que les événements que son relais a livrés.
+    """
+
+    def __init__(self, taille_max=0):
+        self.file = queue.Queue(maxsize=taille_max)
+
+    def envoyer(self, evenements):
+        for evenement in evenements:
+            self.file.put(evenement, timeout=5)
+
+
+# nom (EVENEMENTS_DESTINATIONS) -> fabrique(config) ; d'autres destinations peuvent s'y ajouter
+FABRIQUES_DESTINATIONS = {
+    'fichier': lambda config: DestinationFichier(config['EVENEMENTS_FICHIER']),
+    'webhook': lambda config: DestinationWebhook(
+        config['EVENEMENTS_WEBHOOK_URL'], config['EVENEMENTS_WEBHOOK_TIMEOUT'], config['EVENEMENTS_WEBHOOK_SECRET']),
+    'file': lambda config: DestinationFile(),
+}
+
+
+def creer_destinations(config):
+    destinations = {}
+    for nom in config.get('EVENEMENTS_DESTINATIONS') or []:
+        if nom not in FABRIQUES_DESTINATIONS:
+            raise ValueError(f"Destination d'événements inconnue dans EVENEMENTS_DESTINATIONS : {nom}")
+        destinations[nom] = FABRIQUES_DESTINATIONS[nom](config)
+    return destinations
+
+
+def message_evenement(evenement):
+    return {
+        'id': evenement.id,
+        'type': evenement.type,
+        'cle': evenement.cle,
+        'cree_le': evenement.cree_le.isoformat() if evenement.cree_le else None,
+        'donnees': json.loads(evenement.donnees),
+    }
+
+
+# --- Relais ---
+
+class RelaisEvenements:
+    """
+    Livre les événements de l'outbox aux destinations configurées, par lots, dans l'ordre des
+    identifiants pour une même `cle` : un événement n'est pas envoyé tant qu'un événement
+    antérieur de la même entité attend un nouvel essai ou est réservé par un autre relais
+    (les autres entités, elles, continuent d'avancer). Un lot est réservé par un bail (UPDATE conditionnel, comme le planificateur)
+    avant d'être envoyé, puis marqué livré une fois que toutes les destinations l'ont accepté :
+    la livraison est « au moins une fois » (un relais arrêté entre l'envoi et le marquage
+    renvoie le lot à l'expiration du bail), les consommateurs dédupliquent sur `id`. Un lot
+    refusé est retenté plus tard, avec un délai qui double à chaque échec. Comme pour le
+    planificateur, le thread n'est lancé que par `demarrer`.
+    """
+
+    def __init__(self, app=None):
+        self.identifiant = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._destinations = None
+        self._arret = threading.Event()
+        self._thread = None
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.taille_lot = app.config.get('EVENEMENTS_TAILLE_LOT', 500)
+        self.intervalle = app.config.get('EVENEMENTS_INTERVALLE', 1.0)
+        self.duree_bail = timedelta(seconds=app.config.get('EVENEMENTS_BAIL', 60))
+        self.backoff = app.config.get('EVENEMENTS_BACKOFF', 5)
+        self.backoff_max = app.config.get('EVENEMENTS_BACKOFF_MAX', 600)
+        self._destinations = None
+        app.extensions['relais_evenements'] = self
+
+    @property
+    def destinations(self):
+        # Créées au premier lot : le fichier ou la session HTTP ne servent qu'au processus qui relaie
+        if self._destinations is None:
+            self._destinations = creer_destinations(self.app.config)
+        return self._destinations
+
+    def ajouter_destination(self, nom, destination):
+        """Branche une destination (tout objet ayant une méthode `envoyer(evenements)`)."""
+        self.destinations[nom] = destination
+
+    # --- Boucle d'exécution ---
+
+    def demarrer(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        # Un nouveau processus (fork) reçoit un nouvel identifiant de bail
+        self.identifiant = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._arret.clear()
+        self._thread = threading.Thread(target=self._boucle, name='relais-evenements', daemon=True)
+        self._thread.start()
+
+    def arreter(self):
+        self._arret.set()
+
+    def _boucle(self):
+        while not self._arret.wait(self.intervalle):
+            with self.app.app_context():
+                try:
+                    self.relayer()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Erreur dans la boucle du relais d'événements")
+                finally:
+                    db.session.remove()
+
+    def relayer(self, max_lots=None, taille_lot=None):
+        """Livre les lots disponibles jusqu'à épuisement (ou `max_lots`) ; s'arrête au premier échec."""
+        debut = time.perf_counter()
+        rapport = {"lots": 0, "livres": 0, "echecs": 0}
+        while max_lots is None or rapport["lots"] < max_lots:
+            livres, echecs = self.relayer_lot(taille_lot)
+            if not livres and not echecs:
+                break
+            rapport["lots"] += 1
+            rapport["livres"] += livres
+            rapport["echecs"] += echecs
+            if echecs:
+                break
+        duree = time.perf_counter() - debut
+        rapport["duree_secondes"] = round(duree, 3)
+        rapport["evenements_par_seconde"] = round(rapport["livres"] / duree, 1) if duree else None
+        return rapport
+
+    def relayer_lot(self, taille_lot=None):
+        """Réserve, envoie et marque un lot. Renvoie (livrés, en échec)."""
+        maintenant = datetime.now()
+        evenements = self._reserver(taille_lot or self.taille_lot, maintenant)
+        if not evenements:
+            return 0, 0
+        ids = [evenement.id for evenement in evenements]
+        messages = [message_evenement(evenement) for evenement in evenements]
+        tentatives = max(evenement.tentatives for evenement in evenements)
+        # Pas de connexion immobilisée pendant l'envoi
+        db.session.rollback()
+
+        try:
+            for destination in self.destinations.values():
+                destination.envoyer(messages)
+        except Exception as e:
+            delai = min(self.backoff * 2 ** tentatives, self.backoff_max)
+            logger.warning("Échec de livraison d'un lot d'événements",
+                           extra={'evenements': len(ids), 'premier_id': ids[0], 'erreur': str(e),
+                                  'nouvel_essai_dans': delai})
+            self._liberer(ids, {
+                'tentatives': EvenementSortant.tentatives + 1,
+                'prochaine_tentative': datetime.now() + timedelta(seconds=delai),
+                'derniere_erreur': str(e)[:1000],
+            })
+            metriques.evenements_sortants.inc(len(ids), resultat='echec')
+            return 0, len(ids)
+
+        self._liberer(ids, {'livre_le': datetime.now(), 'derniere_erreur': None})
+        metriques.evenements_sortants.inc(len(ids), resultat='livre')
+        return len(ids), 0
+
+    def _reserver(self, taille_lot, maintenant):
+        disponible = or_(EvenementSortant.verrouille_jusqu_a.is_(None), EvenementSortant.verrouille_jusqu_a < maintenant)
+        # Un événement antérieur de la même entité qui ne peut pas partir maintenant le bloque ;
+        # s'il peut partir, il précède celui-ci dans le lot (ordre des identifiants)
+        anterieur = aliased(EvenementSortant)
+        bloque = exists().where(
+            anterieur.cle == EvenementSortant.cle,
+            anterieur.id < EvenementSortant.id,
+            anterieur.livre_le.is_(None),
+            or_(anterieur.prochaine_tentative > maintenant, anterieur.verrouille_jusqu_a >= maintenant)
+        )
+        candidats = select(EvenementSortant.id).where(
+            EvenementSortant.livre_le.is_(None),
+            or_(EvenementSortant.prochaine_tentative.is_(None), EvenementSortant.prochaine_tentative <= maintenant),
+            disponible,
+            ~bloque
+        ).order_by(EvenementSortant.id).limit(taille_lot)
+        resultat = db.session.execute(
+            update(EvenementSortant)
+            .where(EvenementSortant.id.in_(candidats.scalar_subquery()), disponible)
+            .values(verrouille_par=self.identifiant, verrouille_jusqu_a=maintenant + self.duree_bail),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        if resultat.rowcount == 0:
+            return []
+        return db.session.query(EvenementSortant).filter(
+            EvenementSortant.verrouille_par == self.identifiant,
+            EvenementSortant.livre_le.is_(None)
+        ).order_by(EvenementSortant.id).all()
+
+    def _liberer(self, ids, valeurs):
+        # Seulement si le bail est toujours le nôtre : à son expiration, un autre relais a pu reprendre le lot
+        db.session.execute(
+            update(EvenementSortant)
+            .where(EvenementSortant.id.in_(ids), EvenementSortant.verrouille_par == self.identifiant)
+            .values(verrouille_par=None, verrouille_jusqu_a=None, **valeurs),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+
+relais_evenements = RelaisEvenements()
+
+
+@planificateur.tache('purge_evenements', heure=4)
+def tache_purge_evenements():
+    """Supprime les événements livrés depuis plus de EVENEMENTS_RETENTION_JOURS jours."""
+    limite = datetime.now() - timedelta(days=current_app.config['EVENEMENTS_RETENTION_JOURS'])
+    resultat = db.session.execute(
+        delete(EvenementSortant).where(EvenementSortant.livre_le < limite),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return {"evenements_supprimes": resultat.rowcount}
@@ -0,0 +1,345 @@
+import csv
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import bindparam, func, select, text
+
+from app import bcrypt, db
+from app.models import Chambre, Contrat, Maison, Media, Paiement, Utilisateur
+from app.services.disponibilite import index_disponibilite
+
+# Volumes prédéfinis ; « grand » donne environ 20 millions de paiements
+VOLUMES = {
+    'petit': {'proprietaires': 100, 'maisons': 1000, 'chambres': 5000, 'locataires': 2000,
+              'contrats': 10000, 'medias': 10000},
+    'moyen': {'proprietaires': 1000, 'maisons': 10000, 'chambres': 50000, 'locataires': 20000,
+              'contrats': 100000, 'medias': 100000},
+    'grand': {'proprietaires': 10000, 'maisons': 100000, 'chambres': 500000, 'locataires': 200000,
+              'contrats': 1000000, 'medias': 1000000},
+}
+
+# (ville, poids, loyer médian en FCFA)
+VILLES = [
+    ('Dakar', 40, 120000), ('Pikine', 10, 60000), ('Guédiawaye', 7, 55000), ('Rufisque', 6, 50000),
+    ('Thiès', 8, 45000), ('Saint-Louis', 6, 50000), ('Mbour', 6, 55000), ('Touba', 5, 35000),
+    ('Kaolack', 4, 35000), ('Ziguinchor', 4, 40000), ('Diourbel', 2, 30000), ('Tambacounda', 2, 30000),
+]
+QUARTIERS = ['Médina', 'Plateau', 'HLM', 'Liberté', 'Sacré-Cœur', 'Ouakam', 'Yoff', 'Parcelles Assainies',
+             'Grand Yoff', 'Mermoz', 'Fann', 'Point E', 'Ngor', 'Almadies', 'Keur Massar', 'Centre']
+TYPES_CHAMBRE = [('simple', 60, 1.0), ('appartement', 30, 2.2), ('maison', 10, 3.5)]
+MODES_PAIEMENT = [('virement', 40), ('orange_money', 30), ('wave', 25), ('especes', 5)]
+
+MOT_DE_PASSE = 'motdepasse'
+
+
+class GenerateurDonnees:
+    """
+    Génère un jeu de données volumineux et réaliste (villes, loyers, statuts) pour les tests
+    de charge et les benchmarks. Le résultat ne dépend que de la graine, des volumes et de la
+    date de référence.
+
+    Les identifiants sont attribués à la suite des lignes existantes, ce qui évite de relire
+    les lignes insérées : les insertions se font par lots en SQL Core (COPY sur PostgreSQL
+    avec psycopg2). Les contrats d'une chambre se suivent sans se chevaucher ; seul le dernier
+    peut être actif à la date de référence.
+    """
+
+    def __init__(self, volumes, graine=42, reference=None, taille_lot=10000, progression=None):
+        self.volumes = volumes
+        self.alea = random.Random(graine)
+        self.reference = reference or date.today()
+        self.taille_lot = taille_lot
+        self.progression = progression or (lambda message: None)
+        self.connexion = db.session.connection()
+        self.compteurs = {}
+
+    # --- Insertion par lots ---
+
+    def _premier_id(self, modele):
+        return (db.session.execute(select(func.max(modele.id))).scalar() or 0) + 1
+
+    def _inserer(self, modele, lignes):
+        if not lignes:
+            return
+        table = modele.__table__
+        if self.connexion.dialect.driver == 'psycopg2':
+            colonnes = list(lignes[0])
+            tampon = io.StringIO()
+            ecrivain = csv.writer(tampon)
+            for ligne in lignes:
+                ecrivain.writerow([r'\N' if ligne[c] is None else ligne[c] for c in colonnes])
+            tampon.seek(0)
+            curseur = self.connexion.connection.cursor()
+            curseur.copy_expert(
+                f"COPY {table.name} ({', '.join(colonnes)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", tampon
+            )
+        else:
+            self.connexion.execute(table.insert(), lignes)
+        self.compteurs[table.name] = self.compteurs.get(table.name, 0) + len(lignes)
+
+    def _par_lots(self, modele, generateur):
+        lot = []
+        for ligne in generateur:
+            lot.append(ligne)
+            if len(lot) >= self.taille_lot:
+                self._inserer(modele, lot)
+                lot = []
+        self._inserer(modele, lot)
+        self.progression(f"{modele.__tablename__}: {self.compteurs.get(modele.__tablename__, 0)} lignes")
+
+    def _tirage(self, choix):
+        return self.alea.choices([c[0] for c in choix], weights=[c[1] for c in choix])[0]
+
+    def _date_creation(self, jours_max):
+        return datetime.combine(self.reference, datetime.min.time()) - timedelta(
+            days=self.alea.randint(0, jours_max), seconds=self.alea.randint(0, 86399))
+
+    # --- Génération ---
+
+    def generer(self):
+        debut = time.perf_counter()
+        hash_mot_de_passe = bcrypt.generate_password_hash(MOT_DE_PASSE).decode('utf-8')
+        proprietaires = self._utilisateurs('proprietaire', self.volumes['proprietaires'], hash_mot_de_passe)
+        locataires = self._utilisateurs('locataire', self.volumes['locataires'], hash_mot_de_passe)
+        maisons = self._maisons(proprietaires)
+        chambres = self._chambres(maisons)
+        self._medias(chambres)
+        self._contrats_et_paiements(chambres, locataires)
+        self._synchroniser_sequences()
+        db.session.commit()
+        index_disponibilite.invalider()
+        return dict(self.compteurs, duree_secondes=round(time.perf_counter() - debut, 1))
+
+    def _utilisateurs(self, role, nombre, hash_mot_de_passe):
+        premier = self._premier_id(Utilisateur)
+        prefixe = 'proprio' if role == 'proprietaire' else 'locataire'
+
+        def lignes():
+            for i in range(premier, premier + nombre):
+                yield {
+                    'id': i,
+                    'nom_utilisateur': f'{prefixe}{i}',
+                    'email': f'{prefixe}{i}@exemple.sn',
+                    'mot_de_passe': hash_mot_de_passe,
+                    'telephone': f'77{self.alea.randint(0, 9999999):07d}',
+                    'cni': None,
+                    'role': role,
+                    'cree_le': self._date_creation(1500),
+                }
+
+        self._par_lots(Utilisateur, lignes())
+        return range(premier, premier + nombre)
+
+    def _maisons(self, proprietaires):
+        premier = self._premier_id(Maison)
+        nombre = self.volumes['maisons']
+        villes = [(i, v[1]) for i, v in enumerate(VILLES)]
+        # Quelques gros propriétaires et beaucoup de petits (loi de puissance)
+        poids_proprietaires = [1 / (rang + 1) ** 0.8 for rang in range(len(proprietaires))]
+        maisons = []
+
+        def lignes():
+            tirages = self.alea.choices(proprietaires, weights=poids_proprietaires, k=nombre)
+            for i, proprietaire_id in zip(range(premier, premier + nombre), tirages):
+                ville = self._tirage(villes)
+                maisons.append(ville)
+                yield {
+                    'id': i,
+                    'adresse': f'{self.alea.randint(1, 300)} rue {self.alea.randint(1, 80)}, '
+                               f'{self.alea.choice(QUARTIERS)}',
+                    'ville': VILLES[ville][0],
+                    'description': None,
+                    'nombre_chambres': 0,
+                    'cree_le': self._date_creation(1200),
+                    'proprietaire_id': proprietaire_id,
+                }
+
+        self._par_lots(Maison, lignes())
+        return premier, maisons
+
+    def _chambres(self, maisons):
+        premier_maison, villes_maisons = maisons
+        premier = self._premier_id(Chambre)
+        nombre = self.volumes['chambres']
+        prix = []
+        par_maison = [0] * len(villes_maisons)
+
+        def lignes():
+            for i in range(premier, premier + nombre):
+                # Toutes les maisons ont au moins une chambre tant que c'est possible
+                index = i - premier if i - premier < len(villes_maisons) else self.alea.randrange(len(villes_maisons))
+                par_maison[index] += 1
+                type_chambre = self._tirage(TYPES_CHAMBRE)
+                coefficient = next(t[2] for t in TYPES_CHAMBRE if t[0] == type_chambre)
+                loyer = VILLES[villes_maisons[index]][2] * coefficient * self.alea.lognormvariate(0, 0.25)
+                loyer = max(round(loyer / 5000) * 5000, 10000)
+                prix.append(loyer)
+                yield {
+                    'id': i,
+                    'maison_id': premier_maison + index,
+                    'titre': f'{type_chambre.capitalize()} {i}',
+                    'description': None,
+                    'taille': f'{self.alea.randint(9, 25) * round(coefficient)}m²',
+                    'type': type_chambre,
+                    'meublee': self.alea.random() < 0.3,
+                    'salle_de_bain': self.alea.random() < 0.5,
+                    'prix': loyer,
+                    'disponible': True,
+                    'cree_le': self._date_creation(1000),
+                }
+
+        self._par_lots(Chambre, lignes())
+        self.connexion.execute(
+            Maison.__table__.update()
+            .where(Maison.id == bindparam('b_id'))
+            .values(nombre_chambres=bindparam('b_nombre')),
+            [{'b_id': premier_maison + i, 'b_nombre': n} for i, n in enumerate(par_maison) if n]
+        )
+        return premier, prix
+
+    def _medias(self, chambres):
+        premier_chambre, prix = chambres
+        premier = self._premier_id(Media)
+
+        def lignes():
+            for i in range(premier, premier + self.volumes['medias']):
+                chambre_id = premier_chambre + self.alea.randrange(len(prix))
+                video = self.alea.random() < 0.1
+                yield {
+                    'id': i,
+                    'chambre_id': chambre_id,
+                    'url': f"/static/uploads/seed_{chambre_id}_{i}.{'mp4' if video else 'jpg'}",
+                    'type': 'video' if video else 'photo',
+                    'description': None,
+                    'cree_le': self._date_creation(900),
+                }
+
+        self._par_lots(Media, lignes())
+
+    def _contrats_et_paiements(self, chambres, locataires):
+        premier_chambre, prix = chambres
+        contrat_id = self._premier_id(Contrat)
+        paiement_id = self._premier_id(Paiement)
+        restants = self.volumes['contrats']
+        contrats, paiements, chambres_occupees = [], [], []
+
+        # Répartition des contrats : ~70 % des chambres ont déjà été louées
+        nombre_chambres = len(prix)
+        moyenne = max(restants / (nombre_chambres * 0.7), 1)
+        for index in range(nombre_chambres):
+            if restants <= 0:
+                break
+            if self.alea.random() > 0.7 and index < nombre_chambres - 1:
+                continue
+            nombre = min(restants, max(1, round(self.alea.expovariate(1 / moyenne))))
+            restants -= nombre
+            chambre_id = premier_chambre + index
+            for contrat, echeances in self._historique_chambre(chambre_id, prix[index], nombre, locataires):
+                contrat['id'] = contrat_id
+                contrats.append(contrat)
+                for echeance in echeances:
+                    echeance['id'] = paiement_id
+                    echeance['contrat_id'] = contrat_id
+                    paiements.append(echeance)
+                    paiement_id += 1
+                if contrat['statut'] == 'actif' and contrat['date_debut'] <= self.reference:
+                    chambres_occupees.append(chambre_id)
+                contrat_id += 1
+
+            # Les paiements référencent les contrats : insérer les contrats du lot d'abord
+            if len(paiements) >= self.taille_lot:
+                self._inserer(Contrat, contrats)
+                self._inserer(Paiement, paiements)
+                contrats, paiements = [], []
+        self._inserer(Contrat, contrats)
+        self._inserer(Paiement, paiements)
+
+        for i in range(0, len(chambres_occupees), self.taille_lot):
+            self.connexion.execute(
+                Chambre.__table__.update()
+                .where(Chambre.id.in_(chambres_occupees[i:i + self.taille_lot]))
+                .values(disponible=False)
+            )
+        self.progression(f"contrats: {self.compteurs.get('contrats', 0)} lignes, "
+                         f"paiements: {self.compteurs.get('paiements', 0)} lignes")
+
+    def _historique_chambre(self, chambre_id, loyer, nombre, locataires):
+        """Contrats successifs d'une chambre, du plus ancien au plus récent, avec leurs échéances."""
+        durees = [self.alea.choice((6, 12, 12, 12, 24, 24, 36)) for _ in range(nombre)]
+        # Le dernier contrat couvre la date de référence dans 60 % des cas
+        fin = self.reference + relativedelta(months=self.alea.randint(1, durees[-1])) \
+            if self.alea.random() < 0.6 else self.reference - timedelta(days=self.alea.randint(1, 400))
+        debut = fin - relativedelta(months=sum(durees))
+        for rang, duree in enumerate(durees):
+            date_debut = debut
+            date_fin = debut + relativedelta(months=duree)
+            debut = date_fin
+            if date_fin > self.reference:
+                statut = 'actif'
+            else:
+                statut = 'resilie' if self.alea.random() < 0.08 else 'termine'
+            # Quelques demandes récentes restent en attente ou ont été rejetées
+            if rang == nombre - 1 and date_debut > self.reference - timedelta(days=30) and self.alea.random() < 0.3:
+                statut = self.alea.choice(('en_attente_validation', 'rejete'))
+            mois_caution = self.alea.choice((1, 1, 2, 3))
+            contrat = {
+                'locataire_id': self.alea.choice(locataires),
+                'chambre_id': chambre_id,
+                'date_debut': date_debut,
+                'date_fin': date_fin,
+                'duree_mois': duree,
+                'montant_caution': loyer * mois_caution,
+                'mois_caution': mois_caution,
+                'description': None,
+                'mode_paiement': self._tirage(MODES_PAIEMENT),
+                'periodicite': 'mensuel',
+                'statut': statut,
+                'cree_le': datetime.combine(date_debut, datetime.min.time()) - timedelta(days=self.alea.randint(1, 20)),
+            }
+            echeances = self._echeances(contrat, loyer) if statut in ('actif', 'termine', 'resilie') else []
+            yield contrat, echeances
+
+    def _echeances(self, contrat, loyer):
+        echeances = []
+        payeur_regulier = self.alea.random() < 0.85
+        for mois in range(contrat['duree_mois']):
+            echeance = contrat['date_debut'] + relativedelta(months=mois)
+            ligne = {
+                'montant': loyer,
+                'date_echeance': echeance,
+                'date_paiement': None,
+                'statut': 'impayé',
+                'paydunya_invoice_token': None,
+                'paydunya_transaction_id': None,
+                'en_retard': False,
+                'cree_le': contrat['cree_le'],
+            }
+            if echeance <= self.reference:
+                if self.alea.random() < (0.97 if payeur_regulier else 0.6):
+                    ligne['statut'] = 'payé'
+                    ligne['date_paiement'] = datetime.combine(echeance, datetime.min.time()) + timedelta(
+                        days=self.alea.randint(-3, 10), hours=self.alea.randint(8, 20))
+                elif echeance >= self.reference - timedelta(days=3) and self.alea.random() < 0.5:
+                    # Paiement PayDunya en cours (pour la réconciliation)
+                    ligne['statut'] = 'en_cours_traitement'
+                    ligne['paydunya_invoice_token'] = f"seed_{contrat['chambre_id']}_{echeance:%Y%m}_{self.alea.getrandbits(32):08x}"
+                else:
+                    ligne['en_retard'] = echeance < self.reference
+            echeances.append(ligne)
+        return echeances
+
+    def _synchroniser_sequences(self):
+        if self.connexion.dialect.name != 'postgresql':
+            return
+        for modele in (Utilisateur, Maison, Chambre, Media, Contrat, Paiement):
+            table = modele.__tablename__
+            self.connexion.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+            ))
+
+
+def generer_jeu_de_donnees(volumes, graine=42, reference=None, taille_lot=10000, progression=None):
+    return GenerateurDonnees(volumes, graine, reference, taille_lot, progression).generer()
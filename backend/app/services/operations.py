@@ -0,0 +1,296 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import bindparam, insert, select, update
+
+from app import db
+from app.models import Chambre, Contrat, Maison, Paiement
+from app.services.cycle_contrats import STATUTS_PAYES
+from app.services.disponibilite import index_disponibilite
+from app.services.evenements import donnees_contrat, donnees_paiement, publier_plusieurs
+from app.services.reservation import echeancier_approbation, verrouiller_chambres
+
+# Types d'opération, dans l'ordre où ils sont appliqués à l'intérieur d'un lot
+TYPES_OPERATIONS = ('modifier_chambre', 'rejeter_contrat', 'approuver_contrat', 'marquer_paiement_paye')
+
+# Champs modifiables d'une chambre -> (colonne, conversion qui lève ValueError/TypeError si
+# invalide). 'type' désignant l'opération, le type de chambre s'écrit 'type_chambre'.
+CHAMPS_CHAMBRE = {
+    'titre': ('titre', lambda v: _texte_non_vide(v)),
+    'description': ('description', lambda v: None if v is None else str(v)),
+    'taille': ('taille', lambda v: None if v is None else str(v)),
+    'type_chambre': ('type', lambda v: None if v is None else str(v)),
+    'meublee': ('meublee', bool),
+    'salle_de_bain': ('salle_de_bain', bool),
+    'prix': ('prix', float),
+    'disponible': ('disponible', bool),
+}
+
+# Chemin d'un contrat jusqu'au propriétaire de la maison
+JOINTURES_CONTRAT = ((Chambre, Contrat.chambre_id == Chambre.id), (Maison, Chambre.maison_id == Maison.id))
+
+
+class OperationRefusee(Exception):
+    def __init__(self, statut, message):
+        super().__init__(message)
+        self.statut = statut
+        self.message = message
+
+
+def _texte_non_vide(valeur):
+    if not isinstance(valeur, str) or not valeur.strip():
+        raise ValueError("titre vide")
+    return valeur
+
+
+def _proprietaires(modele, jointures, ids):
+    """identifiant -> (ligne, proprietaire_id) des `ids` qui existent, en une requête ; `jointures` mène à Maison."""
+    if not ids:
+        return {}
+    requete = select(modele, Maison.proprietaire_id).select_from(modele)
+    for jointure, condition in jointures:
+        requete = requete.join(jointure, condition)
+    lignes = db.session.execute(requete.where(modele.id.in_(ids))).all()
+    return {ligne[0].id: (ligne[0], ligne[1]) for ligne in lignes}
+
+
+def _verifier_propriete(trouves, identifiant, proprietaire_id, nom):
+    if identifiant not in trouves:
+        raise OperationRefusee(404, f"{nom} {identifiant} non trouvé(e).")
+    objet, proprietaire = trouves[identifiant]
+    if proprietaire != proprietaire_id:
+        raise OperationRefusee(403, f"{nom} {identifiant} ne vous appartient pas.")
+    return objet
+
+
+def _valeurs_chambre(operation):
+    valeurs = {}
+    for champ, (colonne, conversion) in CHAMPS_CHAMBRE.items():
+        if champ in operation:
+            try:
+                valeurs[colonne] = conversion(operation[champ])
+            except (TypeError, ValueError):
+                raise OperationRefusee(400, f"Valeur invalide pour '{champ}'.")
+    if not valeurs:
+        raise OperationRefusee(400, f"Aucun champ à modifier (champs acceptés : {', '.join(CHAMPS_CHAMBRE)}).")
+    return valeurs
+
+
+def _modifier_chambres(modifications):
+    """
+    Un UPDATE par ensemble de champs modifiés : `WHERE id IN (...)` quand toutes les chambres
+    reçoivent les mêmes valeurs (changement de prix groupé), sinon un executemany.
+    """
+    par_champs = defaultdict(list)
+    for chambre_id, valeurs in modifications.items():
+        par_champs[tuple(sorted(valeurs))].append((chambre_id, valeurs))
+    table = Chambre.__table__
+    for champs, lignes in par_champs.items():
+        if len({tuple(valeurs[c] for c in champs) for _, valeurs in lignes}) == 1:
+            db.session.execute(
+                update(table).where(table.c.id.in_([chambre_id for chambre_id, _ in lignes])).values(lignes[0][1]))
+        else:
+            db.session.execute(
+                update(table).where(table.c.id == bindparam('b_id'))
+                .values({champ: bindparam(f'b_{champ}') for champ in champs}),
+                [{'b_id': chambre_id, **{f'b_{c}': valeurs[c] for c in champs}} for chambre_id, valeurs in lignes])
+
+
+def _changer_statut(contrat_ids, statut, options):
+    """
+    Variante en lot de `changer_statut_contrat` : passe au `statut` ceux des contrats encore en
+    attente, note chacun pour l'index des disponibilités et renvoie leurs identifiants.
+    """
+    changes = set()
+    for contrat_id, chambre_id, date_debut, date_fin in db.session.execute(
+            update(Contrat)
+            .where(Contrat.id.in_(contrat_ids), Contrat.statut == 'en_attente_validation')
+            .values(statut=statut)
+            .returning(Contrat.id, Contrat.chambre_id, Contrat.date_debut, Contrat.date_fin),
+            execution_options=options):
+        index_disponibilite.noter_contrat(db.session, contrat_id, chambre_id, date_debut, date_fin, statut)
+        changes.add(contrat_id)
+    return changes
+
+
+def _approuver(contrats, chambres_prix):
+    """
+    Approuve les contrats dont la période ne chevauche ni un contrat actif de la chambre, ni un
+    contrat approuvé plus tôt dans le même lot. Renvoie ({contrat_id: nombre d'échéances},
+    {contrat_id: message de refus}).
+    """
+    chambre_ids = sorted({c.chambre_id for c in contrats})
+    # Comme l'approbation unitaire : chambres verrouillées avant de lire les contrats actifs
+    verrouiller_chambres(chambre_ids)
+    occupees = defaultdict(list)
+    for chambre_id, date_debut, date_fin in db.session.execute(
+            select(Contrat.chambre_id, Contrat.date_debut, Contrat.date_fin)
+            .where(Contrat.chambre_id.in_(chambre_ids), Contrat.statut == 'actif')):
+        occupees[chambre_id].append((date_debut, date_fin))
+
+    candidats, refuses = [], {}
+    for contrat in contrats:
+        periodes = occupees[contrat.chambre_id]
+        if any(debut < contrat.date_fin and fin > contrat.date_debut for debut, fin in periodes):
+            refuses[contrat.id] = "Un contrat actif existe déjà pour cette chambre sur cette période."
+            continue
+        periodes.append((contrat.date_debut, contrat.date_fin))
+        candidats.append(contrat)
+    if not candidats:
+        return {}, refuses
+
+    # Seuls les contrats encore en attente passent à 'actif' (une autre requête a pu les traiter)
+    options = {'synchronize_session': False}
+    actives = _changer_statut([c.id for c in candidats], 'actif', options)
+    approuves, lignes = {}, []
+    for contrat in candidats:
+        if contrat.id not in actives:
+            refuses[contrat.id] = "Le contrat n'est plus en statut 'en_attente_validation'."
+            continue
+        echeances = echeancier_approbation(contrat, chambres_prix[contrat.chambre_id])
+        lignes.extend({'contrat_id': p.contrat_id, 'montant': p.montant, 'date_echeance': p.date_echeance,
+                       'statut': p.statut} for p in echeances)
+        approuves[contrat.id] = len(echeances)
+    if lignes:
+        # Un INSERT multi-lignes au lieu d'un par échéance au flush
+        db.session.execute(insert(Paiement), lignes)
+    if approuves:
+        db.session.execute(
+            update(Chambre).where(Chambre.id.in_({c.chambre_id for c in candidats if c.id in approuves}))
+            .values(disponible=False),
+            execution_options=options)
+    return approuves, refuses
+
+
+def executer_operations(proprietaire_id, operations, atomique=False):
+    """
+    Applique un lot d'opérations du propriétaire dans une seule transaction et renvoie un
+    résultat par opération (statut HTTP et message, comme l'endpoint unitaire équivalent).
+
+    Les vérifications (existence, propriété, statut) se font en une requête par type
+    d'entité ; les écritures sont des UPDATE ensemblistes, les opérations d'un même type
+    étant appliquées ensemble (voir TYPES_OPERATIONS pour l'ordre). Une opération refusée
+    n'empêche pas les autres, sauf avec `atomique` : rien n'est alors appliqué.
+    """
+    resultats = [None] * len(operations)
+    par_type = defaultdict(list)  # type -> [(index, identifiant, operation)]
+
+    def refuser(index, statut, message):
+        resultats[index] = {"statut": statut, "message": message}
+
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('type') not in TYPES_OPERATIONS:
+            refuser(index, 400, f"Type d'opération inconnu (types acceptés : {', '.join(TYPES_OPERATIONS)}).")
+        elif not isinstance(operation.get('id'), int) or isinstance(operation.get('id'), bool):
+            refuser(index, 400, "Identifiant entier 'id' manquant.")
+        else:
+            par_type[operation['type']].append((index, operation['id'], operation))
+
+    chambres = _proprietaires(Chambre, ((Maison, Chambre.maison_id == Maison.id),), {i for _, i, _ in par_type['modifier_chambre']})
+    contrats = _proprietaires(Contrat, JOINTURES_CONTRAT, {
+        i for t in ('rejeter_contrat', 'approuver_contrat') for _, i, _ in par_type[t]})
+    paiements = _proprietaires(Paiement, ((Contrat, Paiement.contrat_id == Contrat.id),) + JOINTURES_CONTRAT, {i for _, i, _ in par_type['marquer_paiement_paye']})
+
+    modifications, a_rejeter, a_approuver, a_payer = {}, {}, {}, {}
+    for type_operation, trouves, nom in (('modifier_chambre', chambres, "Chambre"),
+                                         ('rejeter_contrat', contrats, "Contrat"),
+                                         ('approuver_contrat', contrats, "Contrat"),
+                                         ('marquer_paiement_paye', paiements, "Paiement")):
+        for index, identifiant, operation in par_type[type_operation]:
+            try:
+                objet = _verifier_propriete(trouves, identifiant, proprietaire_id, nom)
+                if type_operation == 'modifier_chambre':
+                    modifications[identifiant] = {**modifications.get(identifiant, {}), **_valeurs_chambre(operation)}
+                elif type_operation == 'marquer_paiement_paye':
+                    if objet.statut in STATUTS_PAYES:
+                        raise OperationRefusee(400, "Ce paiement est déjà marqué comme payé.")
+                    a_payer[identifiant] = objet
+                else:
+                    if identifiant in a_rejeter or identifiant in a_approuver:
+                        raise OperationRefusee(400, "Ce contrat est déjà traité par une autre opération du lot.")
+                    if objet.statut != 'en_attente_validation':
+                        raise OperationRefusee(400, f"Le contrat n'est pas en statut 'en_attente_validation'. "
+                                                    f"Statut actuel : {objet.statut}.")
+                    (a_rejeter if type_operation == 'rejeter_contrat' else a_approuver)[identifiant] = objet
+                resultats[index] = {"statut": 200, "message": "OK"}
+            except OperationRefusee as e:
+                refuser(index, e.statut, e.message)
+
+    if atomique and any(r['statut'] != 200 for r in resultats):
+        return _annuler(operations, resultats)
+
+    options = {'synchronize_session': False}
+    if modifications:
+        _modifier_chambres(modifications)
+
+    refuses = {}  # (type, identifiant) -> message : refus constatés à l'écriture
+    if a_rejeter:
+        rejetes = _changer_statut(list(a_rejeter), 'rejete', options)
+        # Les objets chargés gardent l'ancien statut (UPDATE sans synchronisation de la session)
+        publier_plusieurs('contrat.rejete', [
+            (f'contrat:{c.id}', donnees_contrat(c, statut='rejete')) for c in a_rejeter.values() if c.id in rejetes])
+        refuses.update({('rejeter_contrat', i): "Le contrat n'est plus en statut 'en_attente_validation'."
+                        for i in a_rejeter if i not in rejetes})
+
+    if a_approuver:
+        # Le prix lu après les modifications de ce lot : les échéances suivent le nouveau loyer
+        prix = dict(db.session.execute(select(Chambre.id, Chambre.prix).where(
+            Chambre.id.in_({c.chambre_id for c in a_approuver.values()}))).all())
+        approuves, refus_approbation = _approuver(list(a_approuver.values()), prix)
+        publier_plusieurs('contrat.approuve', [
+            (f'contrat:{c.id}', donnees_contrat(c, statut='actif', date_debut=c.date_debut, date_fin=c.date_fin,
+                                                nombre_echeances=approuves[c.id]))
+            for c in a_approuver.values() if c.id in approuves])
+        refuses.update({('approuver_contrat', i): message for i, message in refus_approbation.items()})
+
+    if a_payer:
+        payes = db.session.execute(
+            update(Paiement)
+            .where(Paiement.id.in_(a_payer), Paiement.statut.not_in(STATUTS_PAYES))
+            .values(statut='payé', date_paiement=datetime.utcnow())
+            .returning(Paiement.id, Paiement.contrat_id, Paiement.montant, Paiement.statut),
+            execution_options=options
+        ).all()
+        locataires = dict(db.session.execute(select(Contrat.id, Contrat.locataire_id).where(
+            Contrat.id.in_({p.contrat_id for p in payes}))).all()) if payes else {}
+        publier_plusieurs('paiement.paye', [
+            (f'paiement:{p.id}', donnees_paiement(p, locataire_id=locataires.get(p.contrat_id), source='proprietaire'))
+            for p in payes])
+        payes = {p.id for p in payes}
+        refuses.update({('marquer_paiement_paye', i): "Ce paiement est déjà marqué comme payé."
+                        for i in a_payer if i not in payes})
+
+    if refuses:
+        for type_operation in ('rejeter_contrat', 'approuver_contrat', 'marquer_paiement_paye'):
+            for index, identifiant, _ in par_type[type_operation]:
+                message = refuses.get((type_operation, identifiant))
+                if message and resultats[index]['statut'] == 200:
+                    refuser(index, 400, message)
+        if atomique:
+            return _annuler(operations, resultats)
+
+    db.session.commit()
+    return _rapport(operations, resultats, applique=True)
+
+
+def _annuler(operations, resultats):
+    """Lot atomique avec au moins un refus : rien n'est appliqué."""
+    db.session.rollback()
+    for resultat in resultats:
+        if resultat['statut'] == 200:
+            resultat.update(statut=424, message="Non appliquée : une autre opération du lot est refusée.")
+    return _rapport(operations, resultats, applique=False)
+
+
+def _rapport(operations, resultats, applique):
+    for index, (operation, resultat) in enumerate(zip(operations, resultats)):
+        resultat['index'] = index
+        if isinstance(operation, dict):
+            resultat['type'] = operation.get('type')
+            resultat['id'] = operation.get('id')
+    return {
+        "applique": applique,
+        "reussies": sum(1 for r in resultats if r['statut'] == 200),
+        "echecs": sum(1 for r in resultats if r['statut'] != 200),
+        "resultats": resultats,
+    }
@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from flask import current_app
+
+from app import metriques
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_SANDBOX = 'https://app.paydunya.com/sandbox-api/v1/'
+AGENT_UTILISATEUR = 'social-logement/1.0'
+# Réponses HTTP qui traduisent une indisponibilité passagère de PayDunya (et non un refus)
+STATUTS_INDISPONIBILITE = frozenset({429, 500, 502, 503, 504})
+
+
+class ErreurPaydunya(Exception):
+    pass
+
+
+class PaydunyaIndisponible(ErreurPaydunya):
+    """PayDunya n'a pas répondu à temps, a répondu en erreur serveur, ou le disjoncteur est ouvert."""
+
+    def __init__(self, message, reessayer_dans=None):
+        super().__init__(message)
+        self.reessayer_dans = reessayer_dans
+
+
+class PaydunyaRefus(ErreurPaydunya):
+    """PayDunya a répondu mais refuse l'opération (response_code différent de '00')."""
+
+    def __init__(self, code, texte):
+        super().__init__(f"{code}: {texte}")
+        self.code = code
+        self.texte = texte
+
+
+class Disjoncteur:
+    """
+    Coupe les appels après `seuil` échecs consécutifs : pendant `delai` secondes ils échouent
+    immédiatement, sans attendre le timeout. Passé ce délai, un seul appel d'essai est laissé
+    passer (semi-ouvert) ; son succès referme le disjoncteur, son échec le rouvre.
+    """
+
+    FERME = 'ferme'
+    OUVERT = 'ouvert'
+    SEMI_OUVERT = 'semi_ouvert'
+
+    def __init__(self, seuil=5, delai=30.0, horloge=time.monotonic):
+        self.seuil = seuil
+        self.delai = delai
+        self._horloge = horloge
+        self._verrou = threading.Lock()
+        self._etat = self.FERME
+        self._echecs = 0
+        self._ouvert_le = None
+        self._essai_en_cours = False
+
+    @property
+    def etat(self):
+        with self._verrou:
+            if self._etat == self.OUVERT and self._horloge() - self._ouvert_le >= self.delai:
+                return self.SEMI_OUVERT
+            return self._etat
+
+    def autoriser(self):
+        """Lève PaydunyaIndisponible si l'appel ne doit pas être tenté."""
+        with self._verrou:
+            if self._etat == self.FERME:
+                return
+            ecoule = self._horloge() - self._ouvert_le
+            if self._etat == self.OUVERT and ecoule >= self.delai:
+                self._etat = self.SEMI_OUVERT
+            if self._etat == self.SEMI_OUVERT and not self._essai_en_cours:
+                self._essai_en_cours = True
+                return
+            raise PaydunyaIndisponible("Disjoncteur PayDunya ouvert", reessayer_dans=max(self.delai - ecoule, 1))
+
+    def succes(self):
+        with self._verrou:
+            if self._etat != self.FERME:
+                logger.info("Disjoncteur PayDunya refermé")
+            self._etat = self.FERME
+            self._echecs = 0
+            self._essai_en_cours = False
+
+    def echec(self):
+        with self._verrou:
+            self._echecs += 1
+            self._essai_en_cours = False
+            if self._etat == self.SEMI_OUVERT or (self._etat == self.FERME and self._echecs >= self.seuil):
+                if self._etat == self.FERME:
+                    logger.warning("Disjoncteur PayDunya ouvert", extra={'echecs_consecutifs': self._echecs})
+                self._etat = self.OUVERT
+                self._ouvert_le = self._horloge()
+
+    def reinitialiser(self):
+        with self._verrou:
+            self._etat = self.FERME
+            self._echecs = 0
+            self._ouvert_le = None
+            self._essai_en_cours = False
+
+
+class ClientPaydunya:
+    """
+    Passerelle vers l'API checkout-invoice de PayDunya, en remplacement du SDK `paydunya` qui
+    ouvre une connexion HTTPS par appel, sans timeout.
+
+    - une session requests par processus, dont le pool garde les connexions ouvertes
+      (PAYDUNYA_POOL_TAILLE par worker) ;
+    - des timeouts de connexion et de lecture sur chaque appel ;
+    - des nouvelles tentatives, espacées d'un backoff exponentiel avec gigue, pour la
+      confirmation (lecture, donc idempotente). La création d'une facture n'est retentée que si
+      la connexion n'a pas pu s'établir : la requête n'a alors pas été envoyée ;
+    - un disjoncteur partagé par les appels du processus.
+
+    `requests` n'est importé qu'au premier appel (voir app.serveur.prechauffer).
+    """
+
+    def __init__(self, app=None):
+        self.disjoncteur = Disjoncteur()
+        self._session = None
+        self._pid = None
+        self._verrou = threading.Lock()
+        self.timeouts = (3.05, 10.0)
+        self.tentatives = 3
+        self.backoff = 0.2
+        self.backoff_max = 2.0
+        self.taille_pool = 10
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.timeouts = (config.get('PAYDUNYA_TIMEOUT_CONNEXION', 3.05), config.get('PAYDUNYA_TIMEOUT_LECTURE', 10.0))
+        self.tentatives = max(1, config.get('PAYDUNYA_TENTATIVES', 3))
+        self.backoff = config.get('PAYDUNYA_BACKOFF', 0.2)
+        self.backoff_max = config.get('PAYDUNYA_BACKOFF_MAX', 2.0)
+        self.taille_pool = config.get('PAYDUNYA_POOL_TAILLE', 10)
+        self.disjoncteur.seuil = config.get('PAYDUNYA_DISJONCTEUR_SEUIL', 5)
+        self.disjoncteur.delai = config.get('PAYDUNYA_DISJONCTEUR_DELAI', 30.0)
+        app.extensions['paydunya'] = self
+
+    # --- Session ---
+
+    @property
+    def session(self):
+        # Une session par processus : après un fork, les sockets du pool appartiennent au parent
+        if self._session is None or self._pid != os.getpid():
+            with self._verrou:
+                if self._session is None or self._pid != os.getpid():
+                    self._session = self._creer_session()
+                    self._pid = os.getpid()
+        return self._session
+
+    def _creer_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adaptateur = HTTPAdapter(pool_connections=1, pool_maxsize=self.taille_pool, max_retries=0)
+        session.mount('https://', adaptateur)
+        session.mount('http://', adaptateur)
+        session.headers.update({'User-Agent': AGENT_UTILISATEUR, 'Content-Type': 'application/json'})
+        return session
+
+    def reinitialiser(self):
+        """Oublie la session (et ses connexions) ; à appeler dans un worker juste après le fork."""
+        with self._verrou:
+            self._session = None
+            self._pid = None
+        self.disjoncteur.reinitialiser()
+
+    # --- API ---
+
+    def creer_facture(self, donnees):
+        """Crée une facture ; renvoie la réponse de PayDunya (`token`, `response_text` = URL de paiement)."""
+        return self._appeler('create', 'POST', 'checkout-invoice/create', donnees, idempotent=False)
+
+    def confirmer_facture(self, token):
+        """État d'une facture (`status` : pending, completed, cancelled...)."""
+        return self._appeler('confirm', 'GET', f'checkout-invoice/confirm/{token}', idempotent=True)
+
+    # --- Appels ---
+
+    @staticmethod
+    def _endpoint_et_entetes():
+        config = current_app.config
+        entetes = {
+            'PAYDUNYA-MASTER-KEY': config['PAYDUNYA_MASTER_KEY'],
+            'PAYDUNYA-PRIVATE-KEY': config['PAYDUNYA_PRIVATE_KEY'],
+            'PAYDUNYA-TOKEN': config['PAYDUNYA_TOKEN'],
+        }
+        return config.get('PAYDUNYA_SANDBOX_ENDPOINT') or ENDPOINT_SANDBOX, entetes
+
+    def _appeler(self, operation, methode, ressource, donnees=None, idempotent=True):
+        import requests
+
+        endpoint, entetes = self._endpoint_et_entetes()
+        url = endpoint + ressource
+        corps = json.dumps(donnees) if donnees is not None else None
+        tentative = 0
+        while True:
+            tentative += 1
+            self.disjoncteur.autoriser()
+            try:
+                with metriques.chronometre_paydunya(operation):
+                    reponse = self.session.request(methode, url, data=corps, headers=entetes, timeout=self.timeouts)
+                    if reponse.status_code in STATUTS_INDISPONIBILITE:
+                        raise PaydunyaIndisponible(f"PayDunya a répondu {reponse.status_code}")
+            except (requests.RequestException, PaydunyaIndisponible) as e:
+                self.disjoncteur.echec()
+                # Sans connexion établie, la requête n'est pas partie : même une création peut être rejouée
+                rejouable = idempotent or isinstance(e, requests.ConnectTimeout) or _connexion_refusee(e)
+                if not rejouable or tentative >= self.tentatives:
+                    logger.warning("Appel PayDunya en échec", extra={
+                        'operation': operation, 'tentatives': tentative, 'erreur': str(e)})
+                    if isinstance(e, PaydunyaIndisponible):
+                        raise
+                    raise PaydunyaIndisponible(f"PayDunya injoignable : {e}") from e
+                time.sleep(self._delai_avant(tentative))
+                continue
+
+            self.disjoncteur.succes()
+            try:
+                contenu = reponse.json()
+            except ValueError:
+                raise PaydunyaRefus(str(reponse.status_code), reponse.text[:200]) from None
+            code = str(contenu.get('response_code', reponse.status_code))
+            if reponse.status_code != 200 or code not in ('00', '0'):
+                raise PaydunyaRefus(code, contenu.get('response_text', 'Erreur inconnue.'))
+            return contenu
+
+    def _delai_avant(self, tentative):
+        """Backoff exponentiel plafonné, avec gigue complète (tirage uniforme entre 0 et le plafond)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (tentative - 1)))
+
+
+def _connexion_refusee(erreur):
+    """Vrai si la connexion TCP a échoué avant l'envoi de la requête (refus, DNS...)."""
+    from urllib3.exceptions import NewConnectionError
+
+    cause = erreur.args[0] if getattr(erreur, 'args', None) else None
+    return isinstance(getattr(cause, 'reason', cause), NewConnectionError)
+
+
+paydunya_client = ClientPaydunya()
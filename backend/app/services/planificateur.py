@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import TachePlanifiee
+
+logger = logging.getLogger(__name__)
+
+
+class Planificateur:
+    """
+    Planificateur de tâches quotidiennes exécuté dans le processus de l'application.
+
+    L'état des tâches (prochaine exécution, dernier résultat) est stocké dans la table
+    `taches_planifiees`. Avant d'exécuter une tâche, un worker prend un bail sur sa ligne
+    par un UPDATE conditionnel : quel que soit le nombre de processus qui font tourner le
+    planificateur, un seul exécute la tâche.
+
+    `init_app` ne fait qu'enregistrer : le thread est lancé par `demarrer`, dans le processus
+    qui sert les requêtes (voir app.serveur.demarrer_services).
+    """
+
+    def __init__(self, app=None):
+        self.taches = {}
+        self.identifiant = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._arret = threading.Event()
+        self._thread = None
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.intervalle = app.config.get('SCHEDULER_INTERVAL', 60)
+        self.duree_bail = timedelta(seconds=app.config.get('SCHEDULER_LOCK_TIMEOUT', 3600))
+        app.extensions['planificateur'] = self
+
+    def tache(self, nom, heure=0, minute=0):
+        """Enregistre une fonction à exécuter chaque jour à heure:minute."""
+        def decorateur(fn):
+            self.taches[nom] = {'fonction': fn, 'heure': heure, 'minute': minute}
+            return fn
+        return decorateur
+
+    # --- Boucle d'exécution ---
+
+    def demarrer(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        # Un nouveau processus (fork) reçoit un nouvel identifiant de bail
+        self.identifiant = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._arret.clear()
+        self._thread = threading.Thread(target=self._boucle, name='planificateur', daemon=True)
+        self._thread.start()
+
+    def arreter(self):
+        self._arret.set()
+
+    def _boucle(self):
+        while not self._arret.wait(self.intervalle):
+            with self.app.app_context():
+                try:
+                    self.executer_taches_dues()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Erreur dans la boucle du planificateur")
+                finally:
+                    db.session.remove()
+
+    def executer_taches_dues(self, maintenant=None):
+        """Exécute les tâches dont l'échéance est passée et dont ce worker obtient le bail."""
+        executees = []
+        for nom in self.taches:
+            maintenant_tache = maintenant or datetime.now()
+            self._assurer_ligne(nom, maintenant_tache)
+            if self._prendre_bail(nom, maintenant_tache):
+                self.executer(nom, maintenant_tache)
+                executees.append(nom)
+        return executees
+
+    def executer(self, nom, maintenant=None):
+        maintenant = maintenant or datetime.now()
+        tache = self.taches[nom]
+        try:
+            resultat = tache['fonction']()
+            valeurs = {
+                'derniere_execution': maintenant,
+                'prochaine_execution': self._prochaine_execution(tache, maintenant),
+                'dernier_resultat': json.dumps(resultat, default=str),
+            }
+            logger.info("Tâche %s exécutée: %s", nom, resultat)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("Échec de la tâche %s", nom)
+            resultat = None
+            valeurs = {
+                'prochaine_execution': maintenant + timedelta(minutes=15),
+                'dernier_resultat': json.dumps({'erreur': str(e)}),
+            }
+
+        liberation = db.session.execute(
+            update(TachePlanifiee)
+            .where(TachePlanifiee.nom == nom, TachePlanifiee.verrouille_par == self.identifiant)
+            .values(verrouille_par=None, verrouille_jusqu_a=None, **valeurs),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        if liberation.rowcount == 0:
+            # La tâche a duré plus que le bail : un autre worker a pu la reprendre entre-temps
+            logger.warning("Bail de la tâche %s perdu avant la fin de son exécution (SCHEDULER_LOCK_TIMEOUT "
+                           "dépassé) : résultat et prochaine exécution non enregistrés", nom,
+                           extra={'tache': nom, 'duree_bail_secondes': self.duree_bail.total_seconds()})
+        return resultat
+
+    # --- Persistance et bail ---
+
+    def _assurer_ligne(self, nom, maintenant):
+        if db.session.get(TachePlanifiee, nom) is not None:
+            return
+        try:
+            db.session.add(TachePlanifiee(
+                nom=nom,
+                prochaine_execution=self._prochaine_execution(self.taches[nom], maintenant)
+            ))
+            db.session.commit()
+        except IntegrityError:
+            # Un autre worker a créé la ligne en même temps
+            db.session.rollback()
+
+    def _prendre_bail(self, nom, maintenant):
+        resultat = db.session.execute(
+            update(TachePlanifiee)
+            .where(
+                TachePlanifiee.nom == nom,
+                TachePlanifiee.prochaine_execution <= maintenant,
+                or_(TachePlanifiee.verrouille_jusqu_a.is_(None), TachePlanifiee.verrouille_jusqu_a < maintenant)
+            )
+            .values(verrouille_par=self.identifiant, verrouille_jusqu_a=maintenant + self.duree_bail),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        return resultat.rowcount == 1
+
+    @staticmethod
+    def _prochaine_execution(tache, maintenant):
+        prochaine = maintenant.replace(hour=tache['heure'], minute=tache['minute'], second=0, microsecond=0)
+        if prochaine <= maintenant:
+            prochaine += timedelta(days=1)
+        return prochaine
+
+
+planificateur = Planificateur()
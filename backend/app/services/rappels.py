@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+from datetime import date
+from email.message import EmailMessage
+
+from flask import current_app
+from sqlalchemy import or_, and_
+
+from app import db
+from app.models import Chambre, Contrat, Maison, Paiement, Utilisateur
+from app.services.cycle_contrats import STATUTS_PAYES
+from app.services.planificateur import planificateur
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximum d'identifiants de paiements repris dans un rappel
+MAX_PAIEMENTS_PAR_RAPPEL = 20
+
+
+# --- Envoyeurs de rappels ---
+
+class EnvoyeurFichier:
+    """Ajoute chaque rappel comme une ligne JSON dans un fichier (file d'attente locale)."""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self._verrou = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+
+    def envoyer(self, rappels):
+        with self._verrou, open(self.chemin, 'a', encoding='utf-8') as fichier:
+            for rappel in rappels:
+                fichier.write(json.dumps(rappel, default=str, ensure_ascii=False) + '\n')
+
+
+class EnvoyeurSMTP:
+    """Envoie les rappels par email. En local, pointer vers un serveur SMTP de debug."""
+
+    def __init__(self, hote, port, expediteur):
+        self.hote = hote
+        self.port = port
+        self.expediteur = expediteur
+
+    def envoyer(self, rappels):
+        with smtplib.SMTP(self.hote, self.port, timeout=10) as smtp:
+            for rappel in rappels:
+                if not rappel.get('email'):
+                    continue
+                message = EmailMessage()
+                message['From'] = self.expediteur
+                message['To'] = rappel['email']
+                message['Subject'] = "Rappel : paiements de loyer en retard"
+                message.set_content(formater_rappel(rappel))
+                smtp.send_message(message)
+
+
+def creer_envoyeur(config):
+    if config.get('RAPPELS_ENVOYEUR') == 'smtp':
+        return EnvoyeurSMTP(config['RAPPELS_SMTP_HOTE'], config['RAPPELS_SMTP_PORT'], config['RAPPELS_EXPEDITEUR'])
+    return EnvoyeurFichier(config['RAPPELS_FICHIER'])
+
+
+def formater_rappel(rappel):
+    if rappel['destinataire'] == 'locataire':
+        intro = f"Bonjour {rappel['nom']}, vous avez {rappel['nombre_paiements']} paiement(s) en retard"
+    else:
+        intro = f"Bonjour {rappel['nom']}, {rappel['nombre_locataires']} locataire(s) ont {rappel['nombre_paiements']} paiement(s) en retard"
+    return (f"{intro} pour un total de {rappel['montant_total']} FCFA.\n"
+            f"Plus ancienne échéance : {rappel['plus_ancienne_echeance']}.")
+
+
+# --- Pipeline ---
+
+def paiements_en_retard_par_lots(aujourd_hui, taille_lot):
+    """
+    Parcourt les échéances impayées passées par lots, dans l'ordre de l'index
+    (date_echeance, id), sans charger d'objets ORM.
+    """
+    curseur = None
+    while True:
+        query = db.session.query(
+            Paiement.id, Paiement.date_echeance, Paiement.montant, Contrat.locataire_id, Maison.proprietaire_id
+        ).join(Contrat, Paiement.contrat_id == Contrat.id) \
+            .join(Chambre, Contrat.chambre_id == Chambre.id) \
+            .join(Maison, Chambre.maison_id == Maison.id) \
+            .filter(
+                Paiement.date_echeance < aujourd_hui,
+                Paiement.statut.not_in(STATUTS_PAYES),
+                Contrat.statut.in_(['actif', 'termine'])
+            )
+        if curseur is not None:
+            query = query.filter(or_(
+                Paiement.date_echeance > curseur[0],
+                and_(Paiement.date_echeance == curseur[0], Paiement.id > curseur[1])
+            ))
+        lot = query.order_by(Paiement.date_echeance, Paiement.id).limit(taille_lot).all()
+        if not lot:
+            return
+        yield lot
+        curseur = (lot[-1].date_echeance, lot[-1].id)
+        # Libérer la mémoire de la session entre deux lots
+        db.session.expunge_all()
+
+
+def _cumuler(groupes, cle, ligne, suivre_locataires=False):
+    groupe = groupes.get(cle)
+    if groupe is None:
+        groupe = groupes[cle] = {
+            "nombre_paiements": 0,
+            "montant_total": 0,
+            "plus_ancienne_echeance": ligne.date_echeance,
+            "paiements": [],
+            "locataires": set() if suivre_locataires else None,
+        }
+    groupe["nombre_paiements"] += 1
+    groupe["montant_total"] += ligne.montant
+    if len(groupe["paiements"]) < MAX_PAIEMENTS_PAR_RAPPEL:
+        groupe["paiements"].append(ligne.id)
+    if suivre_locataires:
+        groupe["locataires"].add(ligne.locataire_id)
+
+
+def _utilisateurs(ids, taille_lot):
+    ids = list(ids)
+    utilisateurs = {}
+    for i in range(0, len(ids), taille_lot):
+        for u in db.session.query(Utilisateur.id, Utilisateur.email, Utilisateur.nom_utilisateur) \
+                .filter(Utilisateur.id.in_(ids[i:i + taille_lot])):
+            utilisateurs[u.id] = u
+    return utilisateurs
+
+
+def _construire_rappels(destinataire, groupes, taille_lot):
+    utilisateurs = _utilisateurs(groupes.keys(), taille_lot)
+    for utilisateur_id, groupe in groupes.items():
+        utilisateur = utilisateurs.get(utilisateur_id)
+        rappel = {
+            "destinataire": destinataire,
+            "utilisateur_id": utilisateur_id,
+            "email": utilisateur.email if utilisateur else None,
+            "nom": utilisateur.nom_utilisateur if utilisateur else None,
+            "nombre_paiements": groupe["nombre_paiements"],
+            "montant_total": str(groupe["montant_total"]),
+            "plus_ancienne_echeance": groupe["plus_ancienne_echeance"].isoformat(),
+            "paiements": groupe["paiements"],
+        }
+        if destinataire == 'proprietaire':
+            rappel["nombre_locataires"] = len(groupe["locataires"])
+        yield rappel
+
+
+def envoyer_rappels_retard(aujourd_hui=None, envoyeur=None, taille_lot=None):
+    """
+    Regroupe les paiements en retard par locataire et par propriétaire et envoie un rappel
+    à chacun. La mémoire utilisée dépend du nombre de destinataires, pas du nombre de paiements.
+    """
+    aujourd_hui = aujourd_hui or date.today()
+    config = current_app.config
+    taille_lot = taille_lot or config['RAPPELS_TAILLE_LOT']
+    envoyeur = envoyeur or creer_envoyeur(config)
+    debut = time.perf_counter()
+
+    par_locataire = {}
+    par_proprietaire = {}
+    nombre_paiements = 0
+    for lot in paiements_en_retard_par_lots(aujourd_hui, taille_lot):
+        nombre_paiements += len(lot)
+        for ligne in lot:
+            _cumuler(par_locataire, ligne.locataire_id, ligne)
+            _cumuler(par_proprietaire, ligne.proprietaire_id, ligne, suivre_locataires=True)
+
+    rappels_envoyes = 0
+    for destinataire, groupes in (('locataire', par_locataire), ('proprietaire', par_proprietaire)):
+        tampon = []
+        for rappel in _construire_rappels(destinataire, groupes, taille_lot):
+            tampon.append(rappel)
+            if len(tampon) >= taille_lot:
+                envoyeur.envoyer(tampon)
+                rappels_envoyes += len(tampon)
+                tampon = []
+        if tampon:
+            envoyeur.envoyer(tampon)
+            rappels_envoyes += len(tampon)
+
+    duree = time.perf_counter() - debut
+    return {
+        "paiements_en_retard": nombre_paiements,
+        "locataires": len(par_locataire),
+        "proprietaires": len(par_proprietaire),
+        "rappels_envoyes": rappels_envoyes,
+        "duree_secondes": round(duree, 3),
+        "paiements_par_seconde": round(nombre_paiements / duree, 1) if duree else None,
+    }
+
+
+@planificateur.tache('rappels_paiements', heure=8)
+def tache_rappels_paiements():
+    return envoyer_rappels_retard()
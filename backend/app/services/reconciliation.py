@@ -0,0 +1,150 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import update
+
+from app import db
+from app.models import Contrat, Paiement
+from app.services.confirmations import confirmations_paydunya
+from app.services.evenements import donnees_paiement, publier_plusieurs
+from app.services.paydunya_client import Disjoncteur, ErreurPaydunya, PaydunyaRefus, paydunya_client
+from app.services.planificateur import planificateur
+
+logger = logging.getLogger(__name__)
+
+# Paiements initiés chez PayDunya dont le callback n'a pas (encore) été reçu
+STATUTS_EN_ATTENTE = ('en_cours_traitement', 'pending_paydunya_status')
+STATUTS_ANNULES = ('cancelled', 'failed', 'expired')
+MAX_EXEMPLES_ECARTS = 20
+
+
+def paiements_en_attente_par_lots(taille_lot):
+    """(id, token) des paiements en attente de PayDunya, par lots dans l'ordre des identifiants."""
+    dernier_id = 0
+    while True:
+        lot = db.session.query(Paiement.id, Paiement.paydunya_invoice_token).filter(
+            Paiement.statut.in_(STATUTS_EN_ATTENTE),
+            Paiement.paydunya_invoice_token.isnot(None),
+            Paiement.id > dernier_id
+        ).order_by(Paiement.id).limit(taille_lot).all()
+        # Pas de connexion immobilisée pendant les appels à PayDunya
+        db.session.rollback()
+        if not lot:
+            return
+        yield lot
+        dernier_id = lot[-1].id
+
+
+def _confirmer(app, token):
+    with app.app_context():
+        try:
+            return paydunya_client.confirmer_facture(token).get('status') or 'unknown', None
+        except ErreurPaydunya as e:
+            return None, e
+
+
+def _appliquer(ids, valeurs, type_evenement, simulation, **donnees):
+    """
+    UPDATE en masse ; seuls les paiements encore en attente sont modifiés (un callback a pu
+    passer). Un événement est publié pour chaque paiement modifié. Renvoie leur nombre.
+    """
+    if not ids or simulation:
+        return len(ids)
+    modifies = db.session.execute(
+        update(Paiement)
+        .where(Paiement.id.in_(ids), Paiement.statut.in_(STATUTS_EN_ATTENTE))
+        .values(**valeurs)
+        .returning(Paiement.id, Paiement.contrat_id, Paiement.montant, Paiement.statut),
+        execution_options={'synchronize_session': False}
+    ).all()
+    if not modifies:
+        return 0
+    locataires = dict(db.session.query(Contrat.id, Contrat.locataire_id).filter(
+        Contrat.id.in_({paiement.contrat_id for paiement in modifies})).all())
+    publier_plusieurs(type_evenement, [
+        (f'paiement:{paiement.id}', donnees_paiement(
+            paiement, locataire_id=locataires.get(paiement.contrat_id), source='reconciliation', **donnees))
+        for paiement in modifies
+    ])
+    return len(modifies)
+
+
+def _noter_ecart(rapport, paiement_id, statut_paydunya):
+    if len(rapport["ecarts"]) < MAX_EXEMPLES_ECARTS:
+        rapport["ecarts"].append({"paiement_id": paiement_id, "statut_paydunya": statut_paydunya})
+
+
+def reconcilier_paiements(taille_lot=None, concurrence=None, simulation=False):
+    """
+    Confronte les paiements restés en attente à l'état de leur facture chez PayDunya :
+    payée -> 'paye', annulée/échouée/expirée -> 'impaye', en attente -> inchangé. Les
+    confirmations d'un lot partent en parallèle (au plus `concurrence` à la fois), puis les
+    résultats sont appliqués par UPDATE en masse. En `simulation`, rien n'est écrit.
+    S'arrête au premier lot si le disjoncteur PayDunya s'ouvre.
+    """
+    config = current_app.config
+    taille_lot = taille_lot or config['RECONCILIATION_TAILLE_LOT']
+    concurrence = concurrence or config['RECONCILIATION_CONCURRENCE']
+    app = current_app._get_current_object()
+    debut = time.perf_counter()
+
+    rapport = {
+        "examines": 0, "payes": 0, "annules": 0, "en_attente": 0, "inconnus": 0, "erreurs": 0,
+        "deja_modifies": 0, "interrompu": False, "simulation": simulation, "ecarts": [],
+    }
+    with ThreadPoolExecutor(max_workers=concurrence, thread_name_prefix='reconciliation') as executeur:
+        for lot in paiements_en_attente_par_lots(taille_lot):
+            resultats = executeur.map(lambda ligne: _confirmer(app, ligne.paydunya_invoice_token), lot)
+            payes, annules = [], []
+            for ligne, (statut, erreur) in zip(lot, resultats):
+                rapport["examines"] += 1
+                if erreur is not None:
+                    rapport["erreurs"] += 1
+                    if isinstance(erreur, PaydunyaRefus):
+                        # Facture refusée ou inconnue chez PayDunya : le paiement reste en attente
+                        _noter_ecart(rapport, ligne.id, f'refus {erreur.code}')
+                    elif paydunya_client.disjoncteur.etat == Disjoncteur.OUVERT:
+                        rapport["interrompu"] = True
+                    continue
+                confirmations_paydunya.enregistrer(ligne.paydunya_invoice_token, statut)
+                if statut == 'completed':
+                    payes.append(ligne.id)
+                elif statut in STATUTS_ANNULES:
+                    annules.append(ligne.id)
+                elif statut == 'pending':
+                    rapport["en_attente"] += 1
+                    continue
+                else:
+                    rapport["inconnus"] += 1
+                    continue
+                _noter_ecart(rapport, ligne.id, statut)
+
+            date_paiement = datetime.now().date()
+            modifies = _appliquer(payes, {'statut': 'paye', 'date_paiement': date_paiement}, 'paiement.paye',
+                                  simulation, date_paiement=date_paiement)
+            modifies += _appliquer(annules, {'statut': 'impaye', 'paydunya_transaction_id': None}, 'paiement.annule',
+                                   simulation)
+            if not simulation:
+                db.session.commit()
+                rapport["deja_modifies"] += len(payes) + len(annules) - modifies
+            rapport["payes"] += len(payes)
+            rapport["annules"] += len(annules)
+            if rapport["interrompu"]:
+                logger.warning("Réconciliation interrompue : PayDunya indisponible",
+                               extra={'examines': rapport["examines"]})
+                break
+
+    duree = time.perf_counter() - debut
+    rapport["duree_secondes"] = round(duree, 3)
+    rapport["paiements_par_seconde"] = round(rapport["examines"] / duree, 1) if duree else None
+    logger.info("Réconciliation PayDunya terminée",
+                extra={cle: valeur for cle, valeur in rapport.items() if cle != "ecarts"})
+    return rapport
+
+
+@planificateur.tache('reconciliation_paydunya', heure=3)
+def tache_reconciliation_paydunya():
+    return reconcilier_paiements()
@@ -0,0 +1,96 @@
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import select, update
+
+from app import db
+from app.models import Chambre, Contrat, Paiement
+
+# Statuts qui occupent réellement une chambre sur leur période
+STATUTS_BLOQUANTS = ('actif', 'en_attente_validation')
+
+
+def verrouiller_chambre(chambre_id):
+    """
+    Verrouille la ligne de la chambre jusqu'à la fin de la transaction courante
+    et la recharge depuis la base.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        # SQLite ignore FOR UPDATE : une écriture neutre prend le verrou d'écriture
+        # de la base, ce qui sérialise les réservations concurrentes (modifie_le est
+        # repris tel quel : verrouiller n'est pas modifier).
+        db.session.execute(
+            update(Chambre).where(Chambre.id == chambre_id).values(id=Chambre.id, modifie_le=Chambre.modifie_le),
+            execution_options={'synchronize_session': False}
+        )
+        return Chambre.query.populate_existing().filter(Chambre.id == chambre_id).first()
+
+    return Chambre.query.populate_existing().filter(Chambre.id == chambre_id).with_for_update().first()
+
+
+def verrouiller_chambres(chambre_ids):
+    """Variante de `verrouiller_chambre` pour plusieurs chambres, en une instruction."""
+    if not chambre_ids:
+        return
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(
+            update(Chambre).where(Chambre.id.in_(chambre_ids)).values(id=Chambre.id, modifie_le=Chambre.modifie_le),
+            execution_options={'synchronize_session': False}
+        )
+        return
+    # Ordre des identifiants : deux lots qui se recoupent verrouillent dans le même ordre
+    db.session.execute(select(Chambre.id).where(Chambre.id.in_(chambre_ids)).order_by(Chambre.id).with_for_update())
+
+
+def changer_statut_contrat(contrat_id, statut, depuis='en_attente_validation'):
+    """
+    Passe le contrat de `depuis` à `statut` par un UPDATE conditionnel : faux si une autre
+    transaction l'a déjà fait changer de statut (le statut lu avant ne suffit pas).
+    """
+    # disponibilite importe ce module (STATUTS_BLOQUANTS)
+    from app.services.disponibilite import index_disponibilite
+    ligne = db.session.execute(
+        update(Contrat).where(Contrat.id == contrat_id, Contrat.statut == depuis)
+        .values(statut=statut).returning(Contrat.chambre_id, Contrat.date_debut, Contrat.date_fin)
+    ).first()
+    if ligne is None:
+        return False
+    # L'UPDATE ne passe pas par le flush : l'index des disponibilités ne le verrait pas
+    index_disponibilite.noter_contrat(db.session, contrat_id, *ligne, statut)
+    return True
+
+
+def contrats_chevauchants(chambre_id, date_debut, date_fin, statuts=STATUTS_BLOQUANTS, exclure_contrat_id=None):
+    """
+    Contrats de la chambre dont la période [date_debut, date_fin) chevauche celle demandée.
+    """
+    query = Contrat.query.filter(
+        Contrat.chambre_id == chambre_id,
+        Contrat.statut.in_(statuts),
+        Contrat.date_debut < date_fin,
+        Contrat.date_fin > date_debut
+    )
+    if exclure_contrat_id is not None:
+        query = query.filter(Contrat.id != exclure_contrat_id)
+    return query
+
+
+def echeancier_approbation(contrat, loyer_mensuel):
+    """
+    Paiements à créer à l'approbation d'un contrat : la caution si elle est due, puis un
+    loyer par mois de contrat à partir de la date de début.
+    """
+    paiements = []
+    if contrat.montant_caution > 0:
+        paiements.append(Paiement(
+            contrat_id=contrat.id,
+            montant=contrat.montant_caution,
+            date_echeance=contrat.date_debut,
+            statut='impayé',
+        ))
+    for i in range(contrat.duree_mois):
+        paiements.append(Paiement(
+            contrat_id=contrat.id,
+            montant=loyer_mensuel,
+            date_echeance=contrat.date_debut + relativedelta(months=+i),
+            statut='impayé',
+        ))
+    return paiements
@@ -0,0 +1,253 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import delete, event, or_, select, text, true
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models import Chambre, Contrat, Maison, Media, Paiement, Suppression
+from app.services.planificateur import planificateur
+
+logger = logging.getLogger(__name__)
+
+# Champs renvoyés par entité : les colonnes sont lues directement, sans charger les objets
+# (les tokens PayDunya ne quittent pas le serveur)
+CHAMPS = {
+    'contrats': (Contrat, ('id', 'locataire_id', 'chambre_id', 'date_debut', 'date_fin', 'duree_mois',
+                           'montant_caution', 'mois_caution', 'description', 'mode_paiement', 'periodicite',
+                           'statut', 'cree_le', 'modifie_le')),
+    'paiements': (Paiement, ('id', 'contrat_id', 'montant', 'date_echeance', 'date_paiement', 'statut',
+                             'en_retard', 'cree_le', 'modifie_le')),
+    'chambres': (Chambre, ('id', 'maison_id', 'titre', 'description', 'taille', 'type', 'meublee',
+                           'salle_de_bain', 'prix', 'disponible', 'cree_le', 'modifie_le')),
+    'medias': (Media, ('id', 'chambre_id', 'url', 'type', 'description', 'cree_le', 'modifie_le')),
+}
+
+# Classe -> nom de l'entité dans la table des suppressions et dans la réponse
+ENTITES = {Chambre: 'chambre', Contrat: 'contrat', Paiement: 'paiement', Media: 'media'}
+COLLECTIONS = {'chambre': 'chambres', 'contrat': 'contrats', 'paiement': 'paiements', 'media': 'medias'}
+
+
+# Curseur renvoyé quand il ne peut pas avancer sans instantané précédent : plus ancien que la
+# rétention, il redonne un instantané complet à l'appel suivant
+CURSEUR_INITIAL = datetime(1970, 1, 1)
+
+
+class CurseurInvalide(ValueError):
+    pass
+
+
+def lire_curseur(valeur):
+    """Curseur reçu du client (`since`) : None pour un instantané complet."""
+    if not valeur:
+        return None
+    try:
+        curseur = datetime.fromisoformat(valeur)
+    except ValueError:
+        raise CurseurInvalide(f"Curseur invalide : {valeur}")
+    if curseur.tzinfo is not None:
+        # Les horodatages de la base sont en UTC, sans fuseau
+        curseur = curseur.astimezone(timezone.utc).replace(tzinfo=None)
+    return curseur
+
+
+def _horloge_sans_ecriture_en_cours():
+    """
+    Horloge de la base (celle des `modifie_le`), ramenée avant toute transaction encore en
+    cours : ce qu'elles écrivent, validé plus tard, a un `modifie_le` postérieur au curseur.
+    """
+    moteur = db.engine
+    if moteur.dialect.name == 'postgresql':
+        # CURRENT_TIMESTAMP, donc modifie_le, est l'heure de début de la transaction qui écrit
+        return db.session.execute(text(
+            "SELECT min(xact_start)::timestamp FROM pg_stat_activity WHERE datname = current_database()"
+        )).scalar()
+    if moteur.dialect.name == 'sqlite' and moteur.url.database not in (None, '', ':memory:'):
+        # Un seul écrivain, CURRENT_TIMESTAMP à l'heure de l'instruction : attendre que l'écriture
+        # en cours soit validée (BEGIN IMMEDIATE, dans la limite de busy_timeout) avant de lire
+        with moteur.connect() as connexion:
+            connexion.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                return connexion.execute(select(db.func.current_timestamp())).scalar()
+            finally:
+                connexion.rollback()
+    return db.session.execute(select(db.func.current_timestamp())).scalar()
+
+
+def curseur_actuel(repli=None):
+    """
+    Curseur à renvoyer au client : l'horloge de la base avant toute transaction en cours,
+    reculée de SYNC_MARGE_SECONDES. Les changements de la marge sont renvoyés deux fois ; le
+    client les applique par identifiant. Si une écriture SQLite occupe la base trop longtemps,
+    le curseur n'avance pas (`repli`, le curseur reçu) : rien n'est perdu, tout est relu.
+    """
+    try:
+        maintenant = _horloge_sans_ecriture_en_cours()
+    except OperationalError:
+        logger.warning("Base occupée par une écriture : le curseur de synchronisation n'avance pas")
+        return repli or CURSEUR_INITIAL
+    if isinstance(maintenant, str):
+        maintenant = datetime.fromisoformat(maintenant)
+    return (maintenant - timedelta(seconds=current_app.config['SYNC_MARGE_SECONDES'])).replace(microsecond=0)
+
+
+def _serialiser(valeur):
+    if hasattr(valeur, 'isoformat'):
+        return valeur.isoformat()
+    if isinstance(valeur, Decimal):
+        return float(valeur)
+    return valeur
+
+
+def lire_colonnes(modele, champs, *criteres):
+    """Lignes de `modele` vérifiant `criteres`, en dictionnaires des `champs` sérialisés, par identifiant."""
+    lignes = db.session.execute(
+        select(*(getattr(modele, champ) for champ in champs)).where(*criteres).order_by(modele.id)
+    ).all()
+    return [{champ: _serialiser(valeur) for champ, valeur in zip(champs, ligne)} for ligne in lignes]
+
+
+def _lire(collection, *criteres):
+    modele, champs = CHAMPS[collection]
+    return lire_colonnes(modele, champs, *criteres)
+
+
+def _suppressions(depuis, *criteres):
+    suppressions = {collection: [] for collection in CHAMPS}
+    if depuis is None:
+        return suppressions
+    lignes = db.session.execute(
+        select(Suppression.entite, Suppression.entite_id)
+        .where(Suppression.supprime_le >= depuis, *criteres)
+        .order_by(Suppression.id)
+    ).all()
+    for entite, entite_id in lignes:
+        suppressions[COLLECTIONS[entite]].append(entite_id)
+    return suppressions
+
+
+def _recent(modele, depuis):
+    return modele.modifie_le >= depuis if depuis is not None else true()
+
+
+def _reponse(curseur, depuis, **collections):
+    return {"curseur": curseur.isoformat(), "complet": depuis is None, **collections}
+
+
+def _depuis_effectif(depuis):
+    """
+    Un curseur plus ancien que la rétention des suppressions donne un instantané complet
+    (curseurs, modifie_le et supprime_le sont en UTC).
+    """
+    if depuis is None:
+        return None
+    limite = datetime.utcnow() - timedelta(days=current_app.config['SYNC_RETENTION_JOURS'])
+    return None if depuis < limite else depuis
+
+
+def changements_locataire(locataire_id, depuis=None):
+    """
+    Contrats, paiements, chambres et médias du locataire modifiés depuis `depuis`, et les
+    identifiants supprimés. Sans curseur (ou trop ancien) : tout, avec `complet` à vrai.
+    """
+    curseur = curseur_actuel(repli=depuis)
+    depuis = _depuis_effectif(depuis)
+
+    contrats = _lire('contrats', Contrat.locataire_id == locataire_id, _recent(Contrat, depuis))
+    paiements = _lire('paiements', Paiement.contrat_id.in_(
+        select(Contrat.id).where(Contrat.locataire_id == locataire_id)), _recent(Paiement, depuis))
+
+    # Chambres des contrats du locataire : modifiées, ou nouvellement liées par un contrat renvoyé
+    chambres_locataire = select(Contrat.chambre_id).where(Contrat.locataire_id == locataire_id)
+    chambres_nouvelles = {c['chambre_id'] for c in contrats}
+    chambres = _lire('chambres', Chambre.id.in_(chambres_locataire),
+                     or_(_recent(Chambre, depuis), Chambre.id.in_(chambres_nouvelles)))
+    medias = _lire('medias', Media.chambre_id.in_(chambres_locataire),
+                   or_(_recent(Media, depuis), Media.chambre_id.in_(chambres_nouvelles)))
+
+    # Les chambres et médias n'ont pas de locataire : ceux des chambres qu'il loue le concernent
+    suppressions = _suppressions(depuis, or_(
+        Suppression.locataire_id == locataire_id,
+        Suppression.entite.in_(('chambre', 'media')) & Suppression.chambre_id.in_(chambres_locataire)))
+    return _reponse(curseur, depuis, contrats=contrats, paiements=paiements, chambres=chambres, medias=medias,
+                    suppressions=suppressions)
+
+
+def changements_proprietaire(proprietaire_id, depuis=None):
+    """Même chose pour les chambres des maisons du propriétaire et tout ce qui s'y rattache."""
+    curseur = curseur_actuel(repli=depuis)
+    depuis = _depuis_effectif(depuis)
+
+    chambres_proprietaire = select(Chambre.id).join(Maison).where(Maison.proprietaire_id == proprietaire_id)
+    contrats_proprietaire = select(Contrat.id).where(Contrat.chambre_id.in_(chambres_proprietaire))
+
+    return _reponse(
+        curseur, depuis,
+        contrats=_lire('contrats', Contrat.chambre_id.in_(chambres_proprietaire), _recent(Contrat, depuis)),
+        paiements=_lire('paiements', Paiement.contrat_id.in_(contrats_proprietaire), _recent(Paiement, depuis)),
+        chambres=_lire('chambres', Chambre.id.in_(chambres_proprietaire), _recent(Chambre, depuis)),
+        medias=_lire('medias', Media.chambre_id.in_(chambres_proprietaire), _recent(Media, depuis)),
+        suppressions=_suppressions(depuis, Suppression.proprietaire_id == proprietaire_id),
+    )
+
+
+def _destinataires(obj):
+    """(proprietaire_id, locataire_id, chambre_id) d'un objet supprimé."""
+    if isinstance(obj, Paiement):
+        contrat = obj.contrat
+        chambre = contrat.chambre if contrat else None
+        locataire_id = contrat.locataire_id if contrat else None
+    elif isinstance(obj, Contrat):
+        chambre = obj.chambre
+        locataire_id = obj.locataire_id
+    elif isinstance(obj, Chambre):
+        chambre = obj
+        locataire_id = None
+    else:
+        chambre = obj.chambre
+        locataire_id = None
+    maison = chambre.maison if chambre else None
+    return (maison.proprietaire_id if maison else None, locataire_id,
+            chambre.id if chambre else getattr(obj, 'chambre_id', None))
+
+
+class Synchronisation:
+    """Enregistre une pierre tombale pour chaque chambre, contrat, paiement ou média supprimé."""
+
+    def __init__(self, app=None):
+        self._ecoute = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['synchronisation'] = self
+        if not self._ecoute:
+            event.listen(db.session, 'before_flush', self._noter_suppressions)
+            self._ecoute = True
+
+    def _noter_suppressions(self, session, flush_context, instances):
+        # Les relations sont lues ici : après le flush, les lignes n'existent plus
+        for obj in list(session.deleted):
+            entite = ENTITES.get(type(obj))
+            if entite is None:
+                continue
+            proprietaire_id, locataire_id, chambre_id = _destinataires(obj)
+            session.add(Suppression(entite=entite, entite_id=obj.id, proprietaire_id=proprietaire_id,
+                                    locataire_id=locataire_id, chambre_id=chambre_id))
+
+
+synchronisation = Synchronisation()
+
+
+@planificateur.tache('purge_suppressions', heure=4)
+def tache_purge_suppressions():
+    """Supprime les pierres tombales plus anciennes que SYNC_RETENTION_JOURS jours."""
+    limite = datetime.utcnow() - timedelta(days=current_app.config['SYNC_RETENTION_JOURS'])
+    resultat = db.session.execute(
+        delete(Suppression).where(Suppression.supprime_le < limite),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return {"suppressions_purgees": resultat.rowcount}
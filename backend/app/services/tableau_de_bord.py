@@ -0,0 +1,87 @@
+from sqlalchemy import select
+
+from app.models import Chambre, Contrat, Maison, Media, Paiement, Utilisateur
+from app.services.synchronisation import lire_colonnes
+
+# Champs des vues remplacées, une seule fois par entité (les libellés dénormalisés comme
+# `chambre_titre` ou `locataire_nom_utilisateur` se retrouvent par identifiant)
+CHAMPS_MAISON = ('id', 'adresse', 'ville', 'description', 'nombre_chambres', 'cree_le')
+CHAMPS_CHAMBRE = ('id', 'maison_id', 'titre', 'description', 'taille', 'type', 'meublee', 'salle_de_bain', 'prix',
+                  'disponible', 'cree_le')
+CHAMPS_MEDIA = ('id', 'chambre_id', 'url', 'type', 'description')
+CHAMPS_CONTRAT = ('id', 'locataire_id', 'chambre_id', 'date_debut', 'date_fin', 'duree_mois', 'montant_caution',
+                  'mois_caution', 'mode_paiement', 'periodicite', 'statut', 'description', 'cree_le')
+CHAMPS_LOCATAIRE = ('id', 'nom_utilisateur', 'email', 'telephone', 'cni', 'role')
+CHAMPS_PAIEMENT = ('id', 'contrat_id', 'montant', 'date_echeance', 'date_paiement', 'statut')
+
+# Statuts listés par GET /proprietaire/contrats (les demandes en attente ont leur propre vue)
+STATUTS_CONTRATS_LISTES = ('actif', 'rejete', 'resilie', 'termine')
+
+
+def _resume(paiements):
+    """Même calcul que le `dashboard_summary` de GET /proprietaire/paiements."""
+    payes = [p for p in paiements if p['statut'] == 'payé']
+    impayes = [p for p in paiements if p['statut'] == 'impayé']
+    return {
+        "total_paye": sum(p['montant'] for p in payes),
+        "total_impaye": sum(p['montant'] for p in impayes),
+        "nombre_paiements_payes": len(payes),
+        "nombre_paiements_impayes": len(impayes),
+        "nombre_paiements_partiels": sum(1 for p in paiements if p['statut'] == 'partiel'),
+    }
+
+
+def tableau_de_bord_proprietaire(proprietaire_id):
+    """
+    Tout le tableau de bord du propriétaire en une requête HTTP : maisons, chambres, médias,
+    contrats, locataires et paiements sont lus une fois chacun (colonnes seulement, périmètre
+    du propriétaire en sous-requêtes), et chaque entité n'apparaît qu'une fois dans `entites`,
+    indexée par identifiant. `vues` donne les identifiants de chaque liste dans l'ordre des
+    anciens endpoints : maisons, chambres, clients, contrats, paiements, demandes en attente.
+    """
+    maisons_proprietaire = select(Maison.id).where(Maison.proprietaire_id == proprietaire_id)
+    chambres_proprietaire = select(Chambre.id).where(Chambre.maison_id.in_(maisons_proprietaire))
+    contrats_proprietaire = select(Contrat.id).where(Contrat.chambre_id.in_(chambres_proprietaire))
+
+    maisons = lire_colonnes(Maison, CHAMPS_MAISON, Maison.proprietaire_id == proprietaire_id)
+    chambres = lire_colonnes(Chambre, CHAMPS_CHAMBRE, Chambre.maison_id.in_(maisons_proprietaire))
+    medias = lire_colonnes(Media, CHAMPS_MEDIA, Media.chambre_id.in_(chambres_proprietaire))
+    contrats = lire_colonnes(Contrat, CHAMPS_CONTRAT, Contrat.chambre_id.in_(chambres_proprietaire))
+    locataires = lire_colonnes(Utilisateur, CHAMPS_LOCATAIRE, Utilisateur.id.in_(
+        select(Contrat.locataire_id).where(Contrat.id.in_(contrats_proprietaire))))
+    paiements = lire_colonnes(Paiement, CHAMPS_PAIEMENT, Paiement.contrat_id.in_(contrats_proprietaire))
+
+    # Références des chambres vers leurs médias et contrats actifs, au lieu de copies imbriquées
+    par_chambre = {c['id']: c for c in chambres}
+    for chambre in chambres:
+        chambre['medias'] = []
+        chambre['contrats_actifs'] = []
+    for media in medias:
+        par_chambre[media['chambre_id']]['medias'].append(media['id'])
+    for contrat in contrats:
+        if contrat['statut'] == 'actif':
+            par_chambre[contrat['chambre_id']]['contrats_actifs'].append(contrat['id'])
+
+    listes = sorted((c for c in contrats if c['statut'] in STATUTS_CONTRATS_LISTES),
+                    key=lambda c: c['date_debut'], reverse=True)
+    clients = [l['id'] for l in locataires if l['role'] == 'locataire']
+
+    return {
+        "vues": {
+            "maisons": [m['id'] for m in maisons],
+            "chambres": [c['id'] for c in chambres],
+            "clients": clients,
+            "contrats": [c['id'] for c in listes],
+            "paiements": [p['id'] for p in sorted(paiements, key=lambda p: p['date_echeance'], reverse=True)],
+            "demandes_en_attente": [c['id'] for c in contrats if c['statut'] == 'en_attente_validation'],
+        },
+        "resume": _resume(paiements),
+        "entites": {
+            "maisons": {m['id']: m for m in maisons},
+            "chambres": par_chambre,
+            "medias": {m['id']: m for m in medias},
+            "contrats": {c['id']: c for c in contrats},
+            "locataires": {l['id']: l for l in locataires},
+            "paiements": {p['id']: p for p in paiements},
+        },
+    }
@@ -0,0 +1,104 @@
+import logging
+import threading
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Premiers mots des instructions qui prennent le verrou d'écriture de SQLite
+INSTRUCTIONS_ECRITURE = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER')
+
+CLE_ECRIVAIN = 'sqlite_ecrivain'
+
+
+class ModeSQLite:
+    """
+    Réglages de production pour les bases SQLite, appliqués à chaque nouvelle connexion :
+    journal WAL (les lectures ne bloquent plus l'écrivain et inversement), synchronous=NORMAL,
+    busy_timeout, I/O mappées en mémoire et taille du cache.
+
+    SQLite n'accepte qu'un écrivain à la fois : au lieu de laisser les transactions
+    concurrentes échouer en `database is locked`, les écritures d'un même processus passent
+    l'une après l'autre par un verrou, pris à la première instruction d'écriture d'une
+    transaction et rendu au commit ou au rollback. Entre processus, busy_timeout prend le relais.
+    """
+
+    def __init__(self, db=None, app=None):
+        self.db = db
+        self._verrous = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """À appeler dans un contexte d'application, après `db.init_app(app)`."""
+        app.extensions['mode_sqlite'] = self
+        if not app.config.get('SQLITE_PRODUCTION'):
+            return
+        self.reglages = {
+            'busy_timeout': app.config.get('SQLITE_BUSY_TIMEOUT', 5000),
+            'cache_size': app.config.get('SQLITE_CACHE_SIZE', -64000),
+            'mmap_size': app.config.get('SQLITE_MMAP_SIZE', 268435456),
+        }
+        serialiser = app.config.get('SQLITE_SERIALISER_ECRITURES', True)
+        for cle, moteur in self.db.engines.items():
+            if moteur.dialect.name != 'sqlite':
+                continue
+            self._configurer(moteur, en_memoire=moteur.url.database in (None, '', ':memory:'))
+            if serialiser:
+                self._serialiser_ecritures(moteur)
+            logger.info("Mode production SQLite activé pour %s", cle or 'primaire')
+
+    def _configurer(self, moteur, en_memoire):
+        reglages = self.reglages
+
+        @event.listens_for(moteur, 'connect')
+        def appliquer_pragmas(connexion_dbapi, _enregistrement):
+            curseur = connexion_dbapi.cursor()
+            try:
+                # Le journal WAL n'a pas de sens pour une base en mémoire
+                if not en_memoire:
+                    curseur.execute('PRAGMA journal_mode=WAL')
+                curseur.execute('PRAGMA synchronous=NORMAL')
+                curseur.execute(f"PRAGMA busy_timeout={int(reglages['busy_timeout'])}")
+                curseur.execute(f"PRAGMA cache_size={int(reglages['cache_size'])}")
+                curseur.execute(f"PRAGMA mmap_size={int(reglages['mmap_size'])}")
+            finally:
+                curseur.close()
+
+    def _serialiser_ecritures(self, moteur):
+        verrou = self._verrous.setdefault(moteur, threading.Lock())
+        # Au-delà, on laisse SQLite arbitrer avec son propre busy_timeout plutôt que d'attendre indéfiniment
+        attente_max = self.reglages['busy_timeout'] / 1000
+
+        @event.listens_for(moteur, 'before_cursor_execute')
+        def prendre_verrou(connexion, _curseur, instruction, _parametres, _contexte, _executemany):
+            if connexion.info.get(CLE_ECRIVAIN) or not _est_ecriture(instruction):
+                return
+            if verrou.acquire(timeout=attente_max):
+                connexion.info[CLE_ECRIVAIN] = verrou
+            else:
+                logger.warning("Verrou d'écriture SQLite non obtenu après %.1fs", attente_max)
+
+        def rendre_verrou(info):
+            verrou_pris = info.pop(CLE_ECRIVAIN, None)
+            if verrou_pris is not None:
+                verrou_pris.release()
+
+        # Rendu juste avant le COMMIT SQLite : l'écrivain suivant attend au plus la fin
+        # de ce COMMIT grâce à busy_timeout
+        @event.listens_for(moteur, 'commit')
+        def au_commit(connexion):
+            rendre_verrou(connexion.info)
+
+        @event.listens_for(moteur, 'rollback')
+        def au_rollback(connexion):
+            rendre_verrou(connexion.info)
+
+        # Connexion rendue au pool sans commit ni rollback explicite
+        @event.listens_for(moteur, 'checkin')
+        def au_retour(_connexion_dbapi, enregistrement):
+            rendre_verrou(enregistrement.info)
+
+
+def _est_ecriture(instruction):
+    return instruction.lstrip()[:7].upper().startswith(INSTRUCTIONS_ECRITURE)
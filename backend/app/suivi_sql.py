@@ -0,0 +1,103 @@
+import logging
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Longueur maximale d'une instruction SQL reprise dans le journal des requêtes lentes
+LONGUEUR_MAX_INSTRUCTION = 2000
+
+
+class BudgetSQLDepasse(AssertionError):
+    """Levée quand un endpoint exécute plus d'instructions SQL que son budget déclaré."""
+
+
+class SuiviSQL:
+    """
+    Compte et chronomètre les instructions SQL exécutées pendant chaque requête HTTP
+    (`g.sql_requetes`, `g.sql_duree`).
+
+    - en mode debug (ou avec SQL_QUERY_HEADERS), les en-têtes X-DB-Queries et X-DB-Time
+      sont ajoutés à la réponse ;
+    - les instructions plus longues que SQL_SLOW_QUERY_THRESHOLD secondes sont journalisées
+      avec la route qui les a déclenchées ;
+    - `budget_sql(n)` déclare le nombre maximum d'instructions d'un endpoint.
+    """
+
+    def __init__(self, db=None, app=None):
+        self.db = db
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """À appeler dans un contexte d'application, après `db.init_app(app)`."""
+        app.extensions['suivi_sql'] = self
+        self.seuil_lent = app.config.get('SQL_SLOW_QUERY_THRESHOLD', 0.5)
+        self.entetes = app.debug or app.config.get('SQL_QUERY_HEADERS', False)
+        app.before_request(self._debut_requete)
+        app.after_request(self._fin_requete)
+        for moteur in self.db.engines.values():
+            self._suivre(moteur)
+
+    @staticmethod
+    def _debut_requete():
+        g.sql_requetes = 0
+        g.sql_duree = 0.0
+
+    def _fin_requete(self, response):
+        if self.entetes and 'sql_requetes' in g:
+            response.headers['X-DB-Queries'] = str(g.sql_requetes)
+            response.headers['X-DB-Time'] = f'{g.sql_duree * 1000:.1f}ms'
+        return response
+
+    def _suivre(self, moteur):
+        @event.listens_for(moteur, 'before_cursor_execute')
+        def avant(_connexion, _curseur, _instruction, _parametres, contexte, _executemany):
+            if contexte is not None:
+                contexte.suivi_debut = time.perf_counter()
+
+        @event.listens_for(moteur, 'after_cursor_execute')
+        def apres(_connexion, _curseur, instruction, _parametres, contexte, _executemany):
+            debut = getattr(contexte, 'suivi_debut', None)
+            if debut is None:
+                return
+            duree = time.perf_counter() - debut
+            en_requete = has_request_context()
+            if en_requete and 'sql_requetes' in g:
+                g.sql_requetes += 1
+                g.sql_duree += duree
+                # Chronologie détaillée, remplie seulement quand la requête est profilée
+                if 'sql_chronologie' in g:
+                    g.sql_chronologie.append((debut, duree, instruction[:LONGUEUR_MAX_INSTRUCTION]))
+            if duree >= self.seuil_lent:
+                route = f'{request.method} {request.path}' if en_requete else 'hors requête'
+                logger.warning(
+                    "Requête SQL lente (%.1f ms) sur %s: %s",
+                    duree * 1000, route, instruction[:LONGUEUR_MAX_INSTRUCTION]
+                )
+
+
+def budget_sql(max_requetes):
+    """
+    Déclare le nombre maximum d'instructions SQL exécutées par la vue. Un dépassement est
+    journalisé ; il lève BudgetSQLDepasse en test (ou avec SQL_QUERY_BUDGET_STRICT), ce qui
+    fait échouer le test qui appelle l'endpoint.
+    """
+    def decorateur(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            avant = g.get('sql_requetes', 0)
+            resultat = fn(*args, **kwargs)
+            nombre = g.get('sql_requetes', 0) - avant
+            if nombre > max_requetes:
+                message = (f"{request.method} {request.path} a exécuté {nombre} requêtes SQL "
+                           f"(budget: {max_requetes}) dans {fn.__qualname__}")
+                if current_app.testing or current_app.config.get('SQL_QUERY_BUDGET_STRICT'):
+                    raise BudgetSQLDepasse(message)
+                logger.warning(message)
+            return resultat
+        return wrapper
+    return decorateur
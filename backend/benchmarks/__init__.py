@@ -0,0 +1,5 @@
+"""
+Micro-benchmarks : sérialiseurs, génération des échéanciers, analyse du callback PayDunya et
+SQL de la recherche de chambres, sur une base SQLite remplie par le générateur de jeux de
+données. Lancement : `python -m benchmarks --help` depuis backend/.
+"""
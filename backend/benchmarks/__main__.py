@@ -0,0 +1,100 @@
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+
+from benchmarks.outils import BENCHMARKS, comparer, mesurer, resumer
+
+# Démarrage en premier : mesuré avant que le processus du runner ne grossisse
+MODULES = ('bench_demarrage', 'bench_serialisation', 'bench_echeanciers', 'bench_callback', 'bench_recherche')
+DOSSIER_BASELINES = os.path.join(os.path.dirname(__file__), 'baselines')
+
+
+def lire_arguments(arguments=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Micro-benchmarks de l'API.")
+    parser.add_argument('filtres', nargs='*', help="Motifs des benchmarks à lancer (ex. 'recherche.*').")
+    parser.add_argument('--repetitions', type=int, default=15, help="Répétitions mesurées par benchmark.")
+    parser.add_argument('--taille', default='petit', help="Volumes du jeu de données (petit, moyen, grand).")
+    parser.add_argument('--echelle', type=float, default=0.1, help="Facteur appliqué aux volumes de --taille.")
+    parser.add_argument('--graine', type=int, default=42, help="Graine du jeu de données.")
+    parser.add_argument('--lister', action='store_true', help="Affiche les benchmarks disponibles.")
+    parser.add_argument('--sortie', help="Fichier JSON où écrire les résultats.")
+    parser.add_argument('--baseline', help="Nom ou chemin de la baseline à comparer (ex. reference).")
+    parser.add_argument('--enregistrer-baseline', metavar='NOM', help="Enregistre les résultats comme baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Ralentissement relatif toléré de la médiane (0.2 : 20 %%).")
+    return parser.parse_args(arguments)
+
+
+def chemin_baseline(nom):
+    if os.sep in nom or nom.endswith('.json'):
+        return nom
+    return os.path.join(DOSSIER_BASELINES, f'{nom}.json')
+
+
+def main(arguments=None):
+    args = lire_arguments(arguments)
+    for module in MODULES:
+        __import__(f'benchmarks.{module}')
+    noms = [nom for nom in BENCHMARKS
+            if not args.filtres or any(fnmatch.fnmatch(nom, motif) for motif in args.filtres)]
+    if args.lister:
+        print('\n'.join(noms))
+        return 0
+
+    # Importée après la sélection : --lister n'a pas besoin de l'application
+    from benchmarks.environnement import Environnement
+    env = Environnement(args.taille, args.echelle, args.graine).ouvrir()
+    print(f"Jeu de données: {env.jeu_de_donnees}")
+    resultats = {'benchmarks': {}}
+    try:
+        print(f"\n{'benchmark':<52}{'médiane ms':>12}{'min ms':>12}{'écart-type':>12}")
+        for nom in noms:
+            preparation, nombre = BENCHMARKS[nom]
+            env.reinitialiser_session()
+            cible = preparation(env)
+            resume = resumer(mesurer(cible, nombre, args.repetitions))
+            resultats['benchmarks'][nom] = resume
+            print(f"{nom:<52}{resume['mediane_ms']:>12}{resume['min_ms']:>12}{resume['ecart_type_ms']:>12}")
+    finally:
+        env.fermer()
+
+    resultats['parametres'] = {'taille': args.taille, 'echelle': args.echelle, 'graine': args.graine,
+                               'repetitions': args.repetitions}
+    resultats['environnement'] = {
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'machine': platform.machine(), 'processeurs': os.cpu_count(),
+    }
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump(resultats, fichier, indent=2, ensure_ascii=False)
+    if args.enregistrer_baseline:
+        chemin = chemin_baseline(args.enregistrer_baseline)
+        with open(chemin, 'w', encoding='utf-8') as fichier:
+            json.dump(resultats, fichier, indent=2, ensure_ascii=False)
+            fichier.write('\n')
+        print(f"\nBaseline enregistrée dans {chemin}")
+    if args.baseline:
+        with open(chemin_baseline(args.baseline), encoding='utf-8') as fichier:
+            reference = json.load(fichier)
+        if reference.get('parametres', {}).get('echelle') != args.echelle \
+                or reference.get('parametres', {}).get('taille') != args.taille:
+            print("\nAttention : jeu de données différent de celui de la baseline, comparaison indicative.")
+        regressions, ameliorations = comparer(resultats, reference, tolerance=args.tolerance)
+        for titre, messages in (("Améliorations", ameliorations), ("Régressions", regressions)):
+            if messages:
+                print(f"\n{titre} par rapport à la baseline :")
+                for message in messages:
+                    print(f"  - {message}")
+        if regressions:
+            return 1
+        print("\nAucune régression par rapport à la baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import hashlib
+import uuid
+
+from werkzeug.datastructures import MultiDict
+
+from app.routes.locataire_routes import analyser_formulaire_imbrique
+from benchmarks.outils import benchmark
+
+
+def _formulaire():
+    # Forme d'un callback IPN PayDunya réel (facture, client, données personnalisées)
+    return MultiDict({
+        'data[response_code]': '00',
+        'data[response_text]': 'Transaction Found',
+        'data[hash]': hashlib.sha512(b'cle-maitre-benchmarks').hexdigest(),
+        'data[invoice][token]': f'test_{uuid.uuid4().hex}',
+        'data[invoice][total_amount]': '75000',
+        'data[invoice][description]': 'Paiement de loyer pour le contrat 42 - Échéance 2025-01-31',
+        'data[invoice][transaction_id]': uuid.uuid4().hex[:16],
+        'data[invoice][items][item_0][name]': 'Loyer pour Chambre lumineuse',
+        'data[invoice][items][item_0][quantity]': '1',
+        'data[invoice][items][item_0][unit_price]': '75000',
+        'data[invoice][items][item_0][total_price]': '75000',
+        'data[custom_data][paiement_id]': '1234',
+        'data[custom_data][locataire_id]': '56',
+        'data[custom_data][contrat_id]': '42',
+        'data[actions][cancel_url]': 'http://127.0.0.1/api/locataire/mes-paiements/cancel',
+        'data[actions][callback_url]': 'http://127.0.0.1/api/locataire/paydunya/callback',
+        'data[actions][return_url]': 'http://127.0.0.1/api/locataire/mes-paiements/success',
+        'data[mode]': 'test',
+        'data[status]': 'completed',
+        'data[customer][name]': 'Awa Ndiaye',
+        'data[customer][phone]': '771234567',
+        'data[customer][email]': 'awa@exemple.sn',
+    })
+
+
+@benchmark('callback.analyse_formulaire', nombre=1000)
+def analyse_formulaire(_env):
+    formulaire = _formulaire()
+    return lambda: analyser_formulaire_imbrique(formulaire)
+
+
+@benchmark('callback.verification_signature', nombre=1000)
+def verification_signature(_env):
+    recu = _formulaire()['data[hash]']
+    return lambda: hashlib.sha512(b'cle-maitre-benchmarks').hexdigest() == recu
+
+
+@benchmark('callback.requete_signature_invalide', nombre=50)
+def requete_signature_invalide(env):
+    # Requête complète jusqu'au refus de la signature : analyse du formulaire et routage Flask
+    client = env.app.test_client()
+    formulaire = dict(_formulaire(), **{'data[hash]': 'invalide'})
+    return lambda: client.post('/api/locataire/paydunya/callback', data=formulaire)
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.outils import benchmark
+
+DOSSIER_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = 'from app import create_app; create_app()'
+
+
+def _demarrer(env, variables=None):
+    # Nouveau processus à chaque appel : aucun module déjà importé, comme un worker qui redémarre
+    environnement = dict(os.environ, DATABASE_URL=env.app.config['SQLALCHEMY_DATABASE_URI'], LOG_LEVEL='ERROR',
+                         **(variables or {}))
+    environnement.pop('FLASK_RUN_FROM_CLI', None)
+    return lambda: subprocess.run([sys.executable, '-c', SCRIPT], cwd=DOSSIER_BACKEND, env=environnement,
+                                  check=True, stdout=subprocess.DEVNULL)
+
+
+@benchmark('demarrage.import_create_app')
+def demarrage(env):
+    return _demarrer(env)
+
+
+@benchmark('demarrage.import_create_app_auth_seul')
+def demarrage_auth(env):
+    return _demarrer(env, {'API_NAMESPACES': 'auth'})
@@ -0,0 +1,32 @@
+from datetime import date
+from decimal import Decimal
+
+from app import db
+from app.models import Chambre, Contrat
+from app.routes.locataire_routes import generer_paiements_contrat
+from app.services.reservation import echeancier_approbation
+from benchmarks.outils import benchmark
+
+
+def _contrat(duree_mois):
+    # Objets transitoires : aucune requête SQL, seule la construction des paiements est mesurée
+    chambre = Chambre(id=1, prix=Decimal('75000.00'))
+    return Contrat(id=1, chambre=chambre, date_debut=date(2025, 1, 31), duree_mois=duree_mois,
+                   date_fin=date(2025 + duree_mois // 12, 1, 31), montant_caution=Decimal('75000.00'))
+
+
+@benchmark('echeancier.generer_paiements_contrat_24_mois', nombre=20)
+def generer_paiements(_env):
+    contrat = _contrat(24)
+
+    def cible():
+        generer_paiements_contrat(contrat)
+        db.session.expunge_all()
+    return cible
+
+
+@benchmark('echeancier.approbation_24_mois', nombre=20)
+def approbation(_env):
+    contrat = _contrat(24)
+    loyer = contrat.chambre.prix
+    return lambda: echeancier_approbation(contrat, loyer)
@@ -0,0 +1,55 @@
+from sqlalchemy import event
+
+from app import db
+from app.routes.locataire_routes import search_chambres
+from benchmarks.outils import benchmark
+
+# Critères représentatifs : ville seule, ville et budget, type de chambre, période
+CRITERES = {
+    'ville': {'ville': 'Dakar'},
+    'ville_prix': {'ville': 'Thiès', 'min_prix': '20000', 'max_prix': '60000'},
+    'type_meublee': {'type': 'appartement', 'meublee': 'true'},
+    'periode': {'ville': 'Dakar', 'date_debut': '2030-01-01', 'date_fin': '2030-06-30'},
+}
+
+
+def _capturer_sql(env, parametres):
+    """Instructions SQL émises par la vue de recherche pour ces paramètres."""
+    instructions = []
+
+    def capturer(_connexion, _curseur, instruction, parametres_sql, _contexte, _executemany):
+        instructions.append((instruction, parametres_sql))
+
+    event.listen(db.engine, 'before_cursor_execute', capturer)
+    try:
+        with env.app.test_request_context('/api/locataire/chambres/recherche', query_string=parametres):
+            search_chambres()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capturer)
+    return instructions
+
+
+def _enregistrer(nom, parametres):
+    @benchmark(f'recherche.sql_{nom}', nombre=5)
+    def sql(env):
+        # Seul le SQL est rejoué, tel que la vue l'a construit, sans l'ORM ni la sérialisation
+        instructions = _capturer_sql(env, parametres)
+
+        def cible():
+            connexion = db.session.connection()
+            for instruction, parametres_sql in instructions:
+                connexion.exec_driver_sql(instruction, parametres_sql).fetchall()
+        return cible
+
+    @benchmark(f'recherche.vue_{nom}', nombre=5)
+    def vue(env):
+        def cible():
+            with env.app.test_request_context('/api/locataire/chambres/recherche', query_string=parametres):
+                search_chambres()
+            # Comme à la fin d'une requête HTTP
+            db.session.remove()
+        return cible
+
+
+for _nom, _parametres in CRITERES.items():
+    _enregistrer(_nom, _parametres)
@@ -0,0 +1,34 @@
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+
+from app import db
+from app.models import Chambre, Contrat, Maison
+from app.serialization import serialize_chambre, serialize_contrat
+from benchmarks.outils import benchmark
+
+NOMBRE_OBJETS = 2000
+
+
+def _chambres_chargees():
+    # Tout ce que lit le sérialiseur est chargé d'avance : seul le coût Python est mesuré
+    return db.session.scalars(
+        select(Chambre)
+        .options(joinedload(Chambre.maison).joinedload(Maison.proprietaire), selectinload(Chambre.medias))
+        .order_by(Chambre.id).limit(NOMBRE_OBJETS)).unique().all()
+
+
+@benchmark('serialisation.chambres_2000')
+def serialiser_chambres(_env):
+    chambres = _chambres_chargees()
+    return lambda: [serialize_chambre(chambre) for chambre in chambres]
+
+
+@benchmark('serialisation.contrats_2000')
+def serialiser_contrats(_env):
+    contrats = db.session.scalars(
+        select(Contrat)
+        .options(joinedload(Contrat.locataire),
+                 joinedload(Contrat.chambre).joinedload(Chambre.maison).joinedload(Maison.proprietaire),
+                 joinedload(Contrat.chambre).selectinload(Chambre.medias))
+        .order_by(Contrat.id).limit(NOMBRE_OBJETS)).unique().all()
+    return lambda: [serialize_contrat(contrat) for contrat in contrats]
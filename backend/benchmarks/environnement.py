@@ -0,0 +1,54 @@
+import os
+import tempfile
+
+from app import create_app, db
+from app.config import Config
+from app.services.jeu_de_donnees import VOLUMES, generer_jeu_de_donnees
+
+
+class Environnement:
+    """
+    Application de benchmark sur une base SQLite temporaire remplie par le générateur de jeux
+    de données. Le contexte d'application reste actif entre `ouvrir` et `fermer`.
+    """
+
+    def __init__(self, taille='petit', echelle=0.1, graine=42):
+        self.volumes = {table: max(1, int(n * echelle)) for table, n in VOLUMES[taille].items()}
+        self.graine = graine
+        self.app = None
+        self._contexte = None
+        self._fichier = None
+
+    def ouvrir(self):
+        descripteur, self._fichier = tempfile.mkstemp(prefix='benchmarks_', suffix='.db')
+        os.close(descripteur)
+        uri = f'sqlite:///{self._fichier}'
+
+        class ConfigBenchmarks(Config):
+            SQLALCHEMY_DATABASE_URI = uri
+            SQLITE_PRODUCTION = True
+            SCHEDULER_ENABLED = False
+            METRICS_ENABLED = False
+            # Le benchmark du callback refusé émettrait un avertissement par appel
+            LOG_LEVEL = 'ERROR'
+            PAYDUNYA_MASTER_KEY = 'cle-maitre-benchmarks'
+
+        self.app = create_app(ConfigBenchmarks)
+        self._contexte = self.app.app_context()
+        self._contexte.push()
+        db.create_all(bind_key=None)
+        self.jeu_de_donnees = generer_jeu_de_donnees(self.volumes, graine=self.graine)
+        return self
+
+    def reinitialiser_session(self):
+        """Vide la session entre deux benchmarks pour qu'ils ne partagent pas d'objets chargés."""
+        db.session.rollback()
+        db.session.expunge_all()
+
+    def fermer(self):
+        db.session.remove()
+        db.engine.dispose()
+        self._contexte.pop()
+        for suffixe in ('', '-wal', '-shm'):
+            if os.path.exists(self._fichier + suffixe):
+                os.remove(self._fichier + suffixe)
@@ -0,0 +1,72 @@
+import gc
+import statistics
+import time
+
+# nom -> (fonction de préparation, nombre d'appels par mesure)
+BENCHMARKS = {}
+
+
+def benchmark(nom, nombre=1):
+    """
+    Enregistre un benchmark. La fonction décorée reçoit l'environnement (application dans
+    son contexte, base remplie), fait sa préparation et renvoie la fonction sans argument à
+    chronométrer ; seule cette dernière est mesurée, `nombre` fois par répétition.
+    """
+    def decorateur(preparation):
+        BENCHMARKS[nom] = (preparation, nombre)
+        return preparation
+    return decorateur
+
+
+def mesurer(cible, nombre, repetitions, echauffement=1):
+    """
+    Durées par appel (en secondes) de chaque répétition, après `echauffement` répétitions
+    ignorées. Comme timeit, le ramasse-miettes est suspendu pendant la mesure.
+    """
+    for _ in range(echauffement):
+        for _ in range(nombre):
+            cible()
+    durees = []
+    gc.collect()
+    gc_actif = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repetitions):
+            debut = time.perf_counter()
+            for _ in range(nombre):
+                cible()
+            durees.append((time.perf_counter() - debut) / nombre)
+    finally:
+        if gc_actif:
+            gc.enable()
+    return durees
+
+
+def resumer(durees):
+    return {
+        'repetitions': len(durees),
+        'min_ms': round(min(durees) * 1000, 4),
+        'mediane_ms': round(statistics.median(durees) * 1000, 4),
+        'moyenne_ms': round(statistics.fmean(durees) * 1000, 4),
+        'ecart_type_ms': round(statistics.pstdev(durees) * 1000, 4),
+    }
+
+
+def comparer(resultats, reference, tolerance=0.2):
+    """
+    Compare les médianes à celles de la baseline. Retourne (régressions, améliorations) :
+    listes de messages pour les benchmarks plus lents, respectivement plus rapides, de plus
+    de `tolerance` (relative).
+    """
+    regressions, ameliorations = [], []
+    for nom, base in reference['benchmarks'].items():
+        actuel = resultats['benchmarks'].get(nom)
+        if actuel is None:
+            continue
+        rapport = actuel['mediane_ms'] / base['mediane_ms'] if base['mediane_ms'] else 1.0
+        message = f"{nom}: {actuel['mediane_ms']} ms (baseline {base['mediane_ms']} ms, x{rapport:.2f})"
+        if rapport > 1 + tolerance:
+            regressions.append(message)
+        elif rapport < 1 / (1 + tolerance):
+            ameliorations.append(message)
+    return regressions, ameliorations
@@ -0,0 +1,63 @@
+"""
+Réglages gunicorn de production, lus depuis l'environnement. Lancement depuis backend/ :
+
+    gunicorn wsgi:app
+
+SERVER_WORKER_MODE choisit le modèle d'exécution :
+  - sync    : un processus par requête en cours (SERVER_WORKERS, 2 x CPU + 1 par défaut) ;
+  - threads : SERVER_THREADS threads par worker (gthread), pour les requêtes qui attendent
+              la base ou PayDunya ;
+  - gevent  : greenlets (SERVER_WORKER_CONNECTIONS par worker), nécessite gevent.
+
+Seul le mode gevent sert les flux SSE des paiements (SSE_ACTIF=auto) : en sync ou threads, ils
+répondent 204 et le front recharge la liste toutes les 30 s. Un déploiement qui sert le frontend
+se lance donc avec SERVER_WORKER_MODE=gevent ; sync reste le défaut pour l'API seule.
+
+L'application est chargée et préchauffée une seule fois dans le maître (preload), puis les
+workers sont forkés ; post_fork remet à zéro ce qui ne doit pas être partagé et démarre les
+threads d'arrière-plan (journaux, planificateur, relais) : le maître n'en a aucun.
+"""
+import multiprocessing
+import os
+
+MODES = {'sync': 'sync', 'threads': 'gthread', 'gevent': 'gevent'}
+
+mode = os.environ.get('SERVER_WORKER_MODE', 'sync')
+if mode not in MODES:
+    raise RuntimeError(f"SERVER_WORKER_MODE inconnu : {mode} (attendu : {', '.join(MODES)})")
+
+if mode == 'gevent':
+    # Avant tout import de l'application : le préchargement crée verrous et sockets
+    from gevent import monkey
+    monkey.patch_all()
+
+processeurs = multiprocessing.cpu_count()
+
+bind = os.environ.get('SERVER_BIND', '0.0.0.0:5000')
+worker_class = MODES[mode]
+workers = int(os.environ.get('SERVER_WORKERS') or (2 * processeurs + 1 if mode == 'sync' else processeurs))
+threads = int(os.environ.get('SERVER_THREADS', 8)) if mode == 'threads' else 1
+worker_connections = int(os.environ.get('SERVER_WORKER_CONNECTIONS', 100))
+if mode == 'gevent':
+    # Chaque greenlet peut attendre PayDunya : le pool HTTP du client suit le nombre de connexions
+    os.environ.setdefault('PAYDUNYA_POOL_TAILLE', str(worker_connections))
+preload_app = os.environ.get('SERVER_PRELOAD', 'true').lower() == 'true'
+
+timeout = int(os.environ.get('SERVER_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('SERVER_KEEPALIVE', 5))
+# Recyclage des workers pour borner la croissance mémoire (0 : jamais)
+max_requests = int(os.environ.get('SERVER_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('SERVER_MAX_REQUESTS_JITTER', 0))
+
+# Les journaux applicatifs passent par app.journalisation ; gunicorn garde les siens sur stderr
+accesslog = os.environ.get('SERVER_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('SERVER_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    from app.serveur import reinitialiser_apres_fork
+    from wsgi import app
+    # Les flux SSE ne sont servis que par les workers gevent (voir SSE_ACTIF)
+    reinitialiser_apres_fork(app, worker_asynchrone=mode == 'gevent')
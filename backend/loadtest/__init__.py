@@ -0,0 +1,5 @@
+"""
+Tests de charge de bout en bout : l'application tourne dans un serveur WSGI local, sur une
+base SQLite remplie par le générateur de jeux de données, avec un faux serveur PayDunya.
+Lancement : `python -m loadtest --help` depuis backend/.
+"""
@@ -0,0 +1,118 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+from datetime import datetime, timezone
+
+from werkzeug.serving import make_server
+
+from app import db
+from app.services.jeu_de_donnees import VOLUMES
+from loadtest.execution import (
+    afficher, choisir_utilisateurs, creer_application, creer_base_temporaire, executer, remplir_base,
+    supprimer_base_temporaire,
+)
+from loadtest.paydunya_factice import PaydunyaFactice
+from loadtest.statistiques import comparer
+
+DOSSIER_BASELINES = os.path.join(os.path.dirname(__file__), 'baselines')
+
+
+def lire_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest',
+        description="Test de charge de bout en bout (parcours locataire et propriétaire) avec un faux PayDunya.")
+    parser.add_argument('--locataires', type=int, default=8, help="Utilisateurs virtuels locataires.")
+    parser.add_argument('--proprietaires', type=int, default=2, help="Utilisateurs virtuels propriétaires.")
+    parser.add_argument('--duree', type=float, default=30, help="Durée de la mesure en secondes.")
+    parser.add_argument('--iterations', type=int, help="Nombre d'itérations par utilisateur (remplace --duree).")
+    parser.add_argument('--taille', choices=sorted(VOLUMES), default='petit', help="Volumes du jeu de données.")
+    parser.add_argument('--echelle', type=float, default=0.1,
+                        help="Facteur appliqué aux volumes de --taille (0.1 : un dixième).")
+    parser.add_argument('--graine', type=int, default=42, help="Graine du jeu de données et des parcours.")
+    parser.add_argument('--database-url', help="Base existante et déjà remplie (sinon SQLite temporaire générée).")
+    parser.add_argument('--latence-paydunya', type=float, default=0.05,
+                        help="Latence simulée de l'API PayDunya, en secondes.")
+    parser.add_argument('--sortie', help="Fichier JSON où écrire le rapport.")
+    parser.add_argument('--baseline', help="Nom ou chemin de la baseline à comparer (ex. reference).")
+    parser.add_argument('--enregistrer-baseline', metavar='NOM', help="Enregistre le rapport comme baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.4,
+                        help="Dégradation relative tolérée du p95 et du débit (0.4 : 40 %%).")
+    return parser.parse_args(arguments)
+
+
+def chemin_baseline(nom):
+    if os.sep in nom or nom.endswith('.json'):
+        return nom
+    return os.path.join(DOSSIER_BASELINES, f'{nom}.json')
+
+
+def main(arguments=None):
+    args = lire_arguments(arguments)
+    fichier_temporaire = None if args.database_url else creer_base_temporaire()
+    uri = args.database_url or f'sqlite:///{fichier_temporaire}'
+
+    paydunya_factice = PaydunyaFactice(latence=args.latence_paydunya).demarrer()
+    app = creer_application(uri, paydunya_factice.endpoint)
+    with app.app_context():
+        if fichier_temporaire:
+            remplir_base(args.taille, args.echelle, args.graine)
+        emails_locataires, emails_proprietaires = choisir_utilisateurs(
+            args.locataires, args.proprietaires, args.graine)
+        db.session.remove()
+
+    # Le journal d'accès de werkzeug ralentirait le serveur mesuré
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    serveur = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=serveur.serve_forever, name='serveur-charge', daemon=True).start()
+    url = f'http://127.0.0.1:{serveur.server_port}'
+
+    rapport = executer(url, emails_locataires, emails_proprietaires, args.graine, args.duree, args.iterations)
+
+    serveur.shutdown()
+    paydunya_factice.arreter()
+    if fichier_temporaire:
+        with app.app_context():
+            db.engine.dispose()
+        supprimer_base_temporaire(fichier_temporaire)
+
+    rapport['parametres'] = {
+        'locataires': args.locataires, 'proprietaires': args.proprietaires, 'duree': args.duree,
+        'iterations': args.iterations, 'taille': args.taille, 'echelle': args.echelle, 'graine': args.graine,
+        'latence_paydunya': args.latence_paydunya, 'base': 'sqlite temporaire' if fichier_temporaire else 'externe',
+    }
+    rapport['environnement'] = {
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'machine': platform.machine(), 'processeurs': os.cpu_count(),
+    }
+    afficher(rapport)
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump(rapport, fichier, indent=2, ensure_ascii=False)
+    if args.enregistrer_baseline:
+        chemin = chemin_baseline(args.enregistrer_baseline)
+        with open(chemin, 'w', encoding='utf-8') as fichier:
+            json.dump(rapport, fichier, indent=2, ensure_ascii=False)
+            fichier.write('\n')
+        print(f"\nBaseline enregistrée dans {chemin}")
+    if args.baseline:
+        with open(chemin_baseline(args.baseline), encoding='utf-8') as fichier:
+            reference = json.load(fichier)
+        if reference.get('parametres') != rapport['parametres']:
+            print("\nAttention : paramètres différents de ceux de la baseline, comparaison indicative.")
+        regressions = comparer(rapport, reference, tolerance=args.tolerance)
+        if regressions:
+            print("\nRégressions par rapport à la baseline :")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print("\nAucune régression par rapport à la baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
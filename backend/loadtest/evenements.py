@@ -0,0 +1,180 @@
+"""
+Débit de l'outbox des événements : coût de la publication dans la transaction, puis débit
+du relais par taille de lot vers une destination (file en mémoire, fichier, webhook local).
+Avec --taux-erreur, le webhook refuse une partie des lots : chaque événement doit quand
+même être reçu au moins une fois.
+
+    python -m loadtest.evenements --evenements 20000 --destination webhook --tailles-lot 1,100,500
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+
+from sqlalchemy import func, update
+
+from app import db
+from app.models import EvenementSortant
+from app.services.evenements import DestinationFichier, DestinationFile, DestinationWebhook, publier, \
+    publier_plusieurs, relais_evenements
+from loadtest.execution import creer_application, creer_base_temporaire, supprimer_base_temporaire
+from loadtest.paydunya_factice import _Serveur
+
+DESTINATIONS = ('file', 'fichier', 'webhook')
+
+
+class RecepteurWebhook:
+    """Serveur HTTP local qui reçoit les lots du relais et compte les événements reçus par id."""
+
+    def __init__(self, taux_erreur=0.0, graine=None):
+        self.taux_erreur = taux_erreur
+        self.recus = Counter()
+        self._alea = random.Random(graine)
+        self._verrou = threading.Lock()
+        self._serveur = _Serveur(('127.0.0.1', 0), self._gestionnaire())
+        threading.Thread(target=self._serveur.serve_forever, name='recepteur-webhook', daemon=True).start()
+
+    @property
+    def url(self):
+        hote, port = self._serveur.server_address
+        return f'http://{hote}:{port}/evenements'
+
+    def arreter(self):
+        self._serveur.shutdown()
+        self._serveur.server_close()
+
+    def _gestionnaire(self):
+        recepteur = self
+
+        class Gestionnaire(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                corps = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with recepteur._verrou:
+                    refuse = recepteur._alea.random() < recepteur.taux_erreur
+                    if not refuse:
+                        recepteur.recus.update(e['id'] for e in json.loads(corps)['evenements'])
+                self.send_response(503 if refuse else 204)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        return Gestionnaire
+
+
+def lire_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest.evenements',
+        description="Débit de la publication et du relais des événements de l'outbox.")
+    parser.add_argument('--evenements', type=int, default=10000, help="Événements relayés par taille de lot.")
+    parser.add_argument('--publications', type=int, default=1000,
+                        help="Transactions d'un événement chacune, pour mesurer le coût de la publication.")
+    parser.add_argument('--destination', choices=DESTINATIONS, default='webhook', help="Destination des lots.")
+    parser.add_argument('--tailles-lot', default='1,50,500', help="Tailles de lot à comparer, séparées par des virgules.")
+    parser.add_argument('--taux-erreur', type=float, default=0.0,
+                        help="Proportion de lots refusés par le webhook (retentés par le relais).")
+    parser.add_argument('--graine', type=int, default=42)
+    return parser.parse_args(arguments)
+
+
+def mesurer_publication(nombre):
+    """Une transaction par événement, comme dans les routes : événements publiés par seconde."""
+    debut = time.perf_counter()
+    for i in range(nombre):
+        publier('charge.publication', f'charge:{i}', {'numero': i})
+        db.session.commit()
+    return nombre / (time.perf_counter() - debut)
+
+
+def relayer_tout(taille_lot, attendus):
+    """Relaie jusqu'à ce que les `attendus` événements soient livrés ; un lot refusé est retenté aussitôt."""
+    debut = time.perf_counter()
+    lots = refuses = 0
+    while True:
+        rapport = relais_evenements.relayer(taille_lot=taille_lot)
+        lots += rapport['lots']
+        # relayer() s'arrête au premier lot refusé
+        refuses += 1 if rapport['echecs'] else 0
+        restants = db.session.query(func.count(EvenementSortant.id)).filter(EvenementSortant.livre_le.is_(None)).scalar()
+        db.session.rollback()
+        if not restants:
+            break
+        if not rapport['lots']:
+            time.sleep(0.01)
+    duree = time.perf_counter() - debut
+    return {'taille_lot': taille_lot, 'evenements': attendus, 'lots': lots, 'lots_refuses': refuses,
+            'duree_secondes': round(duree, 3), 'evenements_par_seconde': round(attendus / duree, 1)}
+
+
+def main(arguments=None):
+    args = lire_arguments(arguments)
+    tailles = [int(t) for t in args.tailles_lot.split(',')]
+    fichier_base = creer_base_temporaire()
+    dossier = tempfile.mkdtemp(prefix='evenements_')
+    recepteur = RecepteurWebhook(args.taux_erreur, args.graine) if args.destination == 'webhook' else None
+    # Backoff nul : un lot refusé est retenté au passage suivant
+    app = creer_application(f'sqlite:///{fichier_base}', EVENEMENTS_DESTINATIONS=[], EVENEMENTS_BACKOFF=0)
+    resultats = []
+    try:
+        with app.app_context():
+            db.create_all(bind_key=None)
+            if args.destination == 'file':
+                destination = DestinationFile()
+            elif args.destination == 'fichier':
+                destination = DestinationFichier(os.path.join(dossier, 'evenements.jsonl'))
+            else:
+                destination = DestinationWebhook(recepteur.url, timeout=10)
+            relais_evenements.ajouter_destination(args.destination, destination)
+
+            par_seconde = mesurer_publication(args.publications)
+            print(f"Publication : {par_seconde:.0f} événements/s (une transaction par événement)")
+            db.session.execute(update(EvenementSortant).values(livre_le=func.current_timestamp()))
+            db.session.commit()
+
+            for taille_lot in tailles:
+                debut_id = (db.session.query(func.max(EvenementSortant.id)).scalar() or 0) + 1
+                for i in range(0, args.evenements, 5000):
+                    publier_plusieurs('charge.relais', [(f'charge:{n}', {'numero': n, 'taille_lot': taille_lot})
+                                                         for n in range(i, min(i + 5000, args.evenements))])
+                db.session.commit()
+                resultat = relayer_tout(taille_lot, args.evenements)
+                if args.destination == 'file':
+                    recus = Counter()
+                    while not destination.file.empty():
+                        recus[destination.file.get_nowait()['id']] += 1
+                elif args.destination == 'webhook':
+                    recus = recepteur.recus
+                else:
+                    with open(destination.chemin, encoding='utf-8') as fichier:
+                        recus = Counter(json.loads(ligne)['id'] for ligne in fichier)
+                ids = range(debut_id, debut_id + args.evenements)
+                resultat['manquants'] = sum(1 for i in ids if not recus[i])
+                resultat['doublons'] = sum(recus[i] - 1 for i in ids if recus[i] > 1)
+                resultats.append(resultat)
+                print(json.dumps(resultat, ensure_ascii=False))
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        if recepteur is not None:
+            recepteur.arreter()
+        supprimer_base_temporaire(fichier_base)
+        for nom in os.listdir(dossier):
+            os.remove(os.path.join(dossier, nom))
+        os.rmdir(dossier)
+
+    print(f"\n{'taille lot':>10}{'lots':>8}{'refusés':>9}{'évén./s':>10}{'manquants':>11}")
+    for r in resultats:
+        print(f"{r['taille_lot']:>10}{r['lots']:>8}{r['lots_refuses']:>9}{r['evenements_par_seconde']:>10}"
+              f"{r['manquants']:>11}")
+    return 1 if any(r['manquants'] for r in resultats) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
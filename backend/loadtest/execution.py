@@ -0,0 +1,137 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from sqlalchemy import func, select
+
+from app import create_app, db
+from app.config import Config
+from app.models import Chambre, Contrat, Maison, Utilisateur
+from app.services.jeu_de_donnees import VOLUMES, generer_jeu_de_donnees
+from loadtest.parcours import Client, ParcoursLocataire, ParcoursProprietaire, ReponseInattendue, creer_alea
+from loadtest.statistiques import Statistiques
+
+CLE_MAITRE = 'cle-maitre-charge'
+# Configuration PayDunya commune au serveur en processus et aux serveurs lancés à part
+CONFIG_PAYDUNYA = {
+    'PAYDUNYA_MASTER_KEY': CLE_MAITRE,
+    'PAYDUNYA_PRIVATE_KEY': 'test_private_charge',
+    'PAYDUNYA_PUBLIC_KEY': 'test_public_charge',
+    'PAYDUNYA_TOKEN': 'token-charge',
+    'PAYDUNYA_CALLBACK_URL': 'http://127.0.0.1/api/locataire/paydunya/callback',
+    'PAYDUNYA_RETURN_URL': 'http://127.0.0.1/api/locataire/mes-paiements/success',
+    'PAYDUNYA_CANCEL_URL': 'http://127.0.0.1/api/locataire/mes-paiements/cancel',
+}
+
+
+def creer_application(uri, endpoint_paydunya=None, **config):
+    ConfigCharge = type('ConfigCharge', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'PAYDUNYA_SANDBOX_ENDPOINT': endpoint_paydunya,
+        'SQLITE_PRODUCTION': True,
+        'SCHEDULER_ENABLED': False,
+        'EVENEMENTS_RELAIS_ACTIF': False,
+        'LOG_LEVEL': 'WARNING',
+        **CONFIG_PAYDUNYA,
+        **config,
+    })
+    return create_app(ConfigCharge)
+
+
+def creer_base_temporaire():
+    descripteur, fichier = tempfile.mkstemp(prefix='charge_', suffix='.db')
+    os.close(descripteur)
+    return fichier
+
+
+def supprimer_base_temporaire(fichier):
+    for suffixe in ('', '-wal', '-shm'):
+        if os.path.exists(fichier + suffixe):
+            os.remove(fichier + suffixe)
+
+
+def remplir_base(taille, echelle, graine):
+    """Crée les tables et génère le jeu de données ; à appeler dans un contexte d'application."""
+    db.create_all(bind_key=None)
+    volumes = {table: max(1, int(n * echelle)) for table, n in VOLUMES[taille].items()}
+    print(f"Génération du jeu de données {volumes}")
+    print(f"Jeu de données: {generer_jeu_de_donnees(volumes, graine=graine)}")
+
+
+def choisir_utilisateurs(nombre_locataires, nombre_proprietaires, graine):
+    """Locataires ayant des échéances à payer et propriétaires ayant des demandes en attente."""
+    alea = random.Random(graine)
+    locataires = db.session.scalars(
+        select(Utilisateur.email).join(Contrat, Contrat.locataire_id == Utilisateur.id)
+        .where(Contrat.statut == 'actif').distinct().order_by(Utilisateur.email)).all()
+    proprietaires = db.session.scalars(
+        select(Utilisateur.email)
+        .join(Maison, Maison.proprietaire_id == Utilisateur.id)
+        .join(Chambre, Chambre.maison_id == Maison.id)
+        .join(Contrat, Contrat.chambre_id == Chambre.id)
+        .where(Contrat.statut == 'en_attente_validation')
+        .group_by(Utilisateur.email)
+        .order_by(func.count(Contrat.id).desc(), Utilisateur.email)
+        .limit(max(nombre_proprietaires * 5, 1))).all()
+    if len(locataires) < nombre_locataires or len(proprietaires) < nombre_proprietaires:
+        sys.exit("Jeu de données trop petit pour le nombre d'utilisateurs virtuels demandé.")
+    return alea.sample(locataires, nombre_locataires), alea.sample(proprietaires, nombre_proprietaires)
+
+
+def utilisateur_virtuel(parcours, fin, iterations):
+    effectuees = 0
+    while (iterations is None and time.perf_counter() < fin) or (iterations is not None and effectuees < iterations):
+        try:
+            parcours.iteration()
+        except (ReponseInattendue, requests.RequestException):
+            # Déjà comptée comme erreur de l'étape : on passe à l'itération suivante
+            pass
+        effectuees += 1
+
+
+def connecter(parcours):
+    try:
+        parcours.connexion()
+        return True
+    except (ReponseInattendue, requests.RequestException):
+        return False
+
+
+def executer(url, emails_locataires, emails_proprietaires, graine, duree, iterations=None):
+    """Joue les parcours des utilisateurs virtuels contre `url` et renvoie le rapport."""
+    stats = Statistiques()
+    parcours = [ParcoursLocataire(Client(url), stats, creer_alea(graine, i), email, CLE_MAITRE)
+                for i, email in enumerate(emails_locataires)]
+    parcours += [ParcoursProprietaire(Client(url), stats, creer_alea(graine, -1 - i), email)
+                 for i, email in enumerate(emails_proprietaires)]
+
+    print(f"{len(parcours)} utilisateurs virtuels sur {url}")
+    # Connexions (bcrypt) avant la mesure : elles sont chronométrées mais ne pèsent pas sur le débit
+    with ThreadPoolExecutor(max_workers=len(parcours)) as executeur:
+        connectes = [p for p, ok in zip(parcours, executeur.map(connecter, parcours)) if ok]
+    stats.demarrer()
+    fin = time.perf_counter() + duree
+    threads = [threading.Thread(target=utilisateur_virtuel, args=(p, fin, iterations)) for p in connectes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats.terminer()
+    return stats.rapport()
+
+
+def afficher(rapport):
+    print(f"\n{rapport['requetes']} requêtes en {rapport['duree_secondes']} s "
+          f"({rapport['debit_par_seconde']} req/s), {rapport['erreurs']} erreurs\n")
+    print(f"{'étape':<34}{'requêtes':>9}{'erreurs':>9}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for etape, e in sorted(rapport['etapes'].items()):
+        print(f"{etape:<34}{e['requetes']:>9}{e['erreurs']:>9}{e['debit_par_seconde']:>9}"
+              f"{e['p50_ms']:>10}{e['p95_ms']:>10}{e['p99_ms']:>10}")
+    for etape, e in sorted(rapport['etapes'].items()):
+        for exemple in e.get('exemples_erreurs', []):
+            print(f"  {etape}: {exemple}")
@@ -0,0 +1,161 @@
+"""
+Initiations simultanées du paiement PayDunya d'une même échéance, puis callbacks sur les
+factures perdantes : une seule initiation doit aboutir, chaque facture créée par une
+initiation perdante doit être consignée dans `factures_orphelines` (et pas dans l'outbox),
+et un callback sur l'une d'elles doit être rapproché de l'échéance.
+
+    python -m loadtest.factures_orphelines --concurrence 10
+"""
+import argparse
+import hashlib
+import sys
+import threading
+from collections import Counter
+
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Contrat, EvenementSortant, FactureOrpheline, Paiement, Utilisateur
+from app.services.jeu_de_donnees import MOT_DE_PASSE, VOLUMES
+from loadtest.execution import CLE_MAITRE, creer_application, creer_base_temporaire, remplir_base, supprimer_base_temporaire
+from loadtest.paydunya_factice import PaydunyaFactice
+
+
+def lire_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest.factures_orphelines',
+        description="Initiations PayDunya simultanées d'une échéance et callbacks sur les factures perdantes.")
+    parser.add_argument('--concurrence', type=int, default=10, help="Initiations envoyées simultanément.")
+    parser.add_argument('--latence-paydunya', type=float, default=0.2,
+                        help="Latence simulée de l'API PayDunya, en secondes (fenêtre de la course).")
+    parser.add_argument('--taille', choices=sorted(VOLUMES), default='petit', help="Volumes du jeu de données.")
+    parser.add_argument('--echelle', type=float, default=0.02, help="Facteur appliqué aux volumes de --taille.")
+    parser.add_argument('--graine', type=int, default=42, help="Graine du jeu de données.")
+    return parser.parse_args(arguments)
+
+
+def choisir_echeance():
+    """(id de l'échéance, email du locataire) d'une échéance impayée d'un contrat actif."""
+    return db.session.execute(
+        select(Paiement.id, Utilisateur.email)
+        .join(Contrat, Paiement.contrat_id == Contrat.id)
+        .join(Utilisateur, Contrat.locataire_id == Utilisateur.id)
+        .where(Contrat.statut == 'actif', Paiement.statut == 'impayé')
+        .order_by(Paiement.id).limit(1)).first()
+
+
+def connecter(app, email):
+    client = app.test_client()
+    reponse = client.post('/api/auth/login', json={'email': email, 'mot_de_passe': MOT_DE_PASSE})
+    if reponse.status_code != 200:
+        sys.exit(f"Connexion de {email} impossible : {reponse.status_code}")
+    # Les écritures authentifiées par cookie exigent l'en-tête CSRF
+    client.environ_base['HTTP_X_CSRF_TOKEN'] = client.get_cookie('csrf_access_token').value
+    return client
+
+
+def initier_simultanement(app, email, paiement_id, concurrence):
+    """Statuts HTTP des initiations et token de la facture retenue."""
+    clients = [connecter(app, email) for _ in range(concurrence)]
+    statuts = Counter()
+    retenus = []
+    verrou = threading.Lock()
+    depart = threading.Barrier(concurrence)
+
+    def initier(client):
+        depart.wait()
+        reponse = client.post(f'/api/locataire/paiements/{paiement_id}/initier-paydunya', json={})
+        with verrou:
+            statuts[reponse.status_code] += 1
+            if reponse.status_code == 200:
+                retenus.append(reponse.get_json()['paydunya_invoice_token'])
+
+    threads = [threading.Thread(target=initier, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuts, retenus
+
+
+def callback(app, token, statut, transaction_id):
+    return app.test_client().post('/api/locataire/paydunya/callback', data={
+        'data[hash]': hashlib.sha512(CLE_MAITRE.encode('utf-8')).hexdigest(),
+        'data[invoice][token]': token,
+        'data[status]': statut,
+        'data[invoice][transaction_id]': transaction_id,
+    }).status_code
+
+
+def etat(paiement_id):
+    paiement = db.session.get(Paiement, paiement_id)
+    evenements = db.session.scalar(select(func.count()).where(
+        EvenementSortant.cle == f'paiement:{paiement_id}', EvenementSortant.type == 'paiement.paye'))
+    db.session.remove()
+    return paiement.statut, paiement.paydunya_transaction_id, evenements
+
+
+def main(arguments=None):
+    args = lire_arguments(arguments)
+    fichier = creer_base_temporaire()
+    paydunya_factice = PaydunyaFactice(latence=args.latence_paydunya).demarrer()
+    app = creer_application(f'sqlite:///{fichier}', paydunya_factice.endpoint)
+    echecs = []
+
+    def verifier(condition, message):
+        if not condition:
+            echecs.append(message)
+
+    try:
+        with app.app_context():
+            remplir_base(args.taille, args.echelle, args.graine)
+            paiement_id, email = choisir_echeance()
+            db.session.remove()
+
+        statuts, retenus = initier_simultanement(app, email, paiement_id, args.concurrence)
+        print(f"\n{args.concurrence} initiations simultanées de l'échéance {paiement_id} : {dict(statuts)}")
+        verifier(statuts[200] == 1, f"{statuts[200]} initiation(s) abouties au lieu d'une")
+
+        with app.app_context():
+            orphelines = db.session.scalars(
+                select(FactureOrpheline.invoice_token).where(FactureOrpheline.paiement_id == paiement_id)).all()
+            dans_outbox = db.session.scalar(select(func.count()).where(
+                EvenementSortant.cle == f'paiement:{paiement_id}'))
+            db.session.remove()
+        print(f"{len(orphelines)} facture(s) orpheline(s) consignée(s), {dans_outbox} événement(s) dans l'outbox")
+        verifier(len(orphelines) == statuts[400], "factures orphelines non consignées")
+        verifier(not set(orphelines) & set(retenus), "facture retenue consignée comme orpheline")
+        verifier(dans_outbox == 0, "facture orpheline publiée dans l'outbox")
+        if len(orphelines) < 2:
+            echecs.append("moins de deux factures orphelines : callbacks non testés (augmenter --latence-paydunya)")
+        else:
+            premiere, seconde = orphelines[:2]
+            attendu = ('paye', 'tx-orpheline-1', 1)
+            etapes = [
+                ('règlement sur une facture orpheline', premiere, 'completed', 'tx-orpheline-1'),
+                ('même callback renvoyé', premiere, 'completed', 'tx-orpheline-1'),
+                ('annulation sur une autre facture orpheline', seconde, 'cancelled', ''),
+                ('règlement sur la facture retenue', retenus[0], 'completed', 'tx-retenue'),
+            ]
+            for nom, token, statut, transaction_id in etapes:
+                code = callback(app, token, statut, transaction_id)
+                with app.app_context():
+                    obtenu = etat(paiement_id)
+                print(f"{nom} : {code} ; échéance {obtenu}")
+                verifier(code == 200 and obtenu == attendu, f"{nom} : {code}, {obtenu} au lieu de {attendu}")
+            verifier(callback(app, 'facture-inconnue', 'completed', 'tx') == 404, "facture inconnue acceptée")
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        paydunya_factice.arreter()
+        supprimer_base_temporaire(fichier)
+
+    if echecs:
+        print("ÉCHEC : " + " ; ".join(echecs))
+        return 1
+    print("Une seule initiation a abouti et les factures orphelines sont rapprochées de l'échéance.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
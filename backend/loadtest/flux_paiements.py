@@ -0,0 +1,178 @@
+"""
+Flux SSE des paiements contre gunicorn : des locataires ouvrent leur flux, puis le callback
+PayDunya confirme un paiement en attente de chacun. Mesure le délai entre le callback et
+l'événement reçu par le navigateur, et le compare au coût du sondage de /mes-paiements
+qu'il remplace.
+
+    python -m loadtest.flux_paiements --flux 100 --workers 2 --backend base
+"""
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from sqlalchemy import select, update
+
+from app import db
+from app.models import Contrat, Paiement, Utilisateur
+from app.services.jeu_de_donnees import VOLUMES
+from loadtest.execution import (
+    CLE_MAITRE, creer_application, creer_base_temporaire, remplir_base, supprimer_base_temporaire,
+)
+from loadtest.modes_serveur import MODES, arreter, lancer_gunicorn
+from loadtest.parcours import Client
+from loadtest.paydunya_factice import PaydunyaFactice
+from loadtest.statistiques import centile
+
+
+def lire_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest.flux_paiements',
+        description="Délai de livraison des événements de paiement par le flux SSE.")
+    parser.add_argument('--flux', type=int, default=50, help="Locataires ayant un flux ouvert.")
+    parser.add_argument('--mode', choices=MODES, default='gevent', help="Mode de worker de gunicorn.")
+    parser.add_argument('--workers', type=int, default=2, help="Processus workers.")
+    parser.add_argument('--threads', type=int, default=8, help="Threads par worker en mode threads.")
+    parser.add_argument('--backend', choices=('local', 'base'), default='base', help="SSE_BACKEND du serveur.")
+    parser.add_argument('--attente', type=float, default=5, help="Délai maximal de réception d'un événement, en secondes.")
+    parser.add_argument('--sondage', type=float, default=2, help="Période du sondage remplacé, en secondes.")
+    parser.add_argument('--taille', choices=sorted(VOLUMES), default='petit', help="Volumes du jeu de données.")
+    parser.add_argument('--echelle', type=float, default=0.1, help="Facteur appliqué aux volumes de --taille.")
+    parser.add_argument('--graine', type=int, default=42, help="Graine du jeu de données.")
+    return parser.parse_args(arguments)
+
+
+def preparer_paiements(nombre):
+    """Un paiement par locataire, mis en attente de PayDunya avec un token connu : (email, paiement_id, token)."""
+    lignes = db.session.execute(
+        select(Utilisateur.email, Paiement.id)
+        .join(Contrat, Contrat.locataire_id == Utilisateur.id)
+        .join(Paiement, Paiement.contrat_id == Contrat.id)
+        .where(Contrat.statut == 'actif', Paiement.statut.in_(['impayé', 'impaye']))
+        .order_by(Utilisateur.email, Paiement.id)).all()
+    choisis = {}
+    for email, paiement_id in lignes:
+        choisis.setdefault(email, paiement_id)
+    if len(choisis) < nombre:
+        sys.exit(f"Seulement {len(choisis)} locataires avec une échéance impayée pour {nombre} flux.")
+    paiements = [(email, paiement_id, f'flux_{paiement_id}') for email, paiement_id in list(choisis.items())[:nombre]]
+    for _, paiement_id, token in paiements:
+        db.session.execute(update(Paiement).where(Paiement.id == paiement_id).values(
+            statut='en_cours_traitement', paydunya_invoice_token=token))
+    db.session.commit()
+    return paiements
+
+
+class Flux(threading.Thread):
+    """Lit le flux SSE d'un locataire et horodate chaque événement reçu."""
+
+    def __init__(self, client):
+        super().__init__(daemon=True)
+        self.client = client
+        self.ouvert = threading.Event()
+        self.recus = {}  # paiement_id -> instant de réception
+        self.evenements = defaultdict(int)
+        self.erreur = None
+
+    def run(self):
+        try:
+            reponse = self.client.session.get(self.client.url_base + '/api/locataire/paiements/flux',
+                                              stream=True, timeout=(5, 60))
+            reponse.raise_for_status()
+            evenement = None
+            for ligne in reponse.iter_lines(chunk_size=None, decode_unicode=True):
+                if ligne.startswith('event: '):
+                    evenement = ligne[7:]
+                elif ligne.startswith('data: '):
+                    self.evenements[evenement] += 1
+                    if evenement == 'etat':
+                        self.ouvert.set()
+                    elif evenement.startswith('paiement.'):
+                        self.recus[json.loads(ligne[6:])['paiement_id']] = time.perf_counter()
+        except Exception as e:
+            self.erreur = str(e)
+            self.ouvert.set()
+
+
+def mesurer_sondage(client, nombre=20):
+    """Durée moyenne d'un GET /mes-paiements, la requête que le front répétait en boucle."""
+    debut = time.perf_counter()
+    for _ in range(nombre):
+        client.requete('GET', '/api/locataire/mes-paiements')
+    return (time.perf_counter() - debut) / nombre
+
+
+def main(arguments=None):
+    args = lire_arguments(arguments)
+    fichier = creer_base_temporaire()
+    app = creer_application(f'sqlite:///{fichier}')
+    with app.app_context():
+        remplir_base(args.taille, args.echelle, args.graine)
+        paiements = preparer_paiements(args.flux)
+        db.session.remove()
+        db.engine.dispose()
+
+    paydunya_factice = PaydunyaFactice().demarrer()
+    processus, url = lancer_gunicorn(
+        args.mode, args, f'sqlite:///{fichier}', paydunya_factice,
+        SSE_BACKEND=args.backend, SSE_BATTEMENT='5', SSE_DUREE_MAX='600', SERVER_GRACEFUL_TIMEOUT='1',
+        SERVER_WORKER_CONNECTIONS=str(max(args.flux * 2, 100)))
+    try:
+        print(f"=== gunicorn {args.mode}, {args.workers} worker(s), SSE_BACKEND={args.backend}, {args.flux} flux ===")
+        flux = {}
+        for email, paiement_id, _ in paiements:
+            client = Client(url)
+            client.connecter(email)
+            flux[paiement_id] = Flux(client)
+            flux[paiement_id].start()
+        for f in flux.values():
+            f.ouvert.wait(10)
+        erreurs = [f.erreur for f in flux.values() if f.erreur]
+        if erreurs:
+            sys.exit(f"{len(erreurs)} flux n'ont pas pu s'ouvrir, par exemple : {erreurs[0]}")
+
+        hash_callback = hashlib.sha512(CLE_MAITRE.encode('utf-8')).hexdigest()
+        envois = {}
+
+        def confirmer(paiement_id, token):
+            envois[paiement_id] = time.perf_counter()
+            requests.post(url + '/api/locataire/paydunya/callback', timeout=30, data={
+                'data[hash]': hash_callback, 'data[status]': 'completed',
+                'data[invoice][token]': token, 'data[invoice][transaction_id]': f'tx_{token}'}).raise_for_status()
+
+        with ThreadPoolExecutor(max_workers=10) as executeur:
+            list(executeur.map(lambda p: confirmer(p[1], p[2]), paiements))
+        fin = time.monotonic() + args.attente
+        while time.monotonic() < fin and any(paiement_id not in f.recus for paiement_id, f in flux.items()):
+            time.sleep(0.05)
+
+        delais = sorted((f.recus[paiement_id] - envois[paiement_id]) * 1000
+                        for paiement_id, f in flux.items() if paiement_id in f.recus)
+        duree_sondage = mesurer_sondage(next(iter(flux.values())).client)
+        resultat = {
+            'flux': args.flux,
+            'evenements_recus': len(delais),
+            'evenements_perdus': args.flux - len(delais),
+            'delai_p50_ms': round(centile(delais, 50), 1) if delais else None,
+            'delai_p95_ms': round(centile(delais, 95), 1) if delais else None,
+            'delai_max_ms': round(delais[-1], 1) if delais else None,
+            'sondage_mes_paiements_ms': round(duree_sondage * 1000, 1),
+            # Ce que le sondage coûtait pour le même nombre de pages ouvertes
+            'sondage_requetes_par_seconde': round(args.flux / args.sondage, 1),
+            'sondage_temps_serveur_par_seconde_ms': round(args.flux / args.sondage * duree_sondage * 1000, 1),
+        }
+        print(json.dumps(resultat, indent=2, ensure_ascii=False))
+        return 0 if not resultat['evenements_perdus'] else 1
+    finally:
+        arreter(processus)
+        paydunya_factice.arreter()
+        supprimer_base_temporaire(fichier)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Compare les modes de worker de gunicorn (sync, threads, gevent) sur les mêmes parcours :
+chaque mode sert `wsgi:app` dans un processus séparé, sur une copie du même jeu de données.
+
+    python -m loadtest.modes_serveur --duree 20 --workers 2
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+from app import db
+from app.services.jeu_de_donnees import VOLUMES
+from loadtest.execution import (
+    CONFIG_PAYDUNYA, afficher, choisir_utilisateurs, creer_application, creer_base_temporaire, executer,
+    remplir_base, supprimer_base_temporaire,
+)
+from loadtest.paydunya_factice import PaydunyaFactice
+
+DOSSIER_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('sync', 'threads', 'gevent')
+
+
+def lire_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest.modes_serveur',
+        description="Débit et latences de gunicorn selon le mode de worker.")
+    parser.add_argument('--modes', default=','.join(MODES),
+                        help="Modes à comparer, séparés par des virgules (tous par défaut).")
+    parser.add_argument('--workers', type=int, default=2, help="Processus workers par serveur.")
+    parser.add_argument('--threads', type=int, default=8, help="Threads par worker en mode threads.")
+    parser.add_argument('--locataires', type=int, default=8, help="Utilisateurs virtuels locataires.")
+    parser.add_argument('--proprietaires', type=int, default=2, help="Utilisateurs virtuels propriétaires.")
+    parser.add_argument('--duree', type=float, default=20, help="Durée de la mesure par mode, en secondes.")
+    parser.add_argument('--taille', choices=sorted(VOLUMES), default='petit', help="Volumes du jeu de données.")
+    parser.add_argument('--echelle', type=float, default=0.1, help="Facteur appliqué aux volumes de --taille.")
+    parser.add_argument('--graine', type=int, default=42, help="Graine du jeu de données et des parcours.")
+    parser.add_argument('--latence-paydunya', type=float, default=0.05,
+                        help="Latence simulée de l'API PayDunya, en secondes.")
+    parser.add_argument('--sortie', help="Fichier JSON où écrire les rapports de chaque mode.")
+    return parser.parse_args(arguments)
+
+
+def port_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def attendre_port(port, processus, delai=30):
+    fin = time.monotonic() + delai
+    while time.monotonic() < fin:
+        if processus.poll() is not None:
+            raise RuntimeError(f"gunicorn s'est arrêté au démarrage (code {processus.returncode})")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"gunicorn n'écoute pas sur le port {port} après {delai} s")
+
+
+def lancer_gunicorn(mode, args, uri, paydunya_factice, **environnement):
+    port = port_libre()
+    env = dict(os.environ, **CONFIG_PAYDUNYA)
+    env.update({
+        'SERVER_WORKER_MODE': mode,
+        'SERVER_BIND': f'127.0.0.1:{port}',
+        'SERVER_WORKERS': str(args.workers),
+        'SERVER_THREADS': str(args.threads),
+        'SERVER_LOG_LEVEL': 'warning',
+        'DATABASE_URL': uri,
+        'SQLITE_PRODUCTION': 'true',
+        'DB_CREATE_ALL': 'false',
+        'SCHEDULER_ENABLED': 'false',
+        'METRICS_ENABLED': 'false',
+        'LOG_LEVEL': 'WARNING',
+        'PAYDUNYA_SANDBOX_ENDPOINT': paydunya_factice.endpoint,
+    })
+    env.update(environnement)
+    processus = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=DOSSIER_BACKEND, env=env)
+    try:
+        attendre_port(port, processus)
+    except RuntimeError:
+        processus.kill()
+        raise
+    return processus, f'http://127.0.0.1:{port}'
+
+
+def arreter(processus):
+    processus.terminate()
+    try:
+        processus.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        processus.kill()
+        processus.wait()
+
+
+def main(arguments=None):
+    args = lire_arguments(arguments)
+    modes = args.modes.split(',')
+    inconnus = set(modes) - set(MODES)
+    if inconnus:
+        sys.exit(f"Modes inconnus : {', '.join(sorted(inconnus))} (attendus : {', '.join(MODES)})")
+    reference = creer_base_temporaire()
+    app = creer_application(f'sqlite:///{reference}')
+    with app.app_context():
+        remplir_base(args.taille, args.echelle, args.graine)
+        emails_locataires, emails_proprietaires = choisir_utilisateurs(
+            args.locataires, args.proprietaires, args.graine)
+        db.session.remove()
+        db.engine.dispose()
+
+    paydunya_factice = PaydunyaFactice(latence=args.latence_paydunya).demarrer()
+    rapports = {}
+    try:
+        for mode in modes:
+            # Chaque mode repart du même état : les parcours modifient la base
+            copie = creer_base_temporaire()
+            shutil.copyfile(reference, copie)
+            print(f"\n=== gunicorn, mode {mode} ===")
+            processus, url = lancer_gunicorn(mode, args, f'sqlite:///{copie}', paydunya_factice)
+            try:
+                rapports[mode] = executer(url, emails_locataires, emails_proprietaires, args.graine, args.duree)
+            finally:
+                arreter(processus)
+                supprimer_base_temporaire(copie)
+            afficher(rapports[mode])
+    finally:
+        paydunya_factice.arreter()
+        supprimer_base_temporaire(reference)
+
+    print(f"\n{'mode':<10}{'req/s':>9}{'erreurs':>9}{'pire p95 ms':>14}  étape")
+    for mode, rapport in rapports.items():
+        # Les connexions ont lieu avant la fenêtre de mesure
+        mesurees = {etape: e for etape, e in rapport['etapes'].items() if not etape.endswith('.connexion')}
+        etape, pire = max(mesurees.items(), key=lambda element: element[1]['p95_ms'])
+        print(f"{mode:<10}{rapport['debit_par_seconde']:>9}{rapport['erreurs']:>9}{pire['p95_ms']:>14}  {etape}")
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump({'parametres': vars(args), 'modes': rapports}, fichier, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
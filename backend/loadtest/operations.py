@@ -0,0 +1,150 @@
+"""
+Opérations en lot du propriétaire : un changement de prix sur toutes ses chambres et le
+marquage de ses paiements impayés, faits appel par appel (PUT /chambres/<id>, PUT
+/paiements/<id>/marquer_paye) puis en un POST /proprietaire/operations (durée, instructions
+SQL). Les deux chemins doivent laisser la base dans le même état.
+
+    python -m loadtest.operations --proprietaires 3 --chambres 200 --paiements 200
+"""
+import argparse
+import sys
+import time
+from collections import defaultdict
+
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Chambre, Contrat, Maison, Paiement, Utilisateur
+from app.services.jeu_de_donnees import MOT_DE_PASSE, VOLUMES
+from loadtest.execution import creer_application, creer_base_temporaire, remplir_base, supprimer_base_temporaire
+from loadtest.statistiques import centile
+
+
+def lire_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest.operations',
+        description="Appels unitaires du propriétaire comparés à un lot POST /proprietaire/operations.")
+    parser.add_argument('--proprietaires', type=int, default=3, help="Propriétaires (ceux qui ont le plus de chambres).")
+    parser.add_argument('--chambres', type=int, default=200, help="Chambres repricées par propriétaire et par chemin.")
+    parser.add_argument('--paiements', type=int, default=200, help="Paiements impayés marqués par propriétaire (moitié par chemin).")
+    parser.add_argument('--taille', choices=sorted(VOLUMES), default='petit', help="Volumes du jeu de données.")
+    parser.add_argument('--echelle', type=float, default=0.5, help="Facteur appliqué aux volumes de --taille.")
+    parser.add_argument('--graine', type=int, default=42, help="Graine du jeu de données.")
+    return parser.parse_args(arguments)
+
+
+def choisir_proprietaires(nombre, nombre_chambres, nombre_paiements):
+    """(email, chambres à modifier, paiements impayés à marquer) des propriétaires qui ont le plus de chambres."""
+    proprietaires = db.session.execute(
+        select(Utilisateur.id, Utilisateur.email)
+        .join(Maison, Maison.proprietaire_id == Utilisateur.id)
+        .join(Chambre, Chambre.maison_id == Maison.id)
+        .group_by(Utilisateur.id, Utilisateur.email)
+        .order_by(func.count(Chambre.id).desc(), Utilisateur.email)
+        .limit(nombre)).all()
+    choix = []
+    for proprietaire_id, email in proprietaires:
+        chambres = db.session.scalars(
+            select(Chambre.id).join(Maison).where(Maison.proprietaire_id == proprietaire_id)
+            .order_by(Chambre.id).limit(nombre_chambres)).all()
+        paiements = db.session.scalars(
+            select(Paiement.id).join(Contrat).join(Chambre).join(Maison)
+            .where(Maison.proprietaire_id == proprietaire_id, Paiement.statut == 'impayé')
+            .order_by(Paiement.id).limit(nombre_paiements)).all()
+        choix.append((email, chambres, paiements))
+    return choix
+
+
+def mesurer(mesures, reponse, debut):
+    mesures['ms'] += (time.perf_counter() - debut) * 1000
+    mesures['requetes_http'] += 1
+    mesures['requetes_sql'] += int(reponse.headers.get('X-DB-Queries', 0))
+
+
+def unitaires(client, chambres, prix, paiements, mesures):
+    for chambre_id in chambres:
+        debut = time.perf_counter()
+        reponse = client.put(f'/api/proprietaire/chambres/{chambre_id}',
+                             json={'maison_id': 0, 'titre': f'Chambre {chambre_id}', 'prix': prix})
+        mesurer(mesures, reponse, debut)
+        if reponse.status_code != 200:
+            sys.exit(f"PUT chambre {chambre_id} -> {reponse.status_code}: {reponse.get_data(as_text=True)[:200]}")
+    for paiement_id in paiements:
+        debut = time.perf_counter()
+        reponse = client.put(f'/api/proprietaire/paiements/{paiement_id}/marquer_paye')
+        mesurer(mesures, reponse, debut)
+        if reponse.status_code != 200:
+            sys.exit(f"PUT paiement {paiement_id} -> {reponse.status_code}: {reponse.get_data(as_text=True)[:200]}")
+
+
+def en_lot(client, chambres, prix, paiements, mesures):
+    operations = [{'type': 'modifier_chambre', 'id': i, 'titre': f'Chambre {i}', 'prix': prix} for i in chambres]
+    operations += [{'type': 'marquer_paiement_paye', 'id': i} for i in paiements]
+    debut = time.perf_counter()
+    reponse = client.post('/api/proprietaire/operations', json={'operations': operations, 'atomique': True})
+    mesurer(mesures, reponse, debut)
+    if reponse.status_code != 200:
+        sys.exit(f"POST /operations -> {reponse.status_code}: {reponse.get_data(as_text=True)[:300]}")
+
+
+def verifier(chambres, prix, paiements):
+    """Nombre de chambres et de paiements qui n'ont pas l'état attendu."""
+    prix_faux = db.session.scalar(
+        select(func.count()).where(Chambre.id.in_(chambres), Chambre.prix != prix)) if chambres else 0
+    non_payes = db.session.scalar(
+        select(func.count()).where(Paiement.id.in_(paiements), Paiement.statut != 'payé')) if paiements else 0
+    return prix_faux + non_payes
+
+
+def main(arguments=None):
+    args = lire_arguments(arguments)
+    fichier = creer_base_temporaire()
+    app = creer_application(f'sqlite:///{fichier}', SQL_QUERY_HEADERS=True)
+    try:
+        with app.app_context():
+            remplir_base(args.taille, args.echelle, args.graine)
+            choix = choisir_proprietaires(args.proprietaires, args.chambres, args.paiements)
+            db.session.remove()
+
+        mesures = {'unitaires': [], 'lot': []}
+        ecarts = 0
+        for email, chambres, paiements in choix:
+            client = app.test_client()
+            reponse = client.post('/api/auth/login', json={'email': email, 'mot_de_passe': MOT_DE_PASSE})
+            if reponse.status_code != 200:
+                sys.exit(f"Connexion de {email} impossible : {reponse.status_code}")
+            # Les écritures authentifiées par cookie exigent l'en-tête CSRF
+            client.environ_base['HTTP_X_CSRF_TOKEN'] = client.get_cookie('csrf_access_token').value
+            moitie = len(paiements) // 2
+            for nom, executer, prix, lot_paiements in (('unitaires', unitaires, 1111.0, paiements[:moitie]),
+                                                       ('lot', en_lot, 2222.0, paiements[moitie:])):
+                valeurs = defaultdict(float)
+                executer(client, chambres, prix, lot_paiements, valeurs)
+                valeurs['operations'] = len(chambres) + len(lot_paiements)
+                mesures[nom].append(valeurs)
+                with app.app_context():
+                    ecarts += verifier(chambres, prix, lot_paiements)
+
+        print(f"\n{len(choix)} propriétaires ; par propriétaire :")
+        print(f"{'':<11}{'opérations':>11}{'HTTP':>7}{'SQL':>8}{'ms total':>10}{'ms p50':>9}")
+        for nom, valeurs in mesures.items():
+            if not valeurs:
+                continue
+            durees = sorted(v['ms'] for v in valeurs)
+            print(f"{nom:<11}{sum(v['operations'] for v in valeurs) / len(valeurs):>11.0f}"
+                  f"{sum(v['requetes_http'] for v in valeurs) / len(valeurs):>7.0f}"
+                  f"{sum(v['requetes_sql'] for v in valeurs) / len(valeurs):>8.0f}"
+                  f"{sum(durees) / len(durees):>10.1f}{centile(durees, 50):>9.1f}")
+        if ecarts:
+            print(f"{ecarts} chambre(s) ou paiement(s) sans l'état attendu")
+            return 1
+        print("Les deux chemins laissent les chambres et les paiements dans l'état attendu.")
+        return 0
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        supprimer_base_temporaire(fichier)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
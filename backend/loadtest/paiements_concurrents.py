@@ -0,0 +1,159 @@
+"""
+Initiations de paiement simultanées contre un seul worker gunicorn, selon son mode
+(sync, threads, gevent), avec un PayDunya lent : mesure combien d'appels au fournisseur un
+worker peut garder en attente à la fois.
+
+    python -m loadtest.paiements_concurrents --concurrence 200 --latence-paydunya 1
+"""
+import argparse
+import json
+import shutil
+import sys
+import threading
+from collections import defaultdict
+
+import requests
+from sqlalchemy import select
+
+from app import db
+from app.models import Contrat, Paiement, Utilisateur
+from app.services.jeu_de_donnees import VOLUMES
+from loadtest.execution import creer_application, creer_base_temporaire, remplir_base, supprimer_base_temporaire
+from loadtest.modes_serveur import MODES, arreter, lancer_gunicorn
+from loadtest.parcours import Client, ReponseInattendue
+from loadtest.paydunya_factice import PaydunyaFactice
+from loadtest.statistiques import Statistiques
+
+ETAPE = 'locataire.initier_paiement'
+
+
+def lire_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest.paiements_concurrents',
+        description="Initiations de paiement simultanées sur un worker gunicorn, par mode de worker.")
+    parser.add_argument('--modes', default=','.join(MODES), help="Modes à comparer, séparés par des virgules.")
+    parser.add_argument('--workers', type=int, default=1, help="Processus workers par serveur.")
+    parser.add_argument('--threads', type=int, default=8, help="Threads par worker en mode threads.")
+    parser.add_argument('--concurrence', type=int, default=200, help="Initiations envoyées simultanément.")
+    parser.add_argument('--locataires', type=int, default=10, help="Comptes locataires se partageant les requêtes.")
+    parser.add_argument('--latence-paydunya', type=float, default=1.0,
+                        help="Latence simulée de l'API PayDunya, en secondes.")
+    parser.add_argument('--timeout', type=float, default=30, help="Timeout client de chaque requête, en secondes.")
+    parser.add_argument('--taille', choices=sorted(VOLUMES), default='petit', help="Volumes du jeu de données.")
+    parser.add_argument('--echelle', type=float, default=0.1, help="Facteur appliqué aux volumes de --taille.")
+    parser.add_argument('--graine', type=int, default=42, help="Graine du jeu de données.")
+    parser.add_argument('--sortie', help="Fichier JSON où écrire les résultats de chaque mode.")
+    return parser.parse_args(arguments)
+
+
+def choisir_paiements(nombre_locataires, concurrence):
+    """(email, paiement_id) distincts : chaque requête initie une échéance impayée différente."""
+    lignes = db.session.execute(
+        select(Utilisateur.email, Paiement.id)
+        .join(Contrat, Contrat.locataire_id == Utilisateur.id)
+        .join(Paiement, Paiement.contrat_id == Contrat.id)
+        .where(Contrat.statut == 'actif', Paiement.statut.in_(['impayé', 'impaye']))
+        .order_by(Utilisateur.email, Paiement.id)).all()
+    par_locataire = defaultdict(list)
+    for email, paiement_id in lignes:
+        par_locataire[email].append(paiement_id)
+    emails = sorted(par_locataire, key=lambda email: -len(par_locataire[email]))[:nombre_locataires]
+    choisis = []
+    while len(choisis) < concurrence and any(par_locataire[email] for email in emails):
+        for email in emails:
+            if par_locataire[email] and len(choisis) < concurrence:
+                choisis.append((email, par_locataire[email].pop()))
+    if len(choisis) < concurrence:
+        sys.exit(f"Seulement {len(choisis)} échéances impayées disponibles pour {concurrence} requêtes.")
+    return choisis
+
+
+def mesurer_mode(url, paiements, timeout):
+    # Une connexion (bcrypt) par locataire, dont les cookies sont copiés dans chaque client
+    connexions = {}
+    for email in {email for email, _ in paiements}:
+        connexions[email] = Client(url, timeout=timeout)
+        connexions[email].connecter(email)
+
+    stats = Statistiques()
+    depart = threading.Barrier(len(paiements) + 1)
+
+    def initier(email, paiement_id):
+        client = Client(url, timeout=timeout)
+        client.session.cookies.update(connexions[email].session.cookies)
+        depart.wait()
+        try:
+            with stats.mesurer(ETAPE):
+                client.requete('POST', f'/api/locataire/paiements/{paiement_id}/initier-paydunya')
+        except (ReponseInattendue, requests.RequestException):
+            pass
+
+    threads = [threading.Thread(target=initier, args=paire) for paire in paiements]
+    for thread in threads:
+        thread.start()
+    depart.wait()
+    stats.demarrer()
+    for thread in threads:
+        thread.join()
+    stats.terminer()
+    return stats.rapport()
+
+
+def main(arguments=None):
+    args = lire_arguments(arguments)
+    modes = args.modes.split(',')
+    inconnus = set(modes) - set(MODES)
+    if inconnus:
+        sys.exit(f"Modes inconnus : {', '.join(sorted(inconnus))} (attendus : {', '.join(MODES)})")
+    reference = creer_base_temporaire()
+    app = creer_application(f'sqlite:///{reference}')
+    with app.app_context():
+        remplir_base(args.taille, args.echelle, args.graine)
+        paiements = choisir_paiements(args.locataires, args.concurrence)
+        db.session.remove()
+        db.engine.dispose()
+
+    resultats = {}
+    try:
+        for mode in modes:
+            paydunya_factice = PaydunyaFactice(latence=args.latence_paydunya).demarrer()
+            copie = creer_base_temporaire()
+            shutil.copyfile(reference, copie)
+            print(f"\n=== gunicorn, mode {mode}, {args.workers} worker(s), {args.concurrence} initiations ===")
+            processus, url = lancer_gunicorn(
+                mode, args, f'sqlite:///{copie}', paydunya_factice,
+                SERVER_WORKER_CONNECTIONS=str(max(args.concurrence, 100)), SERVER_TIMEOUT=str(int(args.timeout) + 30))
+            try:
+                rapport = mesurer_mode(url, paiements, args.timeout)
+            finally:
+                arreter(processus)
+                paydunya_factice.arreter()
+                supprimer_base_temporaire(copie)
+            etape = rapport['etapes'][ETAPE]
+            # Depuis l'envoi simultané des requêtes, connexions exclues
+            duree = rapport['duree_secondes']
+            resultats[mode] = {
+                'reussies': etape['requetes'] - etape['erreurs'],
+                'erreurs': etape['erreurs'],
+                'duree_secondes': round(duree, 2),
+                'debit_par_seconde': round((etape['requetes'] - etape['erreurs']) / duree, 2),
+                'appels_paydunya_simultanes_max': paydunya_factice.max_en_cours,
+                **{cle: etape[cle] for cle in ('p50_ms', 'p95_ms', 'p99_ms')},
+                'exemples_erreurs': etape.get('exemples_erreurs', []),
+            }
+            print(json.dumps(resultats[mode], indent=2, ensure_ascii=False))
+    finally:
+        supprimer_base_temporaire(reference)
+
+    print(f"\n{'mode':<10}{'réussies':>10}{'erreurs':>9}{'req/s':>9}{'simultanés':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode, r in resultats.items():
+        print(f"{mode:<10}{r['reussies']:>10}{r['erreurs']:>9}{r['debit_par_seconde']:>9}"
+              f"{r['appels_paydunya_simultanes_max']:>12}{r['p50_ms']:>10}{r['p95_ms']:>10}")
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as fichier:
+            json.dump({'parametres': vars(args), 'modes': resultats}, fichier, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import hashlib
+import random
+import uuid
+from datetime import date, timedelta
+
+import requests
+
+from app.services.jeu_de_donnees import MOT_DE_PASSE, VILLES
+
+
+class ReponseInattendue(Exception):
+    pass
+
+
+class Client:
+    """Session HTTP d'un utilisateur virtuel : cookies JWT et en-tête CSRF."""
+
+    def __init__(self, url_base, timeout=30):
+        self.url_base = url_base.rstrip('/')
+        self.session = requests.Session()
+        self.timeout = timeout
+
+    def requete(self, methode, chemin, attendus=(200,), **kwargs):
+        entetes = kwargs.pop('headers', {})
+        csrf = self.session.cookies.get('csrf_access_token')
+        if csrf and methode in ('POST', 'PUT', 'PATCH', 'DELETE'):
+            entetes['X-CSRF-TOKEN'] = csrf
+        reponse = self.session.request(methode, self.url_base + chemin, headers=entetes,
+                                       timeout=self.timeout, **kwargs)
+        if reponse.status_code not in attendus:
+            raise ReponseInattendue(f"{methode} {chemin} -> {reponse.status_code}: {reponse.text[:200]}")
+        return reponse
+
+    def connecter(self, email):
+        self.requete('POST', '/api/auth/login', json={'email': email, 'mot_de_passe': MOT_DE_PASSE})
+
+
+class ParcoursLocataire:
+    """
+    Recherche de chambre, consultation, demande de location, puis paiement d'une échéance :
+    initiation PayDunya et callback de confirmation (signé avec la clé maître).
+    """
+
+    def __init__(self, client, stats, alea, email, cle_maitre):
+        self.client = client
+        self.stats = stats
+        self.alea = alea
+        self.email = email
+        self.hash_callback = hashlib.sha512(cle_maitre.encode('utf-8')).hexdigest()
+
+    def connexion(self):
+        with self.stats.mesurer('locataire.connexion'):
+            self.client.connecter(self.email)
+
+    def iteration(self):
+        ville, _, loyer_median = self.alea.choice(VILLES)
+        with self.stats.mesurer('locataire.recherche'):
+            reponse = self.client.requete('GET', '/api/locataire/chambres/recherche', attendus=(200, 404), params={
+                'ville': ville, 'max_prix': loyer_median * 2})
+        # 404 : aucune chambre ne correspond aux critères
+        if reponse.status_code == 404:
+            return
+        chambres = reponse.json()
+        chambre_id = self.alea.choice(chambres)['id']
+
+        with self.stats.mesurer('locataire.detail_chambre'):
+            reponse = self.client.requete('GET', f'/api/locataire/chambres/{chambre_id}', attendus=(200, 404))
+        # 404 : la chambre vient d'être louée par un autre utilisateur virtuel
+        if reponse.status_code == 404:
+            return
+
+        # Date lointaine et aléatoire : les refus pour chevauchement (400) sont un résultat normal
+        date_debut = date.today() + timedelta(days=self.alea.randint(30, 1500))
+        with self.stats.mesurer('locataire.demande_location'):
+            self.client.requete('POST', f'/api/locataire/chambres/{chambre_id}/louer', attendus=(201, 400), json={
+                'date_debut': date_debut.isoformat(), 'duree_mois': self.alea.randint(1, 12)})
+
+        with self.stats.mesurer('locataire.mes_paiements'):
+            contrats = self.client.requete('GET', '/api/locataire/mes-paiements').json()
+        impayes = [p['id'] for c in contrats for p in c['paiements'] if p['statut'] in ('impayé', 'impaye')]
+        if not impayes:
+            return
+        paiement_id = self.alea.choice(impayes)
+
+        with self.stats.mesurer('locataire.initier_paiement'):
+            token = self.client.requete(
+                'POST', f'/api/locataire/paiements/{paiement_id}/initier-paydunya').json()['paydunya_invoice_token']
+
+        with self.stats.mesurer('paydunya.callback'):
+            self.client.requete('POST', '/api/locataire/paydunya/callback', data={
+                'data[hash]': self.hash_callback,
+                'data[status]': 'completed',
+                'data[invoice][token]': token,
+                'data[invoice][transaction_id]': f'txn_{uuid.uuid4().hex[:16]}',
+            })
+
+
+class ParcoursProprietaire:
+    """Tableau de bord du propriétaire, approbation d'une demande en attente, suivi des paiements."""
+
+    def __init__(self, client, stats, alea, email):
+        self.client = client
+        self.stats = stats
+        self.alea = alea
+        self.email = email
+
+    def connexion(self):
+        with self.stats.mesurer('proprietaire.connexion'):
+            self.client.connecter(self.email)
+
+    def iteration(self):
+        with self.stats.mesurer('proprietaire.maisons'):
+            self.client.requete('GET', '/api/proprietaire/maisons')
+        with self.stats.mesurer('proprietaire.contrats'):
+            self.client.requete('GET', '/api/proprietaire/contrats')
+        with self.stats.mesurer('proprietaire.demandes_en_attente'):
+            demandes = self.client.requete('GET', '/api/proprietaire/demandes-location-en-attente').json()
+        if demandes:
+            contrat_id = self.alea.choice(demandes)['id']
+            # 400 : un autre contrat actif couvre déjà la période
+            with self.stats.mesurer('proprietaire.approbation'):
+                self.client.requete('PUT', f'/api/proprietaire/contrats/{contrat_id}/approuver', attendus=(200, 400))
+        with self.stats.mesurer('proprietaire.paiements'):
+            self.client.requete('GET', '/api/proprietaire/paiements')
+
+
+def creer_alea(graine, numero):
+    return random.Random(f'{graine}-{numero}')
@@ -0,0 +1,156 @@
+import json
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Serveur(ThreadingHTTPServer):
+    # File d'attente des connexions : les tests de concurrence en ouvrent des centaines à la fois
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class PaydunyaFactice:
+    """
+    Serveur HTTP local qui imite l'API checkout-invoice de PayDunya (création et
+    confirmation de facture), avec une latence configurable. Les factures sont
+    considérées comme payées (`completed`) dès leur création.
+
+    Pannes injectables (modifiables pendant l'exécution) : `taux_erreur` est la proportion
+    de requêtes auxquelles le serveur répond `statut_erreur` ; `latence` peut dépasser le
+    timeout du client. `appels` compte les requêtes reçues par opération, `max_en_cours` le
+    plus grand nombre de requêtes traitées simultanément.
+    """
+
+    def __init__(self, latence=0.0, hote='127.0.0.1', port=0, taux_erreur=0.0, statut_erreur=503, graine=None):
+        self.latence = latence
+        self.taux_erreur = taux_erreur
+        self.statut_erreur = statut_erreur
+        self.appels = {'create': 0, 'confirm': 0}
+        self.en_cours = 0
+        self.max_en_cours = 0
+        self.factures = {}
+        self._alea = random.Random(graine)
+        self._verrou = threading.Lock()
+        self._serveur = _Serveur((hote, port), self._gestionnaire())
+        self._thread = None
+
+    @property
+    def url(self):
+        hote, port = self._serveur.server_address[:2]
+        return f'http://{hote}:{port}'
+
+    def demarrer(self):
+        self._thread = threading.Thread(target=self._serveur.serve_forever, name='paydunya-factice', daemon=True)
+        self._thread.start()
+        return self
+
+    def arreter(self):
+        self._serveur.shutdown()
+        self._serveur.server_close()
+
+    @property
+    def endpoint(self):
+        """Valeur de PAYDUNYA_SANDBOX_ENDPOINT pour que l'application appelle ce serveur."""
+        return f'{self.url}/sandbox-api/v1/'
+
+    def ajouter_facture(self, statut='completed'):
+        """Facture créée directement dans l'état `statut` (sans passer par l'API) ; renvoie son token."""
+        token = f'factice_{uuid.uuid4().hex}'
+        with self._verrou:
+            self.factures[token] = {'status': statut, 'donnees': {}}
+        return token
+
+    def definir_statut(self, token, statut):
+        with self._verrou:
+            self.factures[token]['status'] = statut
+
+    # --- Requêtes ---
+
+    @contextmanager
+    def _suivre(self):
+        with self._verrou:
+            self.en_cours += 1
+            self.max_en_cours = max(self.max_en_cours, self.en_cours)
+        try:
+            yield
+        finally:
+            with self._verrou:
+                self.en_cours -= 1
+
+    def _compter(self, operation):
+        """Compte l'appel et indique s'il doit échouer."""
+        with self._verrou:
+            self.appels[operation] += 1
+            return self._alea.random() < self.taux_erreur
+
+    def _creer(self, donnees):
+        token = f'factice_{uuid.uuid4().hex}'
+        with self._verrou:
+            self.factures[token] = {'status': 'completed', 'donnees': donnees}
+        return {
+            'response_code': '00',
+            'response_text': f'{self.url}/checkout/{token}',
+            'description': 'Checkout Invoice Created',
+            'token': token,
+        }
+
+    def _confirmer(self, token):
+        with self._verrou:
+            facture = self.factures.get(token)
+        if facture is None:
+            return {'response_code': '1001', 'response_text': 'Invoice Not Found'}
+        return {
+            'response_code': '00',
+            'response_text': 'Transaction Found',
+            'status': facture['status'],
+            'invoice': facture['donnees'].get('invoice', {}),
+            'custom_data': facture['donnees'].get('custom_data', {}),
+        }
+
+    def _gestionnaire(self):
+        factice = self
+
+        class Gestionnaire(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _repondre(self, corps, statut=200):
+                contenu = json.dumps(corps).encode('utf-8')
+                self.send_response(statut)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(contenu)))
+                self.end_headers()
+                try:
+                    self.wfile.write(contenu)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Le client a abandonné (timeout) : c'est le comportement testé
+                    pass
+
+            def _traiter(self, operation, reponse):
+                with factice._suivre():
+                    time.sleep(factice.latence)
+                    if operation is None:
+                        self._repondre({'response_code': '404', 'response_text': 'Not Found'}, 404)
+                    elif factice._compter(operation):
+                        self._repondre({'response_code': '5000', 'response_text': 'Erreur injectée'},
+                                       factice.statut_erreur)
+                    else:
+                        self._repondre(reponse())
+
+            def do_POST(self):
+                longueur = int(self.headers.get('Content-Length') or 0)
+                donnees = json.loads(self.rfile.read(longueur) or b'{}')
+                if self.path.endswith('/checkout-invoice/create'):
+                    self._traiter('create', lambda: factice._creer(donnees))
+                else:
+                    self._traiter(None, None)
+
+            def do_GET(self):
+                prefixe, _, token = self.path.rpartition('/checkout-invoice/confirm/')
+                self._traiter('confirm' if prefixe else None, lambda: factice._confirmer(token))
+
+        return Gestionnaire
@@ -0,0 +1,110 @@
+"""
+Réconciliation des paiements en attente contre le faux PayDunya : des paiements sont mis en
+attente avec des factures dans des états connus, puis `reconcilier_paiements` doit retrouver
+exactement la répartition attendue.
+
+    python -m loadtest.reconciliation --paiements 5000 --concurrence 16 --latence-paydunya 0.05
+"""
+import argparse
+import json
+import random
+import sys
+from collections import Counter
+
+from sqlalchemy import bindparam, func, update
+
+from app import db
+from app.models import Paiement
+from app.services.jeu_de_donnees import VOLUMES
+from app.services.reconciliation import reconcilier_paiements
+from loadtest.execution import creer_application, creer_base_temporaire, remplir_base, supprimer_base_temporaire
+from loadtest.paydunya_factice import PaydunyaFactice
+
+# État de la facture chez PayDunya -> proportion des paiements en attente
+REPARTITION = {'completed': 0.6, 'cancelled': 0.15, 'expired': 0.05, 'pending': 0.15, 'inconnue': 0.05}
+# Statut attendu du paiement après réconciliation
+STATUT_ATTENDU = {'completed': 'paye', 'cancelled': 'impaye', 'expired': 'impaye',
+                  'pending': 'en_cours_traitement', 'inconnue': 'en_cours_traitement'}
+
+
+def lire_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest.reconciliation',
+        description="Réconciliation des paiements en attente contre le faux PayDunya.")
+    parser.add_argument('--paiements', type=int, default=2000, help="Paiements mis en attente.")
+    parser.add_argument('--concurrence', type=int, default=8, help="Confirmations PayDunya simultanées.")
+    parser.add_argument('--taille-lot', type=int, default=500, help="Paiements par lot.")
+    parser.add_argument('--latence-paydunya', type=float, default=0.02,
+                        help="Latence simulée de l'API PayDunya, en secondes.")
+    parser.add_argument('--taux-erreur', type=float, default=0.0,
+                        help="Proportion de réponses 503 du faux PayDunya (retentées par le client).")
+    parser.add_argument('--simulation', action='store_true', help="Réconciliation sans écriture.")
+    parser.add_argument('--taille', choices=sorted(VOLUMES), default='petit', help="Volumes du jeu de données.")
+    parser.add_argument('--echelle', type=float, default=0.1, help="Facteur appliqué aux volumes de --taille.")
+    parser.add_argument('--graine', type=int, default=42, help="Graine du jeu de données et de la répartition.")
+    return parser.parse_args(arguments)
+
+
+def mettre_en_attente(paydunya_factice, nombre, graine):
+    """Met `nombre` échéances impayées en attente, chacune avec une facture dans un état tiré au sort."""
+    ids = db.session.scalars(
+        db.select(Paiement.id).where(Paiement.statut == 'impayé').order_by(Paiement.id).limit(nombre)).all()
+    if len(ids) < nombre:
+        sys.exit(f"Seulement {len(ids)} échéances impayées dans le jeu de données.")
+    alea = random.Random(graine)
+    etats = alea.choices(list(REPARTITION), weights=list(REPARTITION.values()), k=nombre)
+    lignes = []
+    attendus = {}
+    for paiement_id, etat in zip(ids, etats):
+        token = f'absente_{paiement_id}' if etat == 'inconnue' else paydunya_factice.ajouter_facture(etat)
+        lignes.append({'b_id': paiement_id, 'b_token': token})
+        attendus[paiement_id] = STATUT_ATTENDU[etat]
+    db.session.execute(
+        update(Paiement.__table__)
+        .where(Paiement.__table__.c.id == bindparam('b_id'))
+        .values(statut='en_cours_traitement', paydunya_invoice_token=bindparam('b_token')),
+        lignes)
+    db.session.commit()
+    return attendus, Counter(etats)
+
+
+def main(arguments=None):
+    args = lire_arguments(arguments)
+    fichier = creer_base_temporaire()
+    paydunya_factice = PaydunyaFactice(latence=args.latence_paydunya, taux_erreur=args.taux_erreur,
+                                       graine=args.graine).demarrer()
+    app = creer_application(f'sqlite:///{fichier}', paydunya_factice.endpoint)
+    try:
+        with app.app_context():
+            remplir_base(args.taille, args.echelle, args.graine)
+            attendus, etats = mettre_en_attente(paydunya_factice, args.paiements, args.graine)
+            print(f"Factures PayDunya des paiements en attente : {dict(etats)}")
+
+            rapport = reconcilier_paiements(
+                taille_lot=args.taille_lot, concurrence=args.concurrence, simulation=args.simulation)
+            print(json.dumps(rapport, indent=2, ensure_ascii=False, default=str))
+            print(f"Appels PayDunya : {paydunya_factice.appels['confirm']} confirmations, "
+                  f"{paydunya_factice.max_en_cours} simultanées au plus")
+
+            if args.simulation:
+                return 0
+            obtenus = dict(db.session.query(Paiement.id, Paiement.statut).filter(Paiement.id.in_(attendus)).all())
+            differences = {i: (attendus[i], obtenus.get(i)) for i in attendus if obtenus.get(i) != attendus[i]}
+            repartition = dict(db.session.query(Paiement.statut, func.count()).filter(
+                Paiement.id.in_(attendus)).group_by(Paiement.statut).all())
+            print(f"Statuts après réconciliation : {repartition}")
+            if differences:
+                print(f"{len(differences)} paiements dans un état inattendu (attendu, obtenu), par exemple : "
+                      f"{dict(list(differences.items())[:10])}")
+                return 1
+            print("Tous les paiements sont dans l'état attendu.")
+            return 0
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        paydunya_factice.arreter()
+        supprimer_base_temporaire(fichier)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Réservations et approbations simultanées d'une même chambre contre gunicorn (workers en
+threads, plusieurs processus) : N locataires demandent la même période, une seule demande
+doit être acceptée (201) ; puis le propriétaire approuve ce contrat N fois en parallèle, une
+seule approbation doit réussir, avec un seul échéancier et un seul événement publié.
+
+    python -m loadtest.reservations_concurrentes --concurrence 50 --workers 2
+"""
+import argparse
+import shutil
+import sys
+import threading
+from collections import Counter
+from datetime import date, timedelta
+
+import requests
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Chambre, Contrat, EvenementSortant, Maison, Paiement, Utilisateur
+from app.services.jeu_de_donnees import VOLUMES
+from loadtest.execution import creer_application, creer_base_temporaire, remplir_base, supprimer_base_temporaire
+from loadtest.modes_serveur import arreter, lancer_gunicorn
+from loadtest.parcours import Client
+from loadtest.paydunya_factice import PaydunyaFactice
+
+DUREE_MOIS = 6
+
+
+def lire_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest.reservations_concurrentes',
+        description="Demandes de location et approbations simultanées sur une même chambre.")
+    parser.add_argument('--concurrence', type=int, default=50, help="Requêtes envoyées simultanément par phase.")
+    parser.add_argument('--locataires', type=int, default=10, help="Comptes locataires se partageant les demandes.")
+    parser.add_argument('--workers', type=int, default=2, help="Processus workers gunicorn.")
+    parser.add_argument('--threads', type=int, default=8, help="Threads par worker.")
+    parser.add_argument('--timeout', type=float, default=60, help="Timeout client de chaque requête, en secondes.")
+    parser.add_argument('--taille', choices=sorted(VOLUMES), default='petit', help="Volumes du jeu de données.")
+    parser.add_argument('--echelle', type=float, default=0.05, help="Facteur appliqué aux volumes de --taille.")
+    parser.add_argument('--graine', type=int, default=42, help="Graine du jeu de données.")
+    return parser.parse_args(arguments)
+
+
+def preparer(nombre_locataires):
+    """Une chambre neuve (sans contrat) chez un propriétaire, et des locataires qui la demanderont."""
+    maison = db.session.scalars(select(Maison).order_by(Maison.id).limit(1)).first()
+    chambre = Chambre(maison_id=maison.id, titre="Chambre disputée", prix=100000, disponible=True)
+    db.session.add(chambre)
+    db.session.commit()
+    proprietaire = db.session.get(Utilisateur, maison.proprietaire_id).email
+    locataires = db.session.scalars(
+        select(Utilisateur.email).where(Utilisateur.role == 'locataire')
+        .order_by(Utilisateur.email).limit(nombre_locataires)).all()
+    return chambre.id, proprietaire, locataires
+
+
+def simultanement(requetes, timeout):
+    """Envoie les requêtes (client, méthode, chemin, kwargs) ensemble ; compte les statuts HTTP."""
+    statuts = Counter()
+    verrou = threading.Lock()
+    depart = threading.Barrier(len(requetes))
+
+    def envoyer(client, methode, chemin, kwargs):
+        session = requests.Session()
+        session.cookies.update(client.session.cookies)
+        entetes = {'X-CSRF-TOKEN': client.session.cookies.get('csrf_access_token')}
+        depart.wait()
+        try:
+            statut = session.request(methode, client.url_base + chemin, headers=entetes,
+                                     timeout=timeout, **kwargs).status_code
+        except requests.RequestException as e:
+            statut = type(e).__name__
+        with verrou:
+            statuts[statut] += 1
+
+    threads = [threading.Thread(target=envoyer, args=requete) for requete in requetes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuts
+
+
+def main(arguments=None):
+    args = lire_arguments(arguments)
+    fichier = creer_base_temporaire()
+    app = creer_application(f'sqlite:///{fichier}')
+    with app.app_context():
+        remplir_base(args.taille, args.echelle, args.graine)
+        chambre_id, proprietaire, locataires = preparer(args.locataires)
+        db.session.remove()
+        db.engine.dispose()
+
+    paydunya_factice = PaydunyaFactice().demarrer()
+    processus, url = lancer_gunicorn('threads', args, f'sqlite:///{fichier}', paydunya_factice,
+                                     SERVER_TIMEOUT=str(int(args.timeout) + 30))
+    echecs = []
+    try:
+        clients = []
+        for email in locataires:
+            client = Client(url, timeout=args.timeout)
+            client.connecter(email)
+            clients.append(client)
+        date_debut = (date.today() + timedelta(days=30)).isoformat()
+        demandes = simultanement([
+            (clients[i % len(clients)], 'POST', f'/api/locataire/chambres/{chambre_id}/louer',
+             {'json': {'date_debut': date_debut, 'duree_mois': DUREE_MOIS}})
+            for i in range(args.concurrence)], args.timeout)
+        print(f"\n{args.concurrence} demandes simultanées pour la chambre {chambre_id} : {dict(demandes)}")
+        if demandes[201] != 1:
+            echecs.append(f"{demandes[201]} demande(s) acceptée(s) au lieu d'une")
+
+        with app.app_context():
+            contrat_id = db.session.scalar(select(Contrat.id).where(Contrat.chambre_id == chambre_id))
+        if contrat_id is None:
+            echecs.append("aucun contrat créé : approbations non testées")
+        else:
+            client = Client(url, timeout=args.timeout)
+            client.connecter(proprietaire)
+            approbations = simultanement([
+                (client, 'PUT', f'/api/proprietaire/contrats/{contrat_id}/approuver', {})
+                for _ in range(args.concurrence)], args.timeout)
+            print(f"{args.concurrence} approbations simultanées du contrat {contrat_id} : {dict(approbations)}")
+            if approbations[200] != 1:
+                echecs.append(f"{approbations[200]} approbation(s) réussie(s) au lieu d'une")
+
+            with app.app_context():
+                contrat = db.session.get(Contrat, contrat_id)
+                attendues = DUREE_MOIS + (1 if contrat.montant_caution > 0 else 0)
+                echeances = db.session.scalar(select(func.count()).where(Paiement.contrat_id == contrat_id))
+                evenements = db.session.scalar(select(func.count()).where(
+                    EvenementSortant.type == 'contrat.approuve', EvenementSortant.cle == f'contrat:{contrat_id}'))
+                db.engine.dispose()
+            print(f"Contrat {contrat.statut} : {echeances} échéances (attendues {attendues}), "
+                  f"{evenements} événement(s) contrat.approuve")
+            if echeances != attendues or evenements != 1:
+                echecs.append("échéancier ou événements dupliqués")
+    finally:
+        arreter(processus)
+        paydunya_factice.arreter()
+        supprimer_base_temporaire(fichier)
+
+    if echecs:
+        print("ÉCHEC : " + " ; ".join(echecs))
+        return 1
+    print("Une seule demande et une seule approbation ont abouti.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Vérifie le comportement du client PayDunya (app.services.paydunya_client) face au faux
+serveur : nouvelles tentatives, timeouts, disjoncteur et reprise.
+
+    python -m loadtest.resilience_paydunya
+"""
+import socket
+import sys
+import time
+
+from app import create_app
+from app.config import Config
+from app.services.paydunya_client import Disjoncteur, PaydunyaIndisponible, PaydunyaRefus, paydunya_client
+from loadtest.paydunya_factice import PaydunyaFactice
+
+FACTURE = {
+    'invoice': {'items': [], 'taxes': {}, 'total_amount': 1000, 'description': 'Test de résilience', 'channels': []},
+    'store': {'name': 'Social Logement'},
+    'custom_data': {},
+    'actions': {},
+}
+
+
+class ConfigResilience(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    DB_CREATE_ALL = False
+    METRICS_ENABLED = False
+    SCHEDULER_ENABLED = False
+    LOG_LEVEL = 'ERROR'
+    PAYDUNYA_MASTER_KEY = 'cle-maitre-resilience'
+    PAYDUNYA_PRIVATE_KEY = 'test_private_resilience'
+    PAYDUNYA_TOKEN = 'token-resilience'
+    PAYDUNYA_TIMEOUT_CONNEXION = 0.5
+    PAYDUNYA_TIMEOUT_LECTURE = 0.2
+    PAYDUNYA_TENTATIVES = 3
+    PAYDUNYA_BACKOFF = 0.01
+    PAYDUNYA_BACKOFF_MAX = 0.05
+    PAYDUNYA_DISJONCTEUR_SEUIL = 3
+    PAYDUNYA_DISJONCTEUR_DELAI = 0.5
+
+
+def leve(exception, appel):
+    try:
+        appel()
+    except exception as e:
+        return e
+    raise AssertionError(f"{exception.__name__} attendue")
+
+
+def scenario_nominal(factice):
+    reponse = paydunya_client.creer_facture(FACTURE)
+    assert reponse['token'].startswith('factice_'), reponse
+    assert paydunya_client.confirmer_facture(reponse['token'])['status'] == 'completed'
+    assert factice.appels == {'create': 1, 'confirm': 1}, factice.appels
+
+
+def scenario_refus(factice):
+    erreur = leve(PaydunyaRefus, lambda: paydunya_client.confirmer_facture('inconnu'))
+    assert erreur.code == '1001', erreur.code
+    # Un refus est une réponse valide : ni nouvelle tentative, ni échec pour le disjoncteur
+    assert factice.appels['confirm'] == 1, factice.appels
+    assert paydunya_client.disjoncteur.etat == Disjoncteur.FERME
+
+
+def scenario_erreurs_transitoires(factice):
+    token = paydunya_client.creer_facture(FACTURE)['token']
+    factice.taux_erreur = 0.5
+    for _ in range(10):
+        paydunya_client.disjoncteur.reinitialiser()
+        try:
+            paydunya_client.confirmer_facture(token)
+        except PaydunyaIndisponible:
+            pass
+    assert factice.appels['confirm'] > 10, "la confirmation aurait dû être retentée"
+
+
+def scenario_creation_non_rejouee(factice):
+    factice.taux_erreur = 1.0
+    leve(PaydunyaIndisponible, lambda: paydunya_client.creer_facture(FACTURE))
+    # La requête a été reçue : la rejouer risquerait de créer deux factures
+    assert factice.appels['create'] == 1, factice.appels
+
+
+def scenario_timeout(factice):
+    token = paydunya_client.creer_facture(FACTURE)['token']
+    factice.latence = 1.0
+    debut = time.perf_counter()
+    leve(PaydunyaIndisponible, lambda: paydunya_client.confirmer_facture(token))
+    duree = time.perf_counter() - debut
+    # 3 tentatives bornées par le timeout de lecture, au lieu d'attendre la réponse
+    assert duree < 1.0, f"{duree:.2f} s"
+
+
+def scenario_disjoncteur(factice):
+    factice.taux_erreur = 1.0
+    for _ in range(ConfigResilience.PAYDUNYA_DISJONCTEUR_SEUIL):
+        leve(PaydunyaIndisponible, lambda: paydunya_client.creer_facture(FACTURE))
+    assert paydunya_client.disjoncteur.etat == Disjoncteur.OUVERT
+    recus = dict(factice.appels)
+    debut = time.perf_counter()
+    erreur = leve(PaydunyaIndisponible, lambda: paydunya_client.creer_facture(FACTURE))
+    assert time.perf_counter() - debut < 0.01, "le disjoncteur ouvert doit échouer immédiatement"
+    assert erreur.reessayer_dans, erreur
+    assert factice.appels == recus, "aucune requête ne doit partir tant que le disjoncteur est ouvert"
+
+    # Passé le délai, un appel d'essai réussi referme le disjoncteur
+    factice.taux_erreur = 0.0
+    time.sleep(ConfigResilience.PAYDUNYA_DISJONCTEUR_DELAI)
+    assert paydunya_client.disjoncteur.etat == Disjoncteur.SEMI_OUVERT
+    paydunya_client.creer_facture(FACTURE)
+    assert paydunya_client.disjoncteur.etat == Disjoncteur.FERME
+
+
+def scenario_connexion_refusee(factice):
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    # Rien n'écoute sur ce port : la requête ne part pas, la création peut être retentée
+    factice_endpoint = paydunya_client_endpoint(f'http://127.0.0.1:{port}/sandbox-api/v1/')
+    try:
+        erreur = leve(PaydunyaIndisponible, lambda: paydunya_client.creer_facture(FACTURE))
+    finally:
+        factice_endpoint()
+    assert 'injoignable' in str(erreur), erreur
+
+
+def paydunya_client_endpoint(endpoint):
+    """Pointe l'application vers `endpoint` ; renvoie la fonction qui rétablit le précédent."""
+    from flask import current_app
+
+    precedent = current_app.config['PAYDUNYA_SANDBOX_ENDPOINT']
+    current_app.config['PAYDUNYA_SANDBOX_ENDPOINT'] = endpoint
+
+    def retablir():
+        current_app.config['PAYDUNYA_SANDBOX_ENDPOINT'] = precedent
+    return retablir
+
+
+SCENARIOS = (
+    scenario_nominal,
+    scenario_refus,
+    scenario_erreurs_transitoires,
+    scenario_creation_non_rejouee,
+    scenario_timeout,
+    scenario_disjoncteur,
+    scenario_connexion_refusee,
+)
+
+
+def main():
+    echecs = 0
+    for scenario in SCENARIOS:
+        factice = PaydunyaFactice(graine=42).demarrer()
+        app = create_app(type('Config', (ConfigResilience,), {'PAYDUNYA_SANDBOX_ENDPOINT': factice.endpoint}))
+        paydunya_client.reinitialiser()
+        debut = time.perf_counter()
+        try:
+            with app.app_context():
+                scenario(factice)
+            resultat = 'ok'
+        except AssertionError as e:
+            echecs += 1
+            resultat = f'ÉCHEC {e}'
+        finally:
+            factice.arreter()
+        nom = scenario.__name__.removeprefix('scenario_')
+        print(f"{nom:<28}{(time.perf_counter() - debut) * 1000:>9.1f} ms  {resultat}")
+    return 1 if echecs else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import threading
+import time
+from contextlib import contextmanager
+
+CENTILES = (50, 95, 99)
+MAX_EXEMPLES_ERREUR = 3
+# En dessous, le p95 est trop instable pour servir de seuil
+MIN_ECHANTILLONS_P95 = 100
+
+
+def centile(valeurs_triees, rang):
+    """Centile par la méthode du rang le plus proche, sur une liste déjà triée."""
+    if not valeurs_triees:
+        return None
+    indice = max(0, min(len(valeurs_triees) - 1, round(rang / 100 * len(valeurs_triees) + 0.5) - 1))
+    return valeurs_triees[indice]
+
+
+class Statistiques:
+    """Durées et erreurs par étape, partagées entre les utilisateurs virtuels."""
+
+    def __init__(self):
+        self._durees = {}
+        self._erreurs = {}
+        self._exemples = {}
+        self._verrou = threading.Lock()
+        self.debut = None
+        self.fin = None
+
+    def demarrer(self):
+        self.debut = time.perf_counter()
+
+    def terminer(self):
+        self.fin = time.perf_counter()
+
+    def enregistrer(self, etape, duree, erreur=None):
+        with self._verrou:
+            self._durees.setdefault(etape, []).append(duree)
+            if erreur is not None:
+                self._erreurs[etape] = self._erreurs.get(etape, 0) + 1
+                exemples = self._exemples.setdefault(etape, [])
+                if len(exemples) < MAX_EXEMPLES_ERREUR:
+                    exemples.append(erreur)
+
+    @contextmanager
+    def mesurer(self, etape):
+        """
+        Chronomètre le bloc ; une exception (réponse inattendue, erreur réseau) compte comme
+        une erreur de l'étape et interrompt l'itération en cours.
+        """
+        debut = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.enregistrer(etape, time.perf_counter() - debut, erreur=str(e))
+            raise
+        self.enregistrer(etape, time.perf_counter() - debut)
+
+    def rapport(self):
+        duree_totale = (self.fin or time.perf_counter()) - self.debut
+        with self._verrou:
+            durees = {etape: sorted(valeurs) for etape, valeurs in self._durees.items()}
+            erreurs = dict(self._erreurs)
+            exemples = {etape: list(valeurs) for etape, valeurs in self._exemples.items()}
+        etapes = {}
+        for etape, valeurs in durees.items():
+            etapes[etape] = {
+                'requetes': len(valeurs),
+                'erreurs': erreurs.get(etape, 0),
+                'debit_par_seconde': round(len(valeurs) / duree_totale, 2),
+                **{f'p{rang}_ms': round(centile(valeurs, rang) * 1000, 2) for rang in CENTILES},
+            }
+            if etape in exemples:
+                etapes[etape]['exemples_erreurs'] = exemples[etape]
+        total = sum(e['requetes'] for e in etapes.values())
+        return {
+            'duree_secondes': round(duree_totale, 2),
+            'requetes': total,
+            'erreurs': sum(e['erreurs'] for e in etapes.values()),
+            'debit_par_seconde': round(total / duree_totale, 2),
+            'etapes': etapes,
+        }
+
+
+def comparer(rapport, reference, tolerance=0.25, marge_ms=5.0):
+    """
+    Compare un rapport à une baseline. Une étape régresse si son p95 (son p50 si la baseline
+    a moins de MIN_ECHANTILLONS_P95 requêtes pour cette étape) dépasse celui de la baseline de
+    plus de `tolerance` (relative) et de `marge_ms` (absolue, pour les étapes très rapides), ou
+    si son taux d'erreur augmente. Le débit global est comparé avec la même tolérance.
+    Retourne la liste des régressions, vide si tout va bien.
+    """
+    regressions = []
+    for etape, base in reference['etapes'].items():
+        actuel = rapport['etapes'].get(etape)
+        if actuel is None:
+            regressions.append(f"{etape}: étape absente du rapport")
+            continue
+        indicateur = 'p95_ms' if base['requetes'] >= MIN_ECHANTILLONS_P95 else 'p50_ms'
+        limite = max(base[indicateur] * (1 + tolerance), base[indicateur] + marge_ms)
+        if actuel[indicateur] > limite:
+            regressions.append(f"{etape}: {indicateur[:3]} {actuel[indicateur]} ms > {limite:.2f} ms "
+                               f"(baseline {base[indicateur]} ms)")
+        taux_base = base['erreurs'] / base['requetes'] if base['requetes'] else 0
+        taux = actuel['erreurs'] / actuel['requetes'] if actuel['requetes'] else 0
+        if taux > taux_base + 0.01:
+            regressions.append(f"{etape}: taux d'erreur {taux:.1%} (baseline {taux_base:.1%})")
+    debit_min = reference['debit_par_seconde'] / (1 + tolerance)
+    if rapport['debit_par_seconde'] < debit_min:
+        regressions.append(
+            f"débit: {rapport['debit_par_seconde']} req/s < {debit_min:.2f} req/s "
+            f"(baseline {reference['debit_par_seconde']} req/s)")
+    return regressions
@@ -0,0 +1,150 @@
+"""
+Synchronisation incrémentale des tableaux de bord : compare le volume et la durée des vues
+complètes que le front recharge (contrats, paiements, chambres) à ceux de `/changements`
+après une vague de modifications. L'état reconstruit par le client (instantané puis delta)
+doit être identique à un nouvel instantané.
+
+    python -m loadtest.synchronisation --locataires 20 --proprietaires 5 --modifications 200
+"""
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+
+from sqlalchemy import select, update
+
+from app import db
+from app.models import Contrat, Maison, Media, Paiement, Utilisateur
+from app.services.jeu_de_donnees import MOT_DE_PASSE, VOLUMES
+from loadtest.execution import creer_application, creer_base_temporaire, remplir_base, supprimer_base_temporaire
+
+# Vues que le tableau de bord rechargeait entièrement, par rôle
+VUES_COMPLETES = {
+    'locataire': ('/api/locataire/mes-contrats', '/api/locataire/mes-paiements', '/api/locataire/mes-chambres'),
+    'proprietaire': ('/api/proprietaire/contrats', '/api/proprietaire/paiements', '/api/proprietaire/chambres'),
+}
+CHANGEMENTS = {'locataire': '/api/locataire/changements', 'proprietaire': '/api/proprietaire/changements'}
+COLLECTIONS = ('contrats', 'paiements', 'chambres', 'medias')
+
+
+def lire_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest.synchronisation',
+        description="Volume et durée des vues complètes comparés à la synchronisation incrémentale.")
+    parser.add_argument('--locataires', type=int, default=20, help="Locataires synchronisés.")
+    parser.add_argument('--proprietaires', type=int, default=5, help="Propriétaires synchronisés.")
+    parser.add_argument('--modifications', type=int, default=200, help="Paiements modifiés entre deux synchronisations.")
+    parser.add_argument('--suppressions', type=int, default=20, help="Médias supprimés entre deux synchronisations.")
+    parser.add_argument('--taille', choices=sorted(VOLUMES), default='petit', help="Volumes du jeu de données.")
+    parser.add_argument('--echelle', type=float, default=0.5, help="Facteur appliqué aux volumes de --taille.")
+    parser.add_argument('--graine', type=int, default=42, help="Graine du jeu de données et des modifications.")
+    return parser.parse_args(arguments)
+
+
+def choisir_utilisateurs(nombre_locataires, nombre_proprietaires):
+    """(email, rôle) des locataires ayant un contrat et des propriétaires ayant des chambres."""
+    locataires = db.session.scalars(
+        select(Utilisateur.email).join(Contrat, Contrat.locataire_id == Utilisateur.id)
+        .distinct().order_by(Utilisateur.email).limit(nombre_locataires)).all()
+    proprietaires = db.session.scalars(
+        select(Utilisateur.email).join(Maison, Maison.proprietaire_id == Utilisateur.id)
+        .distinct().order_by(Utilisateur.email).limit(nombre_proprietaires)).all()
+    return [(email, 'locataire') for email in locataires] + [(email, 'proprietaire') for email in proprietaires]
+
+
+def obtenir(client, chemin, mesures):
+    debut = time.perf_counter()
+    reponse = client.get(chemin)
+    mesures['ms'] += (time.perf_counter() - debut) * 1000
+    if reponse.status_code != 200:
+        sys.exit(f"GET {chemin} -> {reponse.status_code}: {reponse.get_data(as_text=True)[:200]}")
+    mesures['octets'] += len(reponse.get_data())
+    mesures['requetes'] += 1
+    return reponse.get_json()
+
+
+def appliquer(etat, changements):
+    """Ce que fait le client : remplace chaque entité par identifiant, retire les supprimées."""
+    for collection in COLLECTIONS:
+        for entite in changements[collection]:
+            etat[collection][entite['id']] = entite
+        for identifiant in changements['suppressions'][collection]:
+            etat[collection].pop(identifiant, None)
+
+
+def indexer(instantane):
+    return {collection: {entite['id']: entite for entite in instantane[collection]} for collection in COLLECTIONS}
+
+
+def modifier(nombre_paiements, nombre_medias, graine):
+    """Change le statut de paiements tirés au sort (UPDATE en masse) et supprime des médias (ORM)."""
+    alea = random.Random(graine)
+    ids = db.session.scalars(select(Paiement.id)).all()
+    choisis = alea.sample(ids, min(nombre_paiements, len(ids)))
+    db.session.execute(update(Paiement).where(Paiement.id.in_(choisis)).values(statut='payé'),
+                       execution_options={'synchronize_session': False})
+    medias = db.session.scalars(select(Media).order_by(Media.id)).all()
+    for media in alea.sample(medias, min(nombre_medias, len(medias))):
+        db.session.delete(media)
+    db.session.commit()
+
+
+def main(arguments=None):
+    args = lire_arguments(arguments)
+    fichier = creer_base_temporaire()
+    # Sans marge, le delta ne contient que la vague de modifications
+    app = creer_application(f'sqlite:///{fichier}', SYNC_MARGE_SECONDES=0)
+    try:
+        with app.app_context():
+            remplir_base(args.taille, args.echelle, args.graine)
+            utilisateurs = choisir_utilisateurs(args.locataires, args.proprietaires)
+            db.session.remove()
+
+        complet = defaultdict(lambda: defaultdict(float))
+        instantane = defaultdict(lambda: defaultdict(float))
+        delta = defaultdict(lambda: defaultdict(float))
+        sessions = []
+        for email, role in utilisateurs:
+            client = app.test_client()
+            reponse = client.post('/api/auth/login', json={'email': email, 'mot_de_passe': MOT_DE_PASSE})
+            if reponse.status_code != 200:
+                sys.exit(f"Connexion de {email} impossible : {reponse.status_code}")
+            for chemin in VUES_COMPLETES[role]:
+                obtenir(client, chemin, complet[role])
+            premier = obtenir(client, CHANGEMENTS[role], instantane[role])
+            sessions.append((client, role, indexer(premier), premier['curseur']))
+
+        # Les changements doivent tomber après le curseur, à la seconde près
+        time.sleep(1.1)
+        with app.app_context():
+            modifier(args.modifications, args.suppressions, args.graine)
+
+        divergences = 0
+        entites_delta = 0
+        for client, role, etat, curseur in sessions:
+            changements = obtenir(client, f"{CHANGEMENTS[role]}?since={curseur}", delta[role])
+            entites_delta += sum(len(changements[c]) + len(changements['suppressions'][c]) for c in COLLECTIONS)
+            appliquer(etat, changements)
+            if etat != indexer(client.get(CHANGEMENTS[role]).get_json()):
+                divergences += 1
+
+        print(f"\n{'rôle':<14}{'requête':<24}{'octets/util.':>14}{'ms/util.':>10}")
+        for role in VUES_COMPLETES:
+            nombre = sum(1 for _, r in utilisateurs if r == role)
+            if not nombre:
+                continue
+            for libelle, mesures in (('vues complètes', complet[role]), ('changements (complet)', instantane[role]),
+                                     ('changements (delta)', delta[role])):
+                print(f"{role:<14}{libelle:<24}{mesures['octets'] / nombre:>14.0f}{mesures['ms'] / nombre:>10.1f}")
+        print(f"\n{entites_delta} entités dans les deltas ; "
+              f"{divergences} état(s) client différent(s) d'un nouvel instantané sur {len(sessions)}")
+        return 1 if divergences else 0
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        supprimer_base_temporaire(fichier)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Tableau de bord du propriétaire : les six endpoints que le front appelle séparément comparés
+à GET /proprietaire/tableau-de-bord (durée, octets, instructions SQL). Les listes du bundle
+doivent contenir les mêmes entités que les endpoints qu'il remplace.
+
+    python -m loadtest.tableau_de_bord --proprietaires 5 --repetitions 5
+"""
+import argparse
+import sys
+import time
+from collections import defaultdict
+
+from sqlalchemy import func, select
+
+from app import db
+from app.models import Chambre, Contrat, Maison, Utilisateur
+from app.services.jeu_de_donnees import MOT_DE_PASSE, VOLUMES
+from loadtest.execution import creer_application, creer_base_temporaire, remplir_base, supprimer_base_temporaire
+from loadtest.statistiques import centile
+
+# Endpoint séparé -> liste correspondante du bundle
+ENDPOINTS = {
+    '/api/proprietaire/maisons': 'maisons',
+    '/api/proprietaire/chambres': 'chambres',
+    '/api/proprietaire/clients': 'clients',
+    '/api/proprietaire/contrats': 'contrats',
+    '/api/proprietaire/paiements': 'paiements',
+    '/api/proprietaire/demandes-location-en-attente': 'demandes_en_attente',
+}
+BUNDLE = '/api/proprietaire/tableau-de-bord'
+
+
+def lire_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest.tableau_de_bord',
+        description="Six endpoints du tableau de bord propriétaire comparés au bundle.")
+    parser.add_argument('--proprietaires', type=int, default=5, help="Propriétaires (ceux qui ont le plus de contrats).")
+    parser.add_argument('--repetitions', type=int, default=5, help="Chargements du tableau de bord par propriétaire.")
+    parser.add_argument('--taille', choices=sorted(VOLUMES), default='petit', help="Volumes du jeu de données.")
+    parser.add_argument('--echelle', type=float, default=0.5, help="Facteur appliqué aux volumes de --taille.")
+    parser.add_argument('--graine', type=int, default=42, help="Graine du jeu de données.")
+    return parser.parse_args(arguments)
+
+
+def choisir_proprietaires(nombre):
+    return db.session.scalars(
+        select(Utilisateur.email)
+        .join(Maison, Maison.proprietaire_id == Utilisateur.id)
+        .join(Chambre, Chambre.maison_id == Maison.id)
+        .join(Contrat, Contrat.chambre_id == Chambre.id)
+        .group_by(Utilisateur.email)
+        .order_by(func.count(Contrat.id).desc(), Utilisateur.email)
+        .limit(nombre)).all()
+
+
+def obtenir(client, chemin):
+    debut = time.perf_counter()
+    reponse = client.get(chemin)
+    duree = (time.perf_counter() - debut) * 1000
+    if reponse.status_code != 200:
+        sys.exit(f"GET {chemin} -> {reponse.status_code}: {reponse.get_data(as_text=True)[:200]}")
+    return reponse.get_json(), duree, len(reponse.get_data()), int(reponse.headers.get('X-DB-Queries', 0))
+
+
+def identifiants(chemin, donnees):
+    if chemin == '/api/proprietaire/paiements':
+        return {p['id'] for p in donnees['paiements']}
+    return {element['id'] for element in donnees}
+
+
+def comparer(separes, bundle):
+    """Écarts entre les listes des endpoints séparés et celles du bundle."""
+    ecarts = []
+    for chemin, vue in ENDPOINTS.items():
+        if identifiants(chemin, separes[chemin]) != set(bundle['vues'][vue]):
+            ecarts.append(vue)
+    resume = separes['/api/proprietaire/paiements']['dashboard_summary']
+    if any(abs(resume[cle] - bundle['resume'][cle]) > 1e-6 for cle in resume):
+        ecarts.append('resume')
+    return ecarts
+
+
+def main(arguments=None):
+    args = lire_arguments(arguments)
+    fichier = creer_base_temporaire()
+    app = creer_application(f'sqlite:///{fichier}', SQL_QUERY_HEADERS=True)
+    try:
+        with app.app_context():
+            remplir_base(args.taille, args.echelle, args.graine)
+            emails = choisir_proprietaires(args.proprietaires)
+            db.session.remove()
+
+        mesures = {'séparés': defaultdict(list), 'bundle': defaultdict(list)}
+        ecarts = {}
+        for email in emails:
+            client = app.test_client()
+            reponse = client.post('/api/auth/login', json={'email': email, 'mot_de_passe': MOT_DE_PASSE})
+            if reponse.status_code != 200:
+                sys.exit(f"Connexion de {email} impossible : {reponse.status_code}")
+            for _ in range(args.repetitions):
+                separes = {}
+                total = [0.0, 0, 0]
+                for chemin in ENDPOINTS:
+                    separes[chemin], duree, octets, requetes = obtenir(client, chemin)
+                    total = [total[0] + duree, total[1] + octets, total[2] + requetes]
+                for cle, valeur in zip(('ms', 'octets', 'requetes_sql'), total):
+                    mesures['séparés'][cle].append(valeur)
+                mesures['séparés']['requetes_http'].append(len(ENDPOINTS))
+
+                bundle, duree, octets, requetes = obtenir(client, BUNDLE)
+                for cle, valeur in zip(('ms', 'octets', 'requetes_sql'), (duree, octets, requetes)):
+                    mesures['bundle'][cle].append(valeur)
+                mesures['bundle']['requetes_http'].append(1)
+            ecarts[email] = comparer(separes, bundle)
+
+        print(f"\n{len(emails)} propriétaires, {args.repetitions} chargements chacun")
+        print(f"{'':<10}{'HTTP':>6}{'SQL':>8}{'octets':>10}{'ms p50':>9}{'ms p95':>9}")
+        for nom, valeurs in mesures.items():
+            durees = sorted(valeurs['ms'])
+            print(f"{nom:<10}{valeurs['requetes_http'][0]:>6}"
+                  f"{sum(valeurs['requetes_sql']) / len(durees):>8.1f}"
+                  f"{sum(valeurs['octets']) / len(durees):>10.0f}"
+                  f"{centile(durees, 50):>9.1f}{centile(durees, 95):>9.1f}")
+        differents = {email: e for email, e in ecarts.items() if e}
+        if differents:
+            print(f"Listes du bundle différentes des endpoints séparés : {differents}")
+            return 1
+        print("Les listes du bundle correspondent aux endpoints séparés.")
+        return 0
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        supprimer_base_temporaire(fichier)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,26 @@
+"""Add index on evenements_sortants (cle, id)
+
+Revision ID: a8d2f4c6e1b3
+Revises: f3b8d1a6c2e9
+Create Date: 2026-10-19 19:12:08.441207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d2f4c6e1b3'
+down_revision = 'f3b8d1a6c2e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('evenements_sortants', schema=None) as batch_op:
+        batch_op.create_index('ix_evenements_sortants_cle', ['cle', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('evenements_sortants', schema=None) as batch_op:
+        batch_op.drop_index('ix_evenements_sortants_cle')
@@ -0,0 +1,37 @@
+"""Add factures_orphelines table
+
+Revision ID: b4e9c2a7d5f1
+Revises: a8d2f4c6e1b3
+Create Date: 2026-10-19 20:41:17.204588
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e9c2a7d5f1'
+down_revision = 'a8d2f4c6e1b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('factures_orphelines',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('paiement_id', sa.Integer(), nullable=False),
+    sa.Column('invoice_token', sa.String(length=255), nullable=False),
+    sa.Column('cree_le', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['paiement_id'], ['paiements.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('invoice_token')
+    )
+    with op.batch_alter_table('factures_orphelines', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_factures_orphelines_paiement_id'), ['paiement_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('factures_orphelines', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_factures_orphelines_paiement_id'))
+
+    op.drop_table('factures_orphelines')
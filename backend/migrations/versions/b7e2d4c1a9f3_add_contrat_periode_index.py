@@ -0,0 +1,26 @@
+"""Add index on contrats (chambre_id, date_debut, date_fin)
+
+Revision ID: b7e2d4c1a9f3
+Revises: 629611b12f44
+Create Date: 2026-10-19 09:12:44.201356
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d4c1a9f3'
+down_revision = '629611b12f44'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contrats', schema=None) as batch_op:
+        batch_op.create_index('ix_contrats_chambre_periode', ['chambre_id', 'date_debut', 'date_fin'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('contrats', schema=None) as batch_op:
+        batch_op.drop_index('ix_contrats_chambre_periode')
@@ -0,0 +1,37 @@
+"""Add taches_planifiees table and en_retard to Paiement
+
+Revision ID: c3f8a6e21d57
+Revises: b7e2d4c1a9f3
+Create Date: 2026-10-19 10:03:18.554102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8a6e21d57'
+down_revision = 'b7e2d4c1a9f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('taches_planifiees',
+    sa.Column('nom', sa.String(length=100), nullable=False),
+    sa.Column('prochaine_execution', sa.DateTime(), nullable=False),
+    sa.Column('derniere_execution', sa.DateTime(), nullable=True),
+    sa.Column('dernier_resultat', sa.Text(), nullable=True),
+    sa.Column('verrouille_par', sa.String(length=255), nullable=True),
+    sa.Column('verrouille_jusqu_a', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('nom')
+    )
+    with op.batch_alter_table('paiements', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('en_retard', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('paiements', schema=None) as batch_op:
+        batch_op.drop_column('en_retard')
+
+    op.drop_table('taches_planifiees')
@@ -0,0 +1,26 @@
+"""Add index on paiements (date_echeance, id)
+
+Revision ID: d94b1f07c2e8
+Revises: c3f8a6e21d57
+Create Date: 2026-10-19 11:27:40.918233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd94b1f07c2e8'
+down_revision = 'c3f8a6e21d57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('paiements', schema=None) as batch_op:
+        batch_op.create_index('ix_paiements_date_echeance', ['date_echeance', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('paiements', schema=None) as batch_op:
+        batch_op.drop_index('ix_paiements_date_echeance')
@@ -0,0 +1,42 @@
+"""Add evenements_sortants table (transactional outbox)
+
+Revision ID: e5a7c9d3f1b6
+Revises: d94b1f07c2e8
+Create Date: 2026-10-19 16:42:05.310927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c9d3f1b6'
+down_revision = 'd94b1f07c2e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('evenements_sortants',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(length=100), nullable=False),
+    sa.Column('cle', sa.String(length=100), nullable=False),
+    sa.Column('donnees', sa.Text(), nullable=False),
+    sa.Column('cree_le', sa.DateTime(), nullable=True),
+    sa.Column('livre_le', sa.DateTime(), nullable=True),
+    sa.Column('tentatives', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('prochaine_tentative', sa.DateTime(), nullable=True),
+    sa.Column('derniere_erreur', sa.Text(), nullable=True),
+    sa.Column('verrouille_par', sa.String(length=255), nullable=True),
+    sa.Column('verrouille_jusqu_a', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('evenements_sortants', schema=None) as batch_op:
+        batch_op.create_index('ix_evenements_sortants_livre_le', ['livre_le', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('evenements_sortants', schema=None) as batch_op:
+        batch_op.drop_index('ix_evenements_sortants_livre_le')
+
+    op.drop_table('evenements_sortants')
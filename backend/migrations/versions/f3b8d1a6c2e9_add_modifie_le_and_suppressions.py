@@ -0,0 +1,65 @@
+"""Add modifie_le columns and suppressions table (incremental sync)
+
+Revision ID: f3b8d1a6c2e9
+Revises: e5a7c9d3f1b6
+Create Date: 2026-10-19 18:05:41.772310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d1a6c2e9'
+down_revision = 'e5a7c9d3f1b6'
+branch_labels = None
+depends_on = None
+
+TABLES = ('chambres', 'contrats', 'paiements', 'medias')
+INDEX = {'contrats': 'ix_contrats_modifie_le', 'paiements': 'ix_paiements_modifie_le'}
+
+
+def upgrade():
+    # SQLite n'accepte pas d'ajouter une colonne au défaut non constant : ajout nullable,
+    # remplissage depuis cree_le, puis NOT NULL avec le défaut (table recréée par batch)
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('modifie_le', sa.DateTime(), nullable=True))
+        op.execute(f"UPDATE {table} SET modifie_le = COALESCE(cree_le, CURRENT_TIMESTAMP)")
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('modifie_le', existing_type=sa.DateTime(), nullable=False,
+                                  server_default=sa.text('(CURRENT_TIMESTAMP)'))
+            if table in INDEX:
+                batch_op.create_index(INDEX[table], ['modifie_le'], unique=False)
+
+    op.create_table('suppressions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entite', sa.String(length=50), nullable=False),
+    sa.Column('entite_id', sa.Integer(), nullable=False),
+    sa.Column('proprietaire_id', sa.Integer(), nullable=True),
+    sa.Column('locataire_id', sa.Integer(), nullable=True),
+    sa.Column('chambre_id', sa.Integer(), nullable=True),
+    sa.Column('supprime_le', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('suppressions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_suppressions_chambre_id'), ['chambre_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_suppressions_locataire_id'), ['locataire_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_suppressions_proprietaire_id'), ['proprietaire_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_suppressions_supprime_le'), ['supprime_le'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('suppressions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_suppressions_supprime_le'))
+        batch_op.drop_index(batch_op.f('ix_suppressions_proprietaire_id'))
+        batch_op.drop_index(batch_op.f('ix_suppressions_locataire_id'))
+        batch_op.drop_index(batch_op.f('ix_suppressions_chambre_id'))
+
+    op.drop_table('suppressions')
+
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            if table in INDEX:
+                batch_op.drop_index(INDEX[table])
+            batch_op.drop_column('modifie_le')
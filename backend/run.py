@@ -1,10 +1,18 @@
 from app import create_app, db
+from app.serveur import demarrer_services
 from flask.cli import with_appcontext
 # from flask_migrate import MigrateCommand
 import click
 
 app = create_app()
 
+# Serveur de développement (flask run, python run.py) : les threads d'arrière-plan
+# (journaux, planificateur, relais) démarrent avec la première requête servie, donc dans le
+# processus qui sert (pas dans le surveillant du reloader) et jamais pour les commandes CLI
+@app.before_request
+def demarrer_services_developpement():
+    demarrer_services(app)
+
 @app.shell_context_processor
 def make_shell_context():
     # Rend les objets db et models disponibles dans le shell Flask
@@ -13,12 +21,72 @@ def make_shell_context():
 
 # Ajoute les commandes de migration (facultatif mais utile pour CLI)
 # Si tu as besoin de commandes custom pour CLI, tu peux les définir ici.
-# @app.cli.command('seed-db')
-# @with_appcontext
-# def seed_db():
-#     """Seeds the database with initial data."""
-#     # Your seeding logic here
-#     click.echo('Database seeded!')
+@app.cli.command('cycle-contrats')
+@with_appcontext
+def cycle_contrats_command():
+    """Termine les contrats échus et marque les paiements en retard (tâche nocturne)."""
+    from app.services.cycle_contrats import cycle_contrats
+    resultat = cycle_contrats()
+    click.echo(f'Cycle des contrats terminé: {resultat}')
+
+@app.cli.command('rappels-paiements')
+@with_appcontext
+def rappels_paiements_command():
+    """Envoie les rappels de paiements en retard aux locataires et propriétaires."""
+    from app.services.rappels import envoyer_rappels_retard
+    resultat = envoyer_rappels_retard()
+    click.echo(f'Rappels envoyés: {resultat}')
+
+@app.cli.command('reconcilier-paiements')
+@click.option('--taille-lot', type=int, help='Paiements lus et mis à jour par lot.')
+@click.option('--concurrence', type=int, help='Confirmations PayDunya simultanées.')
+@click.option('--simulation', is_flag=True, help='Affiche les écarts sans modifier les paiements.')
+@with_appcontext
+def reconcilier_paiements_command(taille_lot, concurrence, simulation):
+    """Confronte les paiements en attente à l'état de leur facture PayDunya."""
+    from app.services.reconciliation import reconcilier_paiements
+    resultat = reconcilier_paiements(taille_lot=taille_lot, concurrence=concurrence, simulation=simulation)
+    click.echo(f'Réconciliation terminée: {resultat}')
+
+@app.cli.command('relayer-evenements')
+@click.option('--taille-lot', type=int, help='Événements envoyés par lot.')
+@click.option('--max-lots', type=int, help="Nombre maximum de lots (par défaut : jusqu'à épuisement).")
+@with_appcontext
+def relayer_evenements_command(taille_lot, max_lots):
+    """Livre aux destinations configurées les événements de l'outbox en attente."""
+    from app.services.evenements import relais_evenements
+    resultat = relais_evenements.relayer(max_lots=max_lots, taille_lot=taille_lot)
+    click.echo(f'Relais des événements terminé: {resultat}')
+
+@app.cli.command('seed-db')
+@click.option('--taille', type=click.Choice(['petit', 'moyen', 'grand']), default='petit',
+              help='Volumes prédéfinis (grand : 10k propriétaires, 500k chambres, 1M contrats, ~20M paiements).')
+@click.option('--graine', type=int, default=42, help='Graine du générateur : même graine, mêmes données.')
+@click.option('--date-reference', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help="Date considérée comme aujourd'hui pour les statuts (par défaut : aujourd'hui).")
+@click.option('--proprietaires', type=int, help='Nombre de propriétaires.')
+@click.option('--maisons', type=int, help='Nombre de maisons.')
+@click.option('--chambres', type=int, help='Nombre de chambres.')
+@click.option('--locataires', type=int, help='Nombre de locataires.')
+@click.option('--contrats', type=int, help='Nombre de contrats (les paiements en découlent, ~20 par contrat).')
+@click.option('--medias', type=int, help='Nombre de médias.')
+@click.option('--taille-lot', type=int, default=10000, help="Nombre de lignes par insertion.")
+@with_appcontext
+def seed_db(taille, graine, date_reference, taille_lot, **volumes):
+    """Génère un jeu de données volumineux et reproductible (tests de charge, benchmarks)."""
+    from app.services.jeu_de_donnees import VOLUMES, generer_jeu_de_donnees
+    # create_app ne crée plus les tables hors mode debug
+    db.create_all(bind_key=None)
+    volumes_finaux = dict(VOLUMES[taille], **{k: v for k, v in volumes.items() if v is not None})
+    click.echo(f'Génération avec la graine {graine}: {volumes_finaux}')
+    resultat = generer_jeu_de_donnees(
+        volumes_finaux,
+        graine=graine,
+        reference=date_reference.date() if date_reference else None,
+        taille_lot=taille_lot,
+        progression=click.echo
+    )
+    click.echo(f'Base de données remplie: {resultat}')
 
 if __name__ == '__main__':
     app.run()
\ No newline at end of file
@@ -0,0 +1,6 @@
+"""Point d'entrée WSGI de production : `gunicorn wsgi:app` (réglages dans gunicorn.conf.py)."""
+from app import create_app
+from app.serveur import prechauffer
+
+app = create_app()
+prechauffer(app)
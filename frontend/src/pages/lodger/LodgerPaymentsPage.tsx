@@ -48,6 +48,9 @@ interface ContratPaiements {
     paiements: PaiementData[];
 }
 
+// Rechargement de la liste quand le serveur ne fournit pas le flux des statuts (SSE)
+const INTERVALLE_RECHARGEMENT_MS = 30000;
+
 const LodgerPaymentsPage: React.FC = () => {
     const [mesPaiementsParContrat, setMesPaiementsParContrat] = useState<ContratPaiements[]>([]);
     const [loading, setLoading] = useState(true);
@@ -138,6 +141,48 @@ const LodgerPaymentsPage: React.FC = () => {
         }
     }, [location.search, navigate, fetchMesPaiements]); // fetchMesPaiements comme dépendance de useEffect
 
+    // Statuts poussés par le serveur (SSE) : plus besoin de recharger la liste pour voir le callback PayDunya
+    useEffect(() => {
+        const flux = new EventSource(`${import.meta.env.VITE_BACKEND_URL}/api/locataire/paiements/flux`, { withCredentials: true });
+
+        // Le serveur peut renvoyer un événement, ou en livrer un plus ancien après un plus récent :
+        // par paiement, seul un identifiant d'événement plus grand que le dernier appliqué compte
+        const dernierEvenement = new Map<number, number>();
+
+        const mettreAJourStatut = (event: MessageEvent) => {
+            const donnees = JSON.parse(event.data);
+            const evenementId = Number(event.lastEventId);
+            if (evenementId <= (dernierEvenement.get(donnees.paiement_id) ?? 0)) return;
+            dernierEvenement.set(donnees.paiement_id, evenementId);
+            setMesPaiementsParContrat(contrats => contrats.map(contrat => contrat.contrat_id !== donnees.contrat_id ? contrat : {
+                ...contrat,
+                paiements: contrat.paiements.map(paiement => paiement.id !== donnees.paiement_id ? paiement : {
+                    ...paiement,
+                    statut: donnees.statut,
+                    date_paiement: donnees.date_paiement ?? paiement.date_paiement,
+                }),
+            }));
+        };
+
+        flux.addEventListener('paiement.paye', mettreAJourStatut);
+        flux.addEventListener('paiement.annule', mettreAJourStatut);
+
+        // Serveur sans flux (réponse 204) ou refus : EventSource ne se reconnecte pas, on recharge la liste
+        let rechargement: ReturnType<typeof setInterval> | undefined;
+        flux.onerror = () => {
+            if (flux.readyState !== EventSource.CLOSED || rechargement !== undefined) return;
+            rechargement = setInterval(() => {
+                authenticatedFetch('locataire/mes-paiements', { method: 'GET' })
+                    .then((data: ContratPaiements[]) => setMesPaiementsParContrat(data))
+                    .catch((error: any) => console.error('Erreur lors du rechargement des paiements:', error));
+            }, INTERVALLE_RECHARGEMENT_MS);
+        };
+        return () => {
+            flux.close();
+            if (rechargement !== undefined) clearInterval(rechargement);
+        };
+    }, []);
+
     const getPaiementStatusBadgeVariant = (status: string) => {
         switch (status) {
             case 'paye': return 'default'; // Ou 'success' si Badge supporte